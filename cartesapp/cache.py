@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from os import getenv
+import logging
+
+from cartesapp.storage import Storage
+from cartesapp.output import MAX_SPLITTABLE_OUTPUT_SIZE
+from cartesapp.utils import str2bool
+
+LOGGER = logging.getLogger(__name__)
+
+###
+# Configs
+
+QUERY_CACHE_MAX_SIZE = int(getenv('CARTESAPP_QUERY_CACHE_MAX_SIZE') or 16777216) # 16 MB of cached reports
+PART_CACHE_ENABLED = str2bool(getenv('CARTESAPP_PART_CACHE') or 'true')
+PART_CACHE_MAX_SIZE = int(getenv('CARTESAPP_PART_CACHE_MAX_SIZE') or 33554432) # 32 MB of splittable outputs
+
+# pony object statuses after a flush/commit
+WRITTEN_STATUSES = frozenset(('inserted', 'updated', 'deleted'))
+
+###
+# Bounded caches
+#
+# Results of inspects: (route, params key) -> (result, reports), where reports are
+# the serialized report bodies (before part splitting and without the jsonrpc id)
+# replayed instead of running the query again. Entries are evicted LRU when the
+# cached bytes go over max_size.
+
+class _ReportsCache:
+    entries = OrderedDict()
+    size = 0
+    max_size = 0
+
+    def __new__(cls):
+        return cls
+
+    @classmethod
+    def get(cls, key):
+        entry = cls.entries.get(key)
+        if entry is not None:
+            cls.entries.move_to_end(key)
+        return entry
+
+    @classmethod
+    def put(cls, key, res, reports: list):
+        entry_size = sum(len(r[0]) for r in reports)
+        if entry_size > cls.max_size:
+            return
+        cls._pop(key)
+        cls.entries[key] = (res, reports, entry_size)
+        cls.size += entry_size
+        while cls.size > cls.max_size:
+            cls._pop(next(iter(cls.entries)))
+
+    @classmethod
+    def _pop(cls, key):
+        entry = cls.entries.pop(key, None)
+        if entry is not None:
+            cls.size -= entry[2]
+
+    @classmethod
+    def clear(cls):
+        cls.entries = OrderedDict()
+        cls.size = 0
+
+###
+# Query cache
+#
+# @query(cache=...) routes, invalidated when a mutation commits: all of them, or
+# only the routes that depend on a modified entity.
+
+class QueryCache(_ReportsCache):
+    entries = OrderedDict()
+    size = 0
+    max_size = QUERY_CACHE_MAX_SIZE
+    route_entities = {}         # route -> frozenset of entity names | None (any commit)
+    last_total_changes = None   # sqlite total_changes seen at the last commit
+
+    @classmethod
+    def add_route(cls, route: str, cache):
+        """Register a cached route (``cache`` is True or a dict with ``entities``)."""
+        entities = None
+        if isinstance(cache, dict):
+            unknown = set(cache.keys()).difference({'entities'})
+            if len(unknown) > 0:
+                raise Exception(f"Invalid cache configs {unknown}")
+            if cache.get('entities') is not None:
+                entities = frozenset(_entity_name(e) for e in cache['entities'])
+        elif cache is not True:
+            raise Exception("Cache option must be True or a dict of configs")
+        cls.route_entities[route] = entities
+        return {'route': route, 'entities': entities}
+
+    @classmethod
+    def invalidate(cls, entities: set | None = None):
+        """Drop cached results: all of them (entities=None), or those of routes
+        depending on any of the entity names (plus routes without dependencies)."""
+        if entities is None:
+            cls.clear()
+            return
+        for key in [k for k in cls.entries if _depends_on(cls.route_entities.get(k[0]), entities)]:
+            cls._pop(key)
+
+    @classmethod
+    def on_commit(cls):
+        """Invalidate after a mutation committed, scoping by the modified entities
+        when every written row can be attributed to an entity object."""
+        if len(cls.route_entities) == 0: # no cached routes
+            return
+        provider = Storage.db.provider
+        # the pool's connection: after a rollback (e.g. of a multicall sub-call) the
+        # session cache has no connection, but earlier commits are still counted
+        connection = provider.pool.con if provider is not None else None
+        if connection is None: # nothing was written
+            return
+        db_cache = Storage.db._get_cache()
+        total_changes = connection.total_changes
+        last_total_changes = cls.last_total_changes
+        cls.last_total_changes = total_changes
+        if len(cls.entries) == 0 or total_changes == last_total_changes:
+            return
+        entities = set()
+        written = 0
+        for obj in db_cache.objects:
+            if obj._status_ in WRITTEN_STATUSES:
+                written += 1
+                entities.add(obj.__class__.__name__)
+                entities.add(obj.__class__._root_.__name__)
+        # bulk deletes, raw sql, m2m tables, rolled back writes: can't tell, drop all
+        if last_total_changes is None or not 0 <= total_changes - last_total_changes <= written:
+            LOGGER.debug("Invalidating query cache")
+            cls.invalidate()
+        else:
+            LOGGER.debug(f"Invalidating query cache for {entities}")
+            cls.invalidate(entities)
+
+    @classmethod
+    def reset(cls):
+        cls.clear()
+        cls.max_size = QUERY_CACHE_MAX_SIZE
+        cls.route_entities = {}
+        cls.last_total_changes = None
+
+###
+# Part cache
+#
+# Splittable output queries are fetched one part per inspect, so without a cache
+# the query runs and serializes the whole payload again for every part. The body
+# produced for the first part is kept, keyed by the state version (bumped on each
+# commit), and the next parts are slices of it.
+
+class PartCache(_ReportsCache):
+    entries = OrderedDict()
+    size = 0
+    max_size = PART_CACHE_MAX_SIZE
+    version = 0
+
+    @classmethod
+    def add_route(cls, route: str):
+        return {'route': route}
+
+    @classmethod
+    def key(cls, *key) -> tuple:
+        return key + (cls.version,)
+
+    @classmethod
+    def put(cls, key, res, reports: list):
+        # only outputs split in parts are requested again
+        if len(reports) != 1 or len(reports[0][0]) <= MAX_SPLITTABLE_OUTPUT_SIZE:
+            return
+        super().put(key, res, reports)
+
+    @classmethod
+    def on_commit(cls):
+        cls.version += 1
+        cls.clear()
+
+    @classmethod
+    def reset(cls):
+        cls.clear()
+        cls.max_size = PART_CACHE_MAX_SIZE
+        cls.version = 0
+
+def _entity_name(entity) -> str:
+    return entity if isinstance(entity, str) else entity.__name__
+
+def _depends_on(route_entities, entities: set) -> bool:
+    return route_entities is None or not route_entities.isdisjoint(entities)
@@ -0,0 +1,113 @@
+from pydantic import BaseModel
+from os import getenv, urandom
+from math import ceil
+import logging
+
+from cartesi import abi
+
+from cartesapp.storage import Entity, helpers
+from cartesapp.codec import encode_model, decode_to_model
+
+LOGGER = logging.getLogger(__name__)
+
+###
+# Configs
+
+CHUNK_SIZE = int(getenv('CARTESAPP_CHUNK_SIZE') or 131072) # default client side chunk size (128 KB)
+CHUNK_MAX_PARTS = int(getenv('CARTESAPP_CHUNK_MAX_PARTS') or 1024)
+CHUNK_MAX_SIZE = int(getenv('CARTESAPP_CHUNK_MAX_SIZE') or 33554432) # 32 MB reassembled payload
+CHUNK_TTL = int(getenv('CARTESAPP_CHUNK_TTL') or 86400) # seconds (block timestamp) to keep partial uploads
+
+###
+# Models
+
+class InputChunk(BaseModel):
+    upload_id:  abi.UInt256
+    index:      abi.UInt32
+    total:      abi.UInt32
+    data:       abi.Bytes
+
+# storage: one row per chunk so nothing is re-copied until the upload completes
+class InputChunkUpload(Entity):
+    route           = helpers.Required(str)
+    sender          = helpers.Required(str, 42)
+    upload_id       = helpers.Required(str)
+    total           = helpers.Required(int)
+    received        = helpers.Required(int)
+    size            = helpers.Required(int)
+    created_at      = helpers.Required(int, index=True)
+    parts           = helpers.Set("InputChunkPart")
+    helpers.composite_key(route, sender, upload_id)
+
+class InputChunkPart(Entity):
+    upload          = helpers.Required(InputChunkUpload)
+    index           = helpers.Required(int)
+    data            = helpers.Required(bytes)
+    helpers.composite_key(upload, index)
+
+###
+# Helpers
+
+def get_chunk_configs(chunk) -> dict:
+    """Normalize the ``chunk`` option of ``@mutation`` (True or a dict of overrides)."""
+    configs = {"ttl": CHUNK_TTL, "max_parts": CHUNK_MAX_PARTS, "max_size": CHUNK_MAX_SIZE, "chunk_size": CHUNK_SIZE}
+    if isinstance(chunk, dict):
+        unknown = set(chunk.keys()).difference(configs.keys())
+        if len(unknown) > 0:
+            raise Exception(f"Invalid chunk configs {unknown}")
+        configs.update(chunk)
+    elif chunk is not True:
+        raise Exception("Chunk option must be True or a dict of configs")
+    return configs
+
+def expire_chunk_uploads(limit_timestamp: int):
+    # not a bulk delete: uploads already loaded in this db_session must see it (parts cascade)
+    for upload in InputChunkUpload.select(lambda u: u.created_at < limit_timestamp):
+        upload.delete()
+
+def add_input_chunk(route: str, msg_sender: str, timestamp: int, payload: bytes, configs: dict) -> bytes | None:
+    """Store one chunk of an upload. Returns the reassembled payload once the last
+    chunk lands (removing the upload from storage), otherwise None."""
+    if configs.get('ttl'):
+        expire_chunk_uploads(timestamp - configs['ttl'])
+
+    chunk = decode_to_model(data=payload, model=InputChunk)
+    if chunk.total == 0 or chunk.total > configs['max_parts']:
+        raise Exception(f"Invalid number of chunks {chunk.total}")
+    if chunk.index >= chunk.total:
+        raise Exception(f"Invalid chunk index {chunk.index}")
+
+    sender = msg_sender.lower()
+    upload_id = str(chunk.upload_id)
+    upload = InputChunkUpload.get(route=route, sender=sender, upload_id=upload_id)
+    if upload is None:
+        upload = InputChunkUpload(route=route, sender=sender, upload_id=upload_id,
+            total=chunk.total, received=0, size=0, created_at=timestamp)
+    elif upload.total != chunk.total:
+        raise Exception(f"Chunk total mismatch for upload {upload_id}")
+    if InputChunkPart.exists(upload=upload, index=chunk.index):
+        raise Exception(f"Duplicate chunk {chunk.index} for upload {upload_id}")
+    if upload.size + len(chunk.data) > configs['max_size']:
+        raise Exception(f"Upload {upload_id} exceeds maximum size")
+
+    InputChunkPart(upload=upload, index=chunk.index, data=chunk.data)
+    upload.received += 1
+    upload.size += len(chunk.data)
+    LOGGER.debug(f"Received chunk {chunk.index + 1}/{chunk.total} of upload {upload_id} ({route})")
+    if upload.received < upload.total:
+        return None
+
+    data = b''.join(p.data for p in upload.parts.order_by(InputChunkPart.index))
+    upload.delete()
+    return data
+
+def split_payload(payload: bytes, chunk_size: int = CHUNK_SIZE, upload_id: int | None = None) -> list[bytes]:
+    """Split an encoded mutation payload into ABI-encoded ``InputChunk`` envelopes."""
+    if chunk_size <= 0:
+        raise Exception("Invalid chunk size")
+    if upload_id is None:
+        upload_id = int.from_bytes(urandom(8), 'big')
+    total = max(1, ceil(len(payload) / chunk_size))
+    return [encode_model(InputChunk(
+            upload_id=upload_id, index=i, total=total, data=payload[i*chunk_size:(i+1)*chunk_size]))
+        for i in range(total)]
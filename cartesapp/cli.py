@@ -5,7 +5,6 @@ import traceback
 import typer
 import json
 
-from cartesapp.manager import cartesapp_run
 from cartesapp.utils import (get_modules, DEFAULT_CONFIGS, SHELL_CONFIGS, DEFAULT_CONFIGFILE,
     read_config_file, deep_merge_dicts, parse_key_value, parse_drive_config, load_machine_drive_config)
 from cartesapp.external_tools import run_node, run_cm, build_drives, IMAGE_DIR
@@ -49,6 +48,7 @@ def run(log_level: Optional[str] = None,reset_storage: Optional[bool] = False):
     """
     Run the cartesapp application
     """
+    from cartesapp.manager import cartesapp_run
     try:
         if log_level is not None:
             logging.basicConfig(level=getattr(logging,log_level.upper()))
@@ -79,6 +79,20 @@ def generate_frontend_libs(libs_dir: Optional[str] = None, frontend_path: Option
         m.add_module(mod)
     m.generate_frontend_lib(**args)
 
+def write_route_manifest():
+    """Routes of the app to skip the handler reflection on boot (app drive), if
+    enabled by the ROUTE_MANIFEST setting"""
+    from cartesapp.manager import Manager
+    try:
+        m = Manager()
+        for mod in get_modules():
+            m.add_module(mod)
+        path = m.write_route_manifest()
+        if path is not None:
+            print(f"Route manifest written to {path}")
+    except Exception as e:
+        LOGGER.warning(f"Couldn't write route manifest (routes will be reflected on boot): {e}")
+
 #   run npm create vite frontend -- --template react-ts
 #   npm i @cartesi/viem@2.0.0-alpha.4 @rjsf/core@6.0.0-beta.7 @rjsf/utils@6.0.0-beta.7 @rjsf/validator-ajv8@6.0.0-beta.7 ajv@^8.17.1 ajv-formats@^3.0.1
 #   generate frontend with main app
@@ -203,6 +217,7 @@ def build(config_file: Optional[str] = DEFAULT_CONFIGFILE, log_level: Optional[s
         logging.basicConfig(level=getattr(logging,log_level.upper()))
     params = load_machine_drive_config(config_file, DEFAULT_CONFIGS, base_path,
         parse_key_value(machine_config), parse_drive_config(drive_config))
+    write_route_manifest()
     if drives_only:
         build_drives(**params)
         exit(0)
@@ -226,6 +241,21 @@ def shell(config_file: Optional[str] = DEFAULT_CONFIGFILE, log_level: Optional[s
     params["interactive"] = True
     run_cm(**params)
 
+@app.command()
+def profile_startup(output: Optional[str] = None, top: Optional[int] = 30, reset_storage: Optional[bool] = False,
+        trace_memory: Annotated[Optional[bool], typer.Option(help="Trace memory per module and phase (slows down the imports)")] = True):
+    """
+    Profile the app startup: time and memory of the imported modules and of the setup phases
+    (in the machine run it with: cartesapp shell --entrypoint "python3 -m cartesapp.startup_profile")
+    """
+    import sys
+    import subprocess
+    from cartesapp.startup_profile import STARTUP_PROFILE_FILE
+    # fresh interpreter: the cli already imported the framework
+    args = [sys.executable, '-m', 'cartesapp.startup_profile', output or STARTUP_PROFILE_FILE,
+        str(top), str(reset_storage), str(trace_memory)]
+    exit(subprocess.run(args).returncode)
+
 @app.command()
 def test(test_files: Annotated[Optional[List[str]], typer.Argument()] = None, cartesi_machine: Optional[bool] = False,
         machine_config: Optional[Annotated[List[str], typer.Option(help="machine config in the [ key=value ] format")]] = None,
@@ -0,0 +1,223 @@
+from pydantic import BaseModel
+import re
+import logging
+
+import eth_abi
+from eth_utils import to_checksum_address
+from cartesi import abi
+
+LOGGER = logging.getLogger(__name__)
+
+###
+# Codecs
+#
+# abi.encode_model/abi.decode_to_model rebuild the abi types from the model type
+# hints and go through eth_abi's generic coders on every call. ModelCodec does that
+# work once per model: each field gets a slot in the head (static value or offset
+# to the tail) and a specialized encoder/decoder. Models with types not covered
+# here (arrays, tuples/nested models) and packed encodings use the generic path.
+
+_UINT_RE = re.compile(r'^uint(\d*)$')
+_INT_RE = re.compile(r'^int(\d*)$')
+_FIXED_BYTES_RE = re.compile(r'^bytes(\d+)$')
+_ZERO_WORD = bytes(32)
+
+# decoded addresses follow the installed eth_abi (checksummed or lowercase)
+_CHECKSUM_ADDRESSES = eth_abi.decode(['address'], bytes(12) + b'\xab' * 20)[0] != '0x' + 'ab' * 20
+
+def _ceil32(n: int) -> int:
+    return (n + 31) // 32 * 32
+
+def _uint_coders(bits: int):
+    max_value = 2**bits
+    def encode(value) -> bytes:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0 or value >= max_value:
+            raise Exception(f"Value {value!r} out of bounds for uint{bits}")
+        return value.to_bytes(32, 'big')
+    def decode(word: bytes) -> int:
+        value = int.from_bytes(word, 'big')
+        if value >= max_value:
+            raise Exception(f"Invalid padding for uint{bits}")
+        return value
+    return encode, decode
+
+def _int_coders(bits: int):
+    min_value, max_value = -2**(bits - 1), 2**(bits - 1)
+    def encode(value) -> bytes:
+        if not isinstance(value, int) or isinstance(value, bool) or value < min_value or value >= max_value:
+            raise Exception(f"Value {value!r} out of bounds for int{bits}")
+        return value.to_bytes(32, 'big', signed=True)
+    def decode(word: bytes) -> int:
+        value = int.from_bytes(word, 'big', signed=True)
+        if value < min_value or value >= max_value:
+            raise Exception(f"Invalid padding for int{bits}")
+        return value
+    return encode, decode
+
+def _encode_address(value) -> bytes:
+    if not isinstance(value, str) or len(value) != 42 or value[:2] not in ('0x', '0X'):
+        raise Exception(f"Invalid address {value!r}")
+    address = value[2:]
+    if address.lower() != address and address.upper() != address and to_checksum_address(value) != value:
+        raise Exception(f"Invalid address checksum {value!r}")
+    return bytes(12) + bytes.fromhex(address)
+
+def _decode_address(word: bytes) -> str:
+    if word[:12] != _ZERO_WORD[:12]:
+        raise Exception("Invalid padding for address")
+    if _CHECKSUM_ADDRESSES:
+        return to_checksum_address(word[12:])
+    return '0x' + word[12:].hex()
+
+def _encode_bool(value) -> bytes:
+    if not isinstance(value, bool):
+        raise Exception(f"Invalid bool {value!r}")
+    return (1 if value else 0).to_bytes(32, 'big')
+
+def _decode_bool(word: bytes) -> bool:
+    value = int.from_bytes(word, 'big')
+    if value > 1:
+        raise Exception("Invalid bool value")
+    return value == 1
+
+def _fixed_bytes_coders(size: int):
+    padding = bytes(32 - size)
+    def encode(value) -> bytes:
+        if not isinstance(value, (bytes, bytearray)) or len(value) > size:
+            raise Exception(f"Invalid bytes{size} value")
+        return bytes(value) + bytes(32 - len(value))
+    def decode(word: bytes) -> bytes:
+        if word[size:] != padding:
+            raise Exception(f"Invalid padding for bytes{size}")
+        return word[:size]
+    return encode, decode
+
+def _encode_bytes(value) -> bytes:
+    if not isinstance(value, (bytes, bytearray)):
+        raise Exception("Invalid bytes value")
+    size = len(value)
+    return size.to_bytes(32, 'big') + bytes(value) + bytes(_ceil32(size) - size)
+
+def _decode_bytes(data: bytes, offset: int) -> bytes:
+    if offset + 32 > len(data):
+        raise Exception("Insufficient data for dynamic value")
+    size = int.from_bytes(data[offset:offset + 32], 'big')
+    start = offset + 32
+    end = start + size
+    padded_end = start + _ceil32(size)
+    if padded_end > len(data):
+        raise Exception("Insufficient data for dynamic value")
+    if data[end:padded_end] != _ZERO_WORD[:padded_end - end]:
+        raise Exception("Invalid padding for dynamic value")
+    return data[start:end]
+
+def _encode_string(value) -> bytes:
+    if not isinstance(value, str):
+        raise Exception("Invalid string value")
+    return _encode_bytes(value.encode('utf-8'))
+
+def _decode_string(data: bytes, offset: int) -> str:
+    return _decode_bytes(data, offset).decode('utf-8')
+
+def _get_coders(abi_type: str):
+    """Return (encoder, decoder, is_dynamic) for an abi type, None if unsupported."""
+    if abi_type == 'address': return _encode_address, _decode_address, False
+    if abi_type == 'bool': return _encode_bool, _decode_bool, False
+    if abi_type == 'bytes': return _encode_bytes, _decode_bytes, True
+    if abi_type == 'string': return _encode_string, _decode_string, True
+    match = _UINT_RE.match(abi_type)
+    if match:
+        return *_uint_coders(int(match.group(1) or 256)), False
+    match = _INT_RE.match(abi_type)
+    if match:
+        return *_int_coders(int(match.group(1) or 256)), False
+    match = _FIXED_BYTES_RE.match(abi_type)
+    if match and 0 < int(match.group(1)) <= 32:
+        return *_fixed_bytes_coders(int(match.group(1))), False
+    return None
+
+class ModelCodec:
+    """Standard (non packed) ABI codec specialized for one model.
+
+    Fields keep model order; ``slots`` holds (field, encoder, decoder, dynamic,
+    head offset) and ``head_size`` is where the tail (dynamic values) starts.
+    """
+    __slots__ = ('model', 'fields', 'abi_types', 'slots', 'head_size')
+
+    def __init__(self, model, abi_types: list[str] | None = None):
+        self.model = model
+        self.fields = tuple(model.__fields__.keys())
+        self.abi_types = tuple(abi_types if abi_types is not None else abi.get_abi_types_from_model(model))
+        slots = []
+        for i, (field, abi_type) in enumerate(zip(self.fields, self.abi_types)):
+            coders = _get_coders(abi_type)
+            if coders is None:
+                raise Exception(f"Unsupported abi type {abi_type} for {model.__name__}.{field}")
+            slots.append((field, coders[0], coders[1], coders[2], i * 32))
+        self.slots = tuple(slots)
+        self.head_size = len(slots) * 32
+
+    def encode(self, obj: BaseModel) -> bytes:
+        head = []
+        tail = []
+        tail_offset = self.head_size
+        for field, encode, _, dynamic, _ in self.slots:
+            value = encode(getattr(obj, field))
+            if dynamic:
+                head.append(tail_offset.to_bytes(32, 'big'))
+                tail.append(value)
+                tail_offset += len(value)
+            else:
+                head.append(value)
+        return b''.join(head + tail)
+
+    def decode(self, data: bytes) -> BaseModel:
+        if len(data) < self.head_size:
+            raise Exception(f"Insufficient data to decode {self.model.__name__}")
+        values = {}
+        for field, _, decode, dynamic, head_offset in self.slots:
+            word = data[head_offset:head_offset + 32]
+            if dynamic:
+                values[field] = decode(data, int.from_bytes(word, 'big'))
+            else:
+                values[field] = decode(word)
+        return self.model.parse_obj(values)
+
+class Codec:
+    codecs = {}
+    def __new__(cls):
+        return cls
+
+    @classmethod
+    def add(cls, model) -> ModelCodec | None:
+        """Build (once) the codec of a model. Returns None if it uses the generic path."""
+        if model in cls.codecs:
+            return cls.codecs[model]
+        try:
+            codec = ModelCodec(model)
+        except Exception as e:
+            LOGGER.debug(f"Using generic abi codec for {model.__name__}: {e}")
+            codec = None
+        cls.codecs[model] = codec
+        return codec
+
+    @classmethod
+    def reset(cls):
+        cls.codecs = {}
+
+###
+# Helpers
+
+def encode_model(obj: BaseModel, packed: bool = False) -> bytes:
+    """Same as abi.encode_model, using the model codec when one was added."""
+    codec = None if packed else Codec.codecs.get(obj.__class__)
+    if codec is None:
+        return abi.encode_model(obj, packed)
+    return codec.encode(obj)
+
+def decode_to_model(data: bytes, model, packed: bool = False) -> BaseModel:
+    """Same as abi.decode_to_model, using the model codec when one was added."""
+    codec = None if packed else Codec.codecs.get(model)
+    if codec is None:
+        return abi.decode_to_model(data=data, model=model, packed=packed)
+    return codec.decode(data)
@@ -0,0 +1,213 @@
+from pydantic import BaseModel
+from array import array
+from itertools import accumulate
+from operator import attrgetter
+import sys
+import json
+import struct
+
+###
+# Columnar reports
+#
+# Query outputs are mostly lists of rows (e.g. Messages(data: List[Message], total)).
+# As json every row repeats the keys, and every value is formatted as text. The
+# columnar format keeps the list-of-model fields as tables stored column by column:
+# numbers and bools as fixed width little endian arrays (aligned to their item size
+# so clients can map them with typed arrays), strings as a dictionary of distinct
+# values plus an index array. The other fields of the model are kept as json.
+#
+# Layout (integers are little endian):
+#   magic (4) | version (u8) | n_tables (u8) | json size (u32) | json (other fields)
+#   table:  name size (u16) | name | n_rows (u32) | n_columns (u16) | columns
+#   column: name size (u16) | name | type (u8) | values
+#     int32/int64/float64/bool: padding | n_rows values
+#     str:  n_entries (u32) | padding | offsets (u32 x n_entries+1) | utf-8 blob |
+#           index width (u8) | padding | indexes (u8/u16/u32 x n_rows)
+#     json: size (u32) | json array (values that don't fit the types above)
+
+COLUMNAR_MAGIC = b'\x00col' # not a valid json start
+COLUMNAR_VERSION = 1
+
+COLUMN_TYPES = {
+    "json": 0,
+    "int32": 1,
+    "int64": 2,
+    "float64": 3,
+    "bool": 4,
+    "str": 5,
+}
+
+_INT32_MIN, _INT32_MAX = -2**31, 2**31 - 1
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+def _dumps(obj) -> bytes:
+    from cartesapp.output import dumps_json
+    return dumps_json(obj)
+
+def _put_name(out: bytearray, name: str):
+    encoded = name.encode('utf-8')
+    out += struct.pack('<H', len(encoded))
+    out += encoded
+
+def _put_array(out: bytearray, values: array):
+    out += bytes(-len(out) % values.itemsize)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    out += values.tobytes()
+
+def _put_json(out: bytearray, values: list, rows: list, name: str):
+    out.append(COLUMN_TYPES["json"])
+    try:
+        encoded = _dumps(values)
+    except TypeError: # values json can't serialize (bytes, nested models): let pydantic format them
+        encoded = _dumps([json.loads(r.json(include={name})).get(name) for r in rows])
+    out += struct.pack('<I', len(encoded))
+    out += encoded
+
+def _put_str(out: bytearray, values: list):
+    out.append(COLUMN_TYPES["str"])
+    entries = {v: i for i, v in enumerate(dict.fromkeys(values))}
+    encoded = [e.encode('utf-8') for e in entries]
+    out += struct.pack('<I', len(encoded))
+    _put_array(out, array('I', accumulate((len(e) for e in encoded), initial=0)))
+    out += b''.join(encoded)
+    n_entries = len(entries)
+    typecode = 'B' if n_entries <= 0x100 else 'H' if n_entries <= 0x10000 else 'I'
+    indexes = array(typecode, map(entries.__getitem__, values))
+    out.append(indexes.itemsize)
+    _put_array(out, indexes)
+
+def _put_column(out: bytearray, name: str, values: list, rows: list):
+    _put_name(out, name)
+    types = set(map(type, values))
+    if len(types) == 1:
+        value_type = types.pop()
+        if value_type is int:
+            min_value, max_value = min(values), max(values)
+            if _INT32_MIN <= min_value and max_value <= _INT32_MAX:
+                out.append(COLUMN_TYPES["int32"])
+                _put_array(out, array('i', values))
+                return
+            if _INT64_MIN <= min_value and max_value <= _INT64_MAX:
+                out.append(COLUMN_TYPES["int64"])
+                _put_array(out, array('q', values))
+                return
+        elif value_type is str:
+            _put_str(out, values)
+            return
+        elif value_type is float:
+            out.append(COLUMN_TYPES["float64"])
+            _put_array(out, array('d', values))
+            return
+        elif value_type is bool:
+            out.append(COLUMN_TYPES["bool"])
+            out += bytes(values)
+            return
+    _put_json(out, values, rows, name)
+
+def _is_table(value) -> bool:
+    if not isinstance(value, list) or len(value) == 0 or not isinstance(value[0], BaseModel):
+        return False
+    return len(set(map(type, value))) == 1
+
+def encode_columnar(data: BaseModel) -> bytes:
+    """Encode a model in the columnar format: its non empty list-of-model fields
+    (with rows of a single class) as tables, the other fields as json."""
+    tables = [name for name in data.__fields__ if _is_table(getattr(data, name))]
+    if len(tables) > 255:
+        raise Exception("Too many list fields for columnar output")
+    other = data.json(exclude=set(tables), exclude_unset=True, exclude_none=True).encode('utf-8')
+    out = bytearray(COLUMNAR_MAGIC)
+    out += struct.pack('<BBI', COLUMNAR_VERSION, len(tables), len(other))
+    out += other
+    for name in tables:
+        rows = getattr(data, name)
+        columns = list(rows[0].__fields__)
+        _put_name(out, name)
+        out += struct.pack('<IH', len(rows), len(columns))
+        for column in columns:
+            _put_column(out, column, list(map(attrgetter(column), rows)), rows)
+    return bytes(out)
+
+###
+# Decoding (tests and python clients)
+
+class _Reader:
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def take(self, size: int) -> memoryview:
+        if self.offset + size > len(self.data):
+            raise Exception("Insufficient data for columnar output")
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def name(self) -> str:
+        size, = self.unpack('<H')
+        return str(self.take(size), 'utf-8')
+
+    def array(self, typecode: str, length: int) -> list:
+        values = array(typecode)
+        self.offset += -self.offset % values.itemsize
+        values.frombytes(self.take(length * values.itemsize))
+        if _BIG_ENDIAN:
+            values.byteswap()
+        return values.tolist()
+
+def is_columnar(data: bytes) -> bool:
+    return data[:len(COLUMNAR_MAGIC)] == COLUMNAR_MAGIC
+
+def decode_columnar(data: bytes) -> dict:
+    """Decode a columnar output to plain data (rows as dicts, null values dropped
+    as in the json format)."""
+    if not is_columnar(data):
+        raise Exception("Invalid columnar output")
+    reader = _Reader(data)
+    reader.offset = len(COLUMNAR_MAGIC)
+    version, n_tables, other_size = reader.unpack('<BBI')
+    if version != COLUMNAR_VERSION:
+        raise Exception(f"Unsupported columnar version {version}")
+    obj = json.loads(bytes(reader.take(other_size)))
+    for _ in range(n_tables):
+        name = reader.name()
+        n_rows, n_columns = reader.unpack('<IH')
+        rows = [{} for _ in range(n_rows)]
+        for _ in range(n_columns):
+            column = reader.name()
+            column_type, = reader.unpack('<B')
+            if column_type == COLUMN_TYPES["int32"]: values = reader.array('i', n_rows)
+            elif column_type == COLUMN_TYPES["int64"]: values = reader.array('q', n_rows)
+            elif column_type == COLUMN_TYPES["float64"]: values = reader.array('d', n_rows)
+            elif column_type == COLUMN_TYPES["bool"]: values = [b != 0 for b in reader.take(n_rows)]
+            elif column_type == COLUMN_TYPES["str"]:
+                n_entries, = reader.unpack('<I')
+                offsets = reader.array('I', n_entries + 1)
+                blob = bytes(reader.take(offsets[-1]))
+                entries = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(n_entries)]
+                width, = reader.unpack('<B')
+                typecode = {1: 'B', 2: 'H', 4: 'I'}.get(width)
+                if typecode is None:
+                    raise Exception(f"Invalid columnar index width {width}")
+                values = [entries[i] for i in reader.array(typecode, n_rows)]
+            elif column_type == COLUMN_TYPES["json"]:
+                size, = reader.unpack('<I')
+                values = json.loads(bytes(reader.take(size)))
+            else:
+                raise Exception(f"Invalid columnar column type {column_type}")
+            if len(values) != n_rows:
+                raise Exception(f"Invalid columnar column {column}")
+            for row, value in zip(rows, values):
+                if value is not None:
+                    row[column] = value
+        obj[name] = rows
+    return obj
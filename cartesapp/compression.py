@@ -0,0 +1,149 @@
+from os import getenv
+import io
+import zlib
+
+###
+# Configs
+
+COMPRESS_MAX_SIZE = int(getenv('CARTESAPP_COMPRESS_MAX_SIZE') or 33554432) # 32 MB decompressed payload
+COMPRESS_LEVEL = int(getenv('CARTESAPP_COMPRESS_LEVEL') or 6)
+DECOMPRESS_BLOCK_SIZE = 65536
+OUTPUT_COMPRESS_LEVEL = int(getenv('CARTESAPP_OUTPUT_COMPRESS_LEVEL') or 1) # outputs are compressed on every request: favor speed
+
+# first byte of a compressed mutation payload (after header/proxy)
+COMPRESSION_FLAGS = {
+    "none": 0,
+    "deflate": 1,
+    "zstd": 2,
+}
+
+# prefix of compressed outputs (*_deflate output formats), not a valid json start
+COMPRESSED_OUTPUT_MAGIC = b'\x00dfl'
+
+###
+# Helpers
+
+def _get_zstd():
+    try:
+        from compression import zstd # python >= 3.14
+        return zstd
+    except ModuleNotFoundError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ModuleNotFoundError:
+        return None
+
+def zstd_available() -> bool:
+    return _get_zstd() is not None
+
+def get_compress_configs(compress) -> dict:
+    """Normalize the ``compress`` option of ``@mutation`` (True, an algorithm name
+    or a dict with algorithm/level/max_size)."""
+    configs = {"algorithm": "deflate", "level": COMPRESS_LEVEL, "max_size": COMPRESS_MAX_SIZE}
+    if isinstance(compress, str):
+        configs["algorithm"] = compress
+    elif isinstance(compress, dict):
+        unknown = set(compress.keys()).difference(configs.keys())
+        if len(unknown) > 0:
+            raise Exception(f"Invalid compress configs {unknown}")
+        configs.update(compress)
+    elif compress is not True:
+        raise Exception("Compress option must be True, an algorithm name or a dict of configs")
+    if configs["algorithm"] not in COMPRESSION_FLAGS or configs["algorithm"] == "none":
+        raise Exception(f"Invalid compression algorithm {configs['algorithm']}")
+    if configs["algorithm"] == "zstd" and not zstd_available():
+        raise Exception("zstd compression requires python >= 3.14 or the zstandard package")
+    return configs
+
+def compress_payload(payload: bytes, configs: dict) -> bytes:
+    """Compress an encoded mutation payload, prefixed with its compression flag.
+    Payloads that don't shrink are sent as is (flag none)."""
+    algorithm = configs["algorithm"]
+    if algorithm == "deflate":
+        compressed = zlib.compress(payload, configs["level"])
+    else:
+        zstd = _get_zstd()
+        if zstd is None:
+            raise Exception("zstd compression is not available")
+        compressed = zstd.compress(payload, level=configs["level"])
+    if len(compressed) >= len(payload):
+        return bytes([COMPRESSION_FLAGS["none"]]) + payload
+    return bytes([COMPRESSION_FLAGS[algorithm]]) + compressed
+
+def decompress_payload(payload: bytes, configs: dict) -> bytes | bytearray:
+    """Decompress a flagged mutation payload. Decompression is streamed in blocks
+    straight into the output buffer and aborts as soon as it goes over max_size."""
+    if len(payload) == 0:
+        raise Exception("Compressed payload is missing the compression flag")
+    flag = payload[0]
+    max_size = configs["max_size"]
+    data = memoryview(payload)[1:]
+    if flag == COMPRESSION_FLAGS["none"]:
+        if len(data) > max_size:
+            raise Exception(f"Payload exceeds maximum size {max_size}")
+        return data.tobytes()
+    if flag == COMPRESSION_FLAGS["deflate"]:
+        return _inflate(data, max_size)
+    if flag == COMPRESSION_FLAGS["zstd"]:
+        zstd = _get_zstd()
+        if zstd is None:
+            raise Exception("zstd compression is not available")
+        if hasattr(zstd, 'ZstdFile'):
+            reader = zstd.ZstdFile(io.BytesIO(data))
+        else:
+            reader = zstd.ZstdDecompressor().stream_reader(io.BytesIO(data))
+        return _read_bounded(reader, max_size)
+    raise Exception(f"Unknown compression flag {flag}")
+
+def _inflate(data, max_size: int) -> bytearray:
+    # input is fed in bounded slices, so the unconsumed tails zlib copies stay small
+    data = memoryview(data)
+    decompressor = zlib.decompressobj()
+    out = bytearray()
+    pos = 0
+    pending = b''
+    while not decompressor.eof:
+        if not pending:
+            if pos >= len(data):
+                raise Exception("Truncated compressed payload")
+            pending = data[pos:pos + DECOMPRESS_BLOCK_SIZE]
+            pos += DECOMPRESS_BLOCK_SIZE
+        block = decompressor.decompress(pending, DECOMPRESS_BLOCK_SIZE)
+        pending = decompressor.unconsumed_tail
+        if len(out) + len(block) > max_size:
+            raise Exception(f"Decompressed payload exceeds maximum size {max_size}")
+        out += block
+    if decompressor.unused_data or pos < len(data):
+        raise Exception("Unexpected data after the compressed payload")
+    return out
+
+def _read_bounded(reader, max_size: int) -> bytearray:
+    out = bytearray()
+    with reader:
+        while True:
+            block = reader.read(DECOMPRESS_BLOCK_SIZE)
+            if not block:
+                break
+            if len(out) + len(block) > max_size:
+                raise Exception(f"Decompressed payload exceeds maximum size {max_size}")
+            out += block
+    return out
+
+def compress_output(body: bytes, level: int = OUTPUT_COMPRESS_LEVEL) -> bytes:
+    """Deflate an output body (zlib stream after COMPRESSED_OUTPUT_MAGIC). Bodies
+    that don't shrink are sent as is: clients only inflate prefixed outputs."""
+    compressed = zlib.compress(body, level)
+    if len(compressed) + len(COMPRESSED_OUTPUT_MAGIC) >= len(body):
+        return body
+    return COMPRESSED_OUTPUT_MAGIC + compressed
+
+def is_compressed_output(data: bytes) -> bool:
+    return data[:len(COMPRESSED_OUTPUT_MAGIC)] == COMPRESSED_OUTPUT_MAGIC
+
+def decompress_output(data: bytes, max_size: int = COMPRESS_MAX_SIZE) -> bytes | bytearray:
+    """Inverse of compress_output (outputs without the prefix are returned as is)."""
+    if not is_compressed_output(data):
+        return data
+    return _inflate(memoryview(data)[len(COMPRESSED_OUTPUT_MAGIC):], max_size)
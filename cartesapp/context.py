@@ -1,6 +1,8 @@
 from cartesi import Rollup, RollupMetadata
 from pydantic import BaseModel
 
+from cartesapp.setting import Setting, ModuleConfig
+
 
 ###
 # Context
@@ -10,6 +12,7 @@ class Context(object):
     metadata: RollupMetadata | None = None
     ledger = None
     module: str | None = None
+    module_config: ModuleConfig | None = None # resolved settings of module
     # Output indexing uses two deliberately different counters (see the indexer's
     # add_output_index). Reports are diagnostic / not on-chain-verifiable and are
     # numbered PER-INPUT, so n_reports/n_input_reports reset every request (in
@@ -28,6 +31,11 @@ class Context(object):
     app_contract: str | None = None
     input_payload: BaseModel | None = None
     set_input_indexes: bool = False
+    report_recorder: list | None = None # reports sent by a cached query
+    # Advance outputs are queued as (rollup method, payload, index call | None) and
+    # only sent once the mutation committed (see defer_outputs)
+    output_queue: list | None = None
+    output_mark: tuple | None = None
 
     def __new__(cls):
         return cls
@@ -39,11 +47,16 @@ class Context(object):
         # TODO: change this when migrating to lambda state
         if cls.app_contract is None and metadata is not None:
             cls.app_contract = metadata.app_contract
-        cls.module = module
+        cls.set_module(module)
         cls.n_reports = 0
         cls.n_input_reports = 0
         cls.configs = kwargs
 
+    @classmethod
+    def set_module(cls, module: str):
+        cls.module = module
+        cls.module_config = Setting.get_config(module)
+
     @classmethod
     def set_input(cls, input_payload: BaseModel):
         cls.input_payload = input_payload
@@ -53,11 +66,15 @@ class Context(object):
         cls.rollup = None
         cls.metadata = None
         cls.module = None
+        cls.module_config = None
         cls.n_reports= 0
         cls.n_input_reports = 0
         cls.configs = None
         cls.input_payload = None
         cls.set_input_indexes = False
+        cls.report_recorder = None
+        cls.output_queue = None
+        cls.output_mark = None
 
     @classmethod
     def reset(cls):
@@ -69,6 +86,27 @@ class Context(object):
         cls.n_delegate_call_vouchers = 0
         cls.n_outputs = 0
 
+    @classmethod
+    def defer_outputs(cls):
+        """Queue the outputs of this input until the mutation is finalized."""
+        cls.output_queue = []
+        cls.output_mark = cls.mark_outputs()
+
+    @classmethod
+    def mark_outputs(cls) -> tuple:
+        return (len(cls.output_queue),cls.n_notices,cls.n_vouchers,cls.n_delegate_call_vouchers,cls.n_outputs)
+
+    @classmethod
+    def discard_outputs(cls, mark: tuple | None = None):
+        """Drop the outputs queued after mark (default: all of this input) and
+        restore the output counters. Reports are kept (the node keeps the reports
+        of rejected inputs), without their index rows."""
+        if mark is None: mark = cls.output_mark
+        start = mark[0]
+        kept = [(method,payload,None) for method,payload,_ in cls.output_queue[start:] if method == 'report']
+        cls.output_queue[start:] = kept
+        _,cls.n_notices,cls.n_vouchers,cls.n_delegate_call_vouchers,cls.n_outputs = mark
+
     @classmethod
     def inc_reports(cls):
         cls.n_reports += 1
@@ -1,4 +1,3 @@
-import os
 import logging
 from typing import get_type_hints, Dict, Any
 import traceback
@@ -10,10 +9,14 @@ from pydantic import BaseModel
 from cartesi import Rollup, RollupData, URLParameters, abi
 from cartesi.models import ABIFunctionSelectorHeader
 
-from cartesapp.storage import helpers
+from cartesapp.storage import Storage, helpers
 from cartesapp.context import Context
-from cartesapp.output import add_output, index_input as _index_input
-from cartesapp.utils import bytes2hex, str2hex, convert_camel_case, get_function_signature, EmptyClass, InputFormat
+from cartesapp.output import add_output, replay_report, send_report_stream, write_output_indexes, flush_outputs, index_input as _index_input
+from cartesapp.cache import QueryCache, PartCache
+from cartesapp.codec import encode_model, decode_to_model
+from cartesapp.compression import compress_payload, decompress_payload, get_compress_configs
+from cartesapp.multicall import Multicall, MULTICALL_HEADER, MULTICALL_MODULE, MULTICALL_MAX_CALLS
+from cartesapp.utils import bytes2hex, hex2bytes, str2hex, convert_camel_case, get_function_signature, EmptyClass, InputFormat
 
 
 LOGGER = logging.getLogger(__name__)
@@ -42,7 +45,7 @@ def query(**kwargs):
         return func
     return decorator
 
-splittable_query_params = {"part":(int,None)}
+splittable_query_params = {"part":(int,None),"parts":(int,None)}
 
 # Mutation
 class Mutation:
@@ -64,12 +67,7 @@ class Mutation:
         cls.configs = {}
         cls.add_input_index = None
 
-# TODO: decorator params to allow chunked and compressed mutations
 def mutation(**kwargs):
-    if kwargs.get('chunk') is not None:
-        LOGGER.warning("Chunking inputs is not implemented yet")
-    if kwargs.get('compress') is not None:
-        LOGGER.warning("Compressing inputs is not implemented yet")
     def decorator(func):
         Mutation.add(func,**kwargs)
         return func
@@ -95,66 +93,148 @@ def _emit_handler_error(e: Exception, **add_output_kwargs) -> None:
         add_output(msg, **add_output_kwargs)
 
 
-def _finalize_mutation(res: bool) -> None:
-    """Persistence policy for mutations: commit on truthy result, else roll back."""
+def _finalize_mutation(res: bool) -> bool:
+    """Persistence policy for mutations: commit on truthy result, else roll back.
+    Queued outputs are indexed before the commit (discarded on rollback) and sent
+    after it. A commit invalidates the cached query results that may have changed.
+    Returns the final result (False if indexing the outputs failed)."""
+    if res:
+        try:
+            write_output_indexes()
+        except Exception as e:
+            _emit_handler_error(e, tags=['error'])
+            res = False
     if not res:
+        if Context.output_queue is not None: Context.discard_outputs()
         helpers.rollback()
     else:
         helpers.commit()
-        os.sync()
+        QueryCache.on_commit()
+        PartCache.on_commit()
+        Storage.sync()
+    flush_outputs()
+    return res
 
 
 def _finalize_query() -> None:
-    """Persistence policy for queries: always roll back (queries are read-only)."""
+    """Persistence policy for queries: always roll back (queries are read-only,
+    and run on a query_only connection when the storage has one)."""
     helpers.rollback()
 
 
-def _decode_url_params(model, params: URLParameters, func_configs: dict) -> list:
+def _run_query(func, param_list: list, func_configs: dict):
+    """Call the query, or replay its reports from the query cache (cache option)
+    or, for splittable outputs, from the part cache. The rows of streaming queries
+    are sent as they are yielded."""
+    if func_configs.get('stream'):
+        res = send_report_stream(func(*param_list))
+        return True if res is None else res
+    cache_class = QueryCache
+    cache = func_configs.get('cache')
+    if cache is None:
+        cache_class = PartCache
+        cache = func_configs.get('part_cache')
+        if cache is None:
+            return func(*param_list)
+    ctx = Context
+    # the page (cursor/limit) of paginated queries is in the extended params, the
+    # part cache serves every part of the output from the same entry
+    extended_params = func_configs.get('extended_params')
+    if extended_params is not None:
+        extended_params = extended_params.json(exclude={'part','parts'} if cache_class is PartCache else None)
+    key = (cache['route'], func_configs.get('query_format'), param_list[-1].json() if param_list else None, extended_params)
+    if cache_class is PartCache:
+        key = PartCache.key(*key)
+    entry = cache_class.get(key)
+    if entry is not None:
+        for body, class_name, kwargs in entry[1]:
+            replay_report(body, class_name, **kwargs)
+        return entry[0]
+    ctx.report_recorder = []
+    res = func(*param_list)
+    if res:
+        cache_class.put(key, res, ctx.report_recorder)
+    ctx.report_recorder = None
+    return res
+
+
+def _is_list_hint(hint) -> bool:
+    field_str = str(hint)
+    return field_str.startswith('typing.List') or field_str.startswith('typing.Optional[typing.List')
+
+
+class DecodePlan:
+    """Per-route decode layout, computed once when the query is registered.
+
+    Holds the model field order, which fields take every value of a repeated URL
+    query parameter (list fields), which fields can be filled from path params,
+    and the extra fields of the splittable ``extended_model`` (in declaration
+    order). The request wrappers only walk these tuples on each inspect.
+    """
+    __slots__ = ('model', 'fields', 'field_set', 'url_fields', 'path_fields',
+                 'extended_model', 'extended_fields', 'extended_url_fields')
+
+    def __init__(self, model, extended_model=None, path_params=None):
+        hints = get_type_hints(model)
+        self.model = model
+        self.fields = tuple(model.__fields__.keys())
+        self.field_set = frozenset(self.fields)
+        self.url_fields = tuple((k, _is_list_hint(hints[k])) for k in self.fields)
+        # without the route config any field may come from the path (legacy behavior)
+        self.path_fields = self.fields if path_params is None else tuple(k for k in self.fields if k in path_params)
+        self.extended_model = extended_model
+        self.extended_fields = None
+        self.extended_url_fields = ()
+        if extended_model is not None:
+            extended_hints = get_type_hints(extended_model)
+            self.extended_fields = tuple(k for k in extended_model.__fields__.keys() if k not in self.field_set)
+            self.extended_url_fields = tuple((k, _is_list_hint(extended_hints[k])) for k in self.extended_fields)
+
+
+def _get_decode_plan(model, func_configs: dict) -> DecodePlan:
+    plan = func_configs.get("decode_plan")
+    if plan is None or plan.model is not model:
+        plan = DecodePlan(model, func_configs.get("extended_model"))
+    return plan
+
+
+def _decode_url_params(model, params: URLParameters, func_configs: dict, plan: DecodePlan | None = None) -> list:
     """Decode URL query/path parameters into a model instance (URL strategy).
 
-    Mutates func_configs['extended_params'] when a splittable extended model is set.
+    Uses the route's precomputed ``DecodePlan`` (built on the fly when absent).
+    Mutates func_configs['extended_params'] when an extended model (splittable or
+    paginated query) is set.
     """
-    hints = get_type_hints(model)
-    fields = []
-    values = []
-    model_fields = model.__fields__.keys()
-    for k in model_fields:
-        if k in params.query_params:
-            field_str = str(hints[k])
-            if field_str.startswith('typing.List') or field_str.startswith('typing.Optional[typing.List'):
-                fields.append(k)
-                values.append(params.query_params[k])
-            else:
-                fields.append(k)
-                values.append(params.query_params[k][0])
-        if k in params.path_params:
-            fields.append(k)
-            values.append(params.path_params[k])
-    param = model.parse_obj(dict(zip(fields, values)))
-
-    extended_model = func_configs.get("extended_model")
-    if extended_model is not None:
-        extended_hints = get_type_hints(extended_model)
-        for k in list(set(extended_model.__fields__.keys()).difference(model_fields)):
-            if k in params.query_params:
-                field_str = str(extended_hints[k])
-                if field_str.startswith('typing.List') or field_str.startswith('typing.Optional[typing.List'):
-                    fields.append(k)
-                    values.append(params.query_params[k])
-                else:
-                    fields.append(k)
-                    values.append(params.query_params[k][0])
-        func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
+    if plan is None:
+        plan = _get_decode_plan(model, func_configs)
+    query_params = params.query_params
+    path_params = params.path_params
+    data = {}
+    for k, is_list in plan.url_fields:
+        if k in query_params:
+            data[k] = query_params[k] if is_list else query_params[k][0]
+    if path_params:
+        for k in plan.path_fields:
+            if k in path_params:
+                data[k] = path_params[k]
+    param = model.parse_obj(data)
+
+    if plan.extended_model is not None:
+        for k, is_list in plan.extended_url_fields:
+            if k in query_params:
+                data[k] = query_params[k] if is_list else query_params[k][0]
+        func_configs["extended_params"] = plan.extended_model.parse_obj(data)
     return [param]
 
 
-def _decode_json_request(model, has_param: bool, data: dict, func_configs: dict) -> list:
+def _decode_json_request(model, has_param: bool, data: dict, func_configs: dict, plan: DecodePlan | None = None) -> list:
     """Decode a JSON / JSON-RPC inspect payload (JSON strategy).
 
     Sets func_configs['query_format'] (json vs jsonrpc), ['id'] for jsonrpc, and
-    ['extended_params'] for splittable queries. Returns the positional param list.
+    ['extended_params'] for splittable/paginated queries. Returns the positional param list.
     """
     func_configs["query_format"] = InputFormat.json
+    func_configs.pop("extended_params", None) # not sent: defaults (don't keep the last request's)
     if data.get("jsonrpc") == "2.0":
         req_id = data.get('id')
         if req_id is None: raise Exception("Missing id parameters for jsonrpc request")
@@ -164,14 +244,14 @@ def _decode_json_request(model, has_param: bool, data: dict, func_configs: dict)
     if not has_param:
         return []
 
+    if plan is None:
+        plan = _get_decode_plan(model, func_configs)
     params = data.get('params')
     fields = []
     values = []
-    model_fields = list(model.__fields__.keys())
-    extended_model = func_configs.get("extended_model")
-    diff_fields = None
-    if extended_model is not None:
-        diff_fields = list(set(extended_model.__fields__.keys()).difference(model_fields))
+    model_fields = plan.fields
+    extended_model = plan.extended_model
+    diff_fields = plan.extended_fields
     if type(params) == type([]):
         for i in range(min(len(params),len(model_fields))):
             fields.append(model_fields[i])
@@ -185,14 +265,15 @@ def _decode_json_request(model, has_param: bool, data: dict, func_configs: dict)
             func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
     elif type(params) == type({}):
         for k in params:
-            if k in model_fields:
+            if k in plan.field_set:
                 fields.append(k)
                 values.append(params[k])
         param = model.parse_obj(dict(zip(fields, values)))
         if diff_fields is not None and extended_model is not None and len(params) > len(values):
             for k in diff_fields:
-                fields.append(k)
-                values.append(params[k])
+                if k in params:
+                    fields.append(k)
+                    values.append(params[k])
             func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
     else:
         if len(model_fields) >= 1:
@@ -209,12 +290,9 @@ def _decode_json_request(model, has_param: bool, data: dict, func_configs: dict)
     return [param]
 
 
-def _decode_advance_payload(all_payload_bytes: bytes, model, has_param: bool, kwargs: dict) -> list:
-    """Decode an advance (mutation) ABI payload (ABI strategy).
-
-    Strips the 4-byte selector header when present, applies the proxy msg_sender
-    override (with a length guard), then ABI-decodes the remainder into the model.
-    Reads/writes Context.metadata for the proxy case.
+def _strip_advance_payload(all_payload_bytes: bytes, kwargs: dict) -> bytes:
+    """Strip the 4-byte selector header when present and apply the proxy msg_sender
+    override (with a length guard). Reads/writes Context.metadata for the proxy case.
     """
     payload_index = 4 if kwargs.get('has_header') else 0
     if kwargs.get('has_proxy') and Context.metadata:
@@ -225,30 +303,58 @@ def _decode_advance_payload(all_payload_bytes: bytes, model, has_param: bool, kw
         Context.metadata.msg_sender = new_msg_sender
         payload_index = new_payload_index
         # TODO: right now proxy overrides msg_sender, todo allow both
-    payload = all_payload_bytes[payload_index:]
+    return all_payload_bytes[payload_index:]
+
+
+def _decode_advance_model(payload: bytes, model, has_param: bool, kwargs: dict) -> list:
     if not has_param:
         return []
+    if kwargs.get('compress') is not None:
+        payload = decompress_payload(payload, kwargs['compress'])
     decode_params: Dict[str, Any] = {"data": payload, "model": model}
     is_packed = kwargs.get('packed')
     if is_packed is not None: decode_params["packed"] = is_packed
-    return [abi.decode_to_model(**decode_params)]
+    return [decode_to_model(**decode_params)]
+
+
+def _decode_advance_payload(all_payload_bytes: bytes, model, has_param: bool, kwargs: dict) -> list:
+    """Decode an advance (mutation) ABI payload (ABI strategy).
+
+    Strips the 4-byte selector header when present, applies the proxy msg_sender
+    override (with a length guard), then ABI-decodes the remainder into the model
+    (decompressing it first for compressed mutations). Reads/writes Context.metadata for the proxy case.
+    """
+    payload = _strip_advance_payload(all_payload_bytes, kwargs)
+    return _decode_advance_model(payload, model, has_param, kwargs)
+
+
+def _collect_advance_chunk(all_payload_bytes: bytes, route: str, kwargs: dict) -> bytes | None:
+    """Chunked mutations: store the chunk and return the reassembled payload once
+    the upload is complete (None while chunks are still missing)."""
+    from cartesapp.chunk import add_input_chunk
+    payload = _strip_advance_payload(all_payload_bytes, kwargs)
+    metadata = Context.metadata
+    if metadata is None:
+        raise Exception("Can't receive chunks without advance context")
+    return add_input_chunk(route, metadata.msg_sender, metadata.block_timestamp, payload, kwargs['chunk'])
 
 
 ###
 # Helpers
 
 def _make_url_query(func,model,has_param,module,**func_configs):
-    @helpers.db_session
+    plan = _get_decode_plan(model, func_configs) if has_param else None
+    @Storage.query_session
     def query(rollup: Rollup, params: URLParameters) -> bool:
         res: bool = False
         ctx = Context
         try:
             func_configs["query_format"] = InputFormat.url
-            param_list = _decode_url_params(model, params, func_configs) if has_param else []
+            param_list = _decode_url_params(model, params, func_configs, plan) if has_param else []
             if has_param:
                 ctx.set_input(param_list[-1])
             ctx.set_context(rollup,None,module,**func_configs)
-            res = func(*param_list)
+            res = _run_query(func, param_list, func_configs)
         except Exception as e:
             _emit_handler_error(e)
         finally:
@@ -259,17 +365,18 @@ def _make_url_query(func,model,has_param,module,**func_configs):
 
 
 def _make_json_query(func,model,has_param,module,**func_configs):
-    @helpers.db_session
+    plan = _get_decode_plan(model, func_configs) if has_param else None
+    @Storage.query_session
     def query(rollup: Rollup, raw_data: RollupData) -> bool:
         res: bool = False
         ctx = Context
         try:
             data = raw_data.json_payload()
-            param_list = _decode_json_request(model, has_param, data, func_configs)
+            param_list = _decode_json_request(model, has_param, data, func_configs, plan)
             if param_list:
                 ctx.set_input(param_list[-1])
             ctx.set_context(rollup,None,module,**func_configs)
-            res = func(*param_list)
+            res = _run_query(func, param_list, func_configs)
         except Exception as e:
             _emit_handler_error(e, error=True)
         finally:
@@ -278,21 +385,99 @@ def _make_json_query(func,model,has_param,module,**func_configs):
         return res
     return query
 
+def _run_mutation(func, model, has_param, route, payload: bytes, kwargs: dict) -> bool:
+    """Decode an advance payload and call the mutation. Session, commit and
+    Context setup are left to the caller (single input or multicall)."""
+    if kwargs.get('chunk') is not None:
+        payload = _collect_advance_chunk(payload, route, kwargs)
+        if payload is None: # upload incomplete: keep the stored chunk
+            return True
+        param_list = _decode_advance_model(payload, model, has_param, kwargs)
+    else:
+        param_list = _decode_advance_payload(payload, model, has_param, kwargs)
+    if has_param:
+        Context.set_input(param_list[-1])
+    return func(*param_list)
+
 def _make_mut(func,model,has_param,module, **kwargs):
+    route = f"{module}.{func.__name__}"
     @helpers.db_session(strict=True)
     def mut(rollup: Rollup, data: RollupData) -> bool:
         res: bool = False
         ctx = Context
         try:
             ctx.set_context(rollup,data.metadata,module,**kwargs)
-            param_list = _decode_advance_payload(data.bytes_payload(), model, has_param, kwargs)
-            if has_param:
-                ctx.set_input(param_list[-1])
-            res = func(*param_list)
+            ctx.defer_outputs()
+            res = _run_mutation(func, model, has_param, route, data.bytes_payload(), kwargs)
+        except Exception as e:
+            _emit_handler_error(e, tags=['error'])
+        finally:
+            res = _finalize_mutation(res)
+            ctx.clear_context()
+        return res
+    return mut
+
+def _make_mut_call(func,model,has_param,module, **kwargs):
+    """Multicall sub-call: runs inside the multicall session and keeps the
+    input's report counters (only module/configs/input are switched). Each call
+    may index the input once, so a batch writes one input index row per call
+    (the row of a discarded call is dropped with its outputs)."""
+    route = f"{module}.{func.__name__}"
+    def call(payload: bytes) -> bool:
+        ctx = Context
+        ctx.set_module(module)
+        ctx.configs = kwargs
+        ctx.input_payload = None
+        ctx.set_input_indexes = False
+        return _run_mutation(func, model, has_param, route, payload, kwargs)
+    return call
+
+def _run_multicall(calls_router, batch: Multicall, msg_sender: str | None) -> bool:
+    ctx = Context
+    for i, call in enumerate(batch.calls):
+        res = False
+        mark = ctx.mark_outputs()
+        try:
+            op = calls_router.get_advance_op(call, msg_sender)
+            if op is None:
+                raise Exception(f"No mutation found for call {i}")
+            res = op.handler(call)
+        except Exception as e:
+            if batch.atomic:
+                raise Exception(f"Call {i} failed: {e}")
+            _emit_handler_error(e, tags=['error'])
+        if not res:
+            if batch.atomic:
+                return False
+            LOGGER.warning(f"Multicall call {i} failed, discarding its changes")
+            ctx.discard_outputs(mark)
+            helpers.rollback()
+        elif not batch.atomic:
+            # keep what already succeeded if a later call fails (Storage.sync only once)
+            write_output_indexes()
+            helpers.commit()
+            QueryCache.on_commit()
+            PartCache.on_commit()
+            ctx.output_mark = ctx.mark_outputs()
+    return True
+
+def _make_multicall(calls_router):
+    configs = {'has_header': True}
+    @helpers.db_session(strict=True)
+    def mut(rollup: Rollup, data: RollupData) -> bool:
+        res: bool = False
+        ctx = Context
+        try:
+            ctx.set_context(rollup,data.metadata,MULTICALL_MODULE,**configs)
+            ctx.defer_outputs()
+            batch = _decode_advance_payload(data.bytes_payload(), Multicall, True, configs)[0]
+            if len(batch.calls) > MULTICALL_MAX_CALLS:
+                raise Exception(f"Multicall exceeds maximum number of calls {MULTICALL_MAX_CALLS}")
+            res = _run_multicall(calls_router, batch, data.metadata.msg_sender)
         except Exception as e:
             _emit_handler_error(e, tags=['error'])
         finally:
-            _finalize_mutation(res)
+            res = _finalize_mutation(res)
             ctx.clear_context()
         return res
     return mut
@@ -300,6 +485,27 @@ def _make_mut(func,model,has_param,module, **kwargs):
 index_input = _index_input
 
 def encode_advance_input(func = None, model: BaseModel | None = None) -> str:
+    """Encode a mutation input. Chunked mutations get a single-chunk upload (see
+    ``encode_chunked_advance_input`` to split large payloads)."""
+    return _encode_advance_inputs(func, model)[0]
+
+def encode_chunked_advance_input(func = None, model: BaseModel | None = None, chunk_size: int | None = None, upload_id: int | None = None) -> list[str]:
+    """Encode a chunked mutation input as the list of advance payloads to send in order."""
+    return _encode_advance_inputs(func, model, True, chunk_size, upload_id)
+
+def encode_batch_advance_input(calls: list, atomic: bool = True) -> str:
+    """Encode a multicall input from (func, model) pairs, run in order in a single
+    advance. Atomic batches are all-or-nothing, otherwise failed calls are skipped."""
+    payloads = []
+    for func, model in calls:
+        orig_mod_name,func_name = get_function_signature(func)
+        configs = Mutation.configs[f"{orig_mod_name}.{func_name}"]
+        if configs.get('chunk') is not None or configs.get('proxy') is not None or configs.get('no_header'):
+            raise Exception(f"Mutation {orig_mod_name}.{func_name} can't be batched")
+        payloads.append(hex2bytes(_encode_advance_inputs(func, model)[0]))
+    return bytes2hex(MULTICALL_HEADER.to_bytes() + encode_model(Multicall(atomic=atomic, calls=payloads)))
+
+def _encode_advance_inputs(func = None, model: BaseModel | None = None, split: bool = False, chunk_size: int | None = None, upload_id: int | None = None) -> list[str]:
     orig_mod_name,func_name = get_function_signature(func)
     configs = Mutation.configs[f"{orig_mod_name}.{func_name}"]
     mod_name = configs.get('module_name') if configs.get('module_name') is not None else orig_mod_name
@@ -317,8 +523,21 @@ def encode_advance_input(func = None, model: BaseModel | None = None) -> str:
     param_list = [model]
     if configs.get('packed') is not None:
         param_list.append(configs.get('packed'))
-    data = abi.encode_model(*param_list)
-    return bytes2hex(header + data)
+    data = encode_model(*param_list)
+    if configs.get('compress') is not None:
+        data = compress_payload(data, get_compress_configs(configs['compress']))
+    chunk = configs.get('chunk')
+    if chunk is None:
+        if split:
+            raise Exception(f"Mutation {mod_name}.{func_name} is not chunked")
+        return [bytes2hex(header + data)]
+
+    from cartesapp.chunk import split_payload, get_chunk_configs
+    if not split:
+        chunk_size = max(len(data), 1)
+    elif chunk_size is None:
+        chunk_size = get_chunk_configs(chunk)['chunk_size']
+    return [bytes2hex(header + c) for c in split_payload(data, chunk_size, upload_id)]
 
 def encode_inspect_url_input(func, model: BaseModel) -> str:
     path = generate_url_input(func, model)
@@ -384,6 +603,8 @@ def generate_jsonrpc_input(func, model: BaseModel) -> dict:
     return request_data
 
 encode_mutation_input = encode_advance_input
+encode_chunked_mutation_input = encode_chunked_advance_input
+encode_batch_mutation_input = encode_batch_advance_input
 encode_query_url_input = encode_inspect_url_input
 encode_query_jsonrpc_input = encode_inspect_jsonrpc_input
 encode_query_json_input = encode_inspect_json_input
@@ -2,15 +2,21 @@ import os
 import sys
 import logging
 import importlib
-from inspect import signature
+from inspect import signature, isgeneratorfunction
 from pydantic import create_model
 
-from cartesi import App, ABIRouter, URLRouter, JSONRouter, abi
+from cartesi import App, URLRouter, JSONRouter, abi
 from cartesi.models import ABIFunctionSelectorHeader, ABILiteralHeader
 
 from cartesapp.storage import Storage
+from cartesapp.router import MutationRouter
+from cartesapp.compression import get_compress_configs
+from cartesapp.pagination import get_paginate_configs, paginated_query_params
 from cartesapp.output import Output, PROXY_SUFFIX
-from cartesapp.input import InputFormat, Query, Mutation, _make_mut,  _make_url_query, _make_json_query
+from cartesapp.input import InputFormat, Query, Mutation, DecodePlan, splittable_query_params, _make_mut,  _make_url_query, _make_json_query, _make_mut_call, _make_multicall
+from cartesapp.codec import Codec
+from cartesapp.cache import QueryCache, PartCache, PART_CACHE_ENABLED
+from cartesapp.multicall import Multicall, MULTICALL_ENABLED, MULTICALL_HEADER, MULTICALL_MODULE, MULTICALL_METHOD
 from cartesapp.setting import Setting
 from cartesapp.setup import Setup
 from cartesapp.context import Context
@@ -22,16 +28,13 @@ LOGGER = logging.getLogger(__name__)
 ###
 # Aux
 
-splittable_query_params = {"part":(int,None)}
-
-
 def _build_mutation_header(module_name, func_name, abi_types, configs, seen_selectors):
     """Compute the ABI header used to route a mutation and detect selector clashes.
 
     Returns (header, header_selector) where ``header`` is the ABIHeader object
     attached to the abi_router (or ``None`` when the mutation opts out of headers
     via ``no_header``), and ``header_selector`` is its hex form (used only for
-    duplicate detection and logging). ``seen_selectors`` is mutated in place.
+    duplicate detection and logging). ``seen_selectors`` (a set) is mutated in place.
     """
     if configs.get('no_header'):
         return None, None
@@ -54,10 +57,20 @@ def _build_mutation_header(module_name, func_name, abi_types, configs, seen_sele
     header_selector = header.to_bytes().hex()
     if header_selector in seen_selectors:
         raise Exception(f"Duplicate mutation selector {function_name}")
-    seen_selectors.append(header_selector)
+    seen_selectors.add(header_selector)
     return header, header_selector
 
 
+def _load_mutation_header(module_name, func_name, header_hex, seen_selectors):
+    """Same as ``_build_mutation_header`` for a header hex from the route manifest."""
+    if header_hex is None:
+        return None, None
+    if header_hex in seen_selectors:
+        raise Exception(f"Duplicate mutation selector {module_name}.{func_name}")
+    seen_selectors.add(header_hex)
+    return ABILiteralHeader(header=bytes.fromhex(header_hex)), header_hex
+
+
 def fix_imports():
     sys.path.insert(0,os.getcwd())
     uname = os.uname()
@@ -73,13 +86,16 @@ def fix_imports():
 
 class Manager(object):
     app: App
-    abi_router: ABIRouter
+    abi_router: MutationRouter
+    calls_router: MutationRouter # multicall sub-calls
     url_router: URLRouter
     storage = None
     modules_to_add = []
     queries_info = {}
     mutations_info = {}
     disabled_endpoints = []
+    use_route_manifest = False # ROUTE_MANIFEST setting
+    route_manifest = None # routes computed by the build (see cartesapp.manifest)
 
     def __new__(cls):
         return cls
@@ -103,8 +119,11 @@ class Manager(object):
         cls.queries_info = {}
         cls.mutations_info = {}
         cls.disabled_endpoints = []
+        cls.use_route_manifest = False
+        cls.route_manifest = None
         cls.app = None
         cls.abi_router = None
+        cls.calls_router = None
         cls.url_router = None
         cls.json_router = None
         cls.storage = None
@@ -115,6 +134,9 @@ class Manager(object):
         Setup.reset()
         Storage.reset()
         Context.reset()
+        Codec.reset()
+        QueryCache.reset()
+        PartCache.reset()
 
     @classmethod
     def _import_apps(cls):
@@ -177,6 +199,32 @@ class Manager(object):
             if not Storage.CASE_INSENSITIVITY_LIKE and hasattr(stg,'CASE_INSENSITIVITY_LIKE') and getattr(stg,'CASE_INSENSITIVITY_LIKE'):
                 Storage.CASE_INSENSITIVITY_LIKE = getattr(stg,'CASE_INSENSITIVITY_LIKE')
 
+            if hasattr(stg,'STORAGE_DURABILITY'):
+                if Storage.STORAGE_DURABILITY is not None and Storage.STORAGE_DURABILITY != getattr(stg,'STORAGE_DURABILITY'):
+                    raise Exception("Conflicting storage durability")
+                Storage.STORAGE_DURABILITY = getattr(stg,'STORAGE_DURABILITY')
+
+            if hasattr(stg,'STORAGE_SYNC_INPUTS'):
+                if Storage.STORAGE_SYNC_INPUTS is not None and Storage.STORAGE_SYNC_INPUTS != getattr(stg,'STORAGE_SYNC_INPUTS'):
+                    raise Exception("Conflicting storage sync inputs")
+                Storage.STORAGE_SYNC_INPUTS = getattr(stg,'STORAGE_SYNC_INPUTS')
+
+            if not Storage.STORAGE_EXPLAIN and hasattr(stg,'STORAGE_EXPLAIN') and getattr(stg,'STORAGE_EXPLAIN'):
+                Storage.STORAGE_EXPLAIN = getattr(stg,'STORAGE_EXPLAIN')
+
+            if not cls.use_route_manifest and hasattr(stg,'ROUTE_MANIFEST') and getattr(stg,'ROUTE_MANIFEST'):
+                cls.use_route_manifest = True
+
+            if hasattr(stg,'STORAGE_PROFILE'):
+                if Storage.STORAGE_PROFILE is not None and Storage.STORAGE_PROFILE != getattr(stg,'STORAGE_PROFILE'):
+                    raise Exception("Conflicting storage profile")
+                Storage.STORAGE_PROFILE = getattr(stg,'STORAGE_PROFILE')
+
+            if hasattr(stg,'STORAGE_PRAGMAS'):
+                if Storage.STORAGE_PRAGMAS is not None and Storage.STORAGE_PRAGMAS != getattr(stg,'STORAGE_PRAGMAS'):
+                    raise Exception("Conflicting storage pragmas")
+                Storage.STORAGE_PRAGMAS = getattr(stg,'STORAGE_PRAGMAS')
+
             for f in files_to_import:
                 importlib.import_module(f"{module_name}.{f}")
 
@@ -234,6 +282,31 @@ class Manager(object):
         return path
 
 
+    @classmethod
+    def _get_manifest_route(cls, kind: str, key: str) -> dict | None:
+        if cls.route_manifest is None: return None
+        return cls.route_manifest[kind].get(key)
+
+    @classmethod
+    def _get_handler_model(cls, func, kind: str, key: str, add_to_router=True):
+        """Name and model of the handler parameter (None, EmptyClass without
+        parameter): from the route manifest or reflecting on the signature."""
+        route = cls._get_manifest_route(kind, key) if add_to_router else None
+        if route is not None:
+            param_name = route["param"]
+            return param_name, func.__annotations__[param_name] if param_name is not None else EmptyClass
+
+        sig = signature(func)
+
+        if len(sig.parameters) > 1:
+            raise Exception(f"{kind.capitalize()} shouldn't have more than one parameter")
+
+        it = iter(sig.parameters.items())
+        param = next(it, None)
+        if param is not None:
+            return param[0], param[1].annotation
+        return None, EmptyClass
+
     @classmethod
     def _register_queries(cls, add_to_router=True):
         url_query_selectors = []
@@ -245,25 +318,32 @@ class Manager(object):
             configs = Query.configs[f"{original_module_name}.{func_name}"]
             module_name = configs.get('module_name') if configs.get('module_name') is not None else original_module_name
 
-            sig = signature(func)
-
-            if len(sig.parameters) > 1:
-                raise Exception("Queries shouldn't have more than one parameter")
-
-            it = iter(sig.parameters.items())
-            param = next(it, None)
-            if param is not None:
-                model = param[1].annotation
-            else:
-                model = EmptyClass
+            param_name, model = cls._get_handler_model(func, "queries", f"{module_name}.{func_name}", add_to_router)
 
             original_model = model
             func_configs = {}
+            model_kwargs = {}
+            model_suffix = ""
             if configs.get("splittable_output") is not None and configs["splittable_output"]:
-                model_kwargs = splittable_query_params.copy()
+                model_kwargs.update(splittable_query_params)
+                model_suffix += "Splittable"
+            if configs.get("paginate") is not None and configs["paginate"]:
+                func_configs["paginate"] = get_paginate_configs(configs["paginate"])
+                model_kwargs.update(paginated_query_params)
+                model_suffix += "Paginated"
+            if len(model_kwargs) > 0:
                 model_kwargs["__base__"] = model
-                model = create_model(f"{model.__name__}Splittable",**model_kwargs)
+                model = create_model(f"{model.__name__}{model_suffix}",**model_kwargs)
                 func_configs["extended_model"] = model
+            func_configs["decode_plan"] = DecodePlan(original_model, func_configs.get("extended_model"), configs.get('path_params'))
+            if isgeneratorfunction(func):
+                if configs.get('cache') is not None:
+                    raise Exception(f"Streaming query {module_name}.{func_name} can't be cached")
+                func_configs["stream"] = True
+            elif configs.get('cache') is not None:
+                func_configs["cache"] = QueryCache.add_route(f"{module_name}.{func_name}", configs['cache'])
+            elif func_configs.get("extended_model") is not None and PART_CACHE_ENABLED:
+                func_configs["part_cache"] = PartCache.add_route(f"{module_name}.{func_name}")
 
             stg = Setting.settings.get(module_name)
             query_format = getattr(stg,'QUERY_FORMAT') if stg is not None and hasattr(stg,'QUERY_FORMAT') else None
@@ -287,36 +367,39 @@ class Manager(object):
                 if selector in json_query_selectors:
                     raise Exception(f"Duplicate query selector {module_name}/{func_name}")
                 json_query_selectors.append(selector)
+            cls.queries_info[f"{module_name}.{func_name}"]["param"] = param_name
 
     @classmethod
     def _register_mutations(cls, add_to_router=True):
-        mutation_selectors = []
+        mutation_selectors = set()
+        if add_to_router: cls.calls_router = MutationRouter()
         for func in Mutation.mutations:
             original_module_name, func_name = get_function_signature(func)
             if f"{original_module_name}.{func_name}" in cls.disabled_endpoints: continue
             configs = Mutation.configs[f"{original_module_name}.{func_name}"]
             module_name = configs.get('module_name') if configs.get('module_name') is not None else original_module_name
 
-            sig = signature(func)
-
-            if len(sig.parameters) > 1:
-                raise Exception("Mutations shouldn't have more than one parameter")
-
-            it = iter(sig.parameters.items())
-            param = next(it, None)
-            if param is not None:
-                model = param[1].annotation
-            else:
-                model = EmptyClass
+            param_name, model = cls._get_handler_model(func, "mutations", f"{module_name}.{func_name}", add_to_router)
 
             # using abi router
-            abi_types = abi.get_abi_types_from_model(model)
-            header, header_selector = _build_mutation_header(
-                module_name, func_name, abi_types, configs, mutation_selectors)
+            route = cls._get_manifest_route("mutations", f"{module_name}.{func_name}") if add_to_router else None
+            if route is not None:
+                abi_types = route["abi_types"]
+                header, header_selector = _load_mutation_header(
+                    module_name, func_name, route["header"], mutation_selectors)
+            else:
+                abi_types = abi.get_abi_types_from_model(model)
+                header, header_selector = _build_mutation_header(
+                    module_name, func_name, abi_types, configs, mutation_selectors)
             has_header = header is not None
 
             func_configs = {'has_header':has_header}
             if configs.get('packed'): func_configs['packed'] = configs['packed']
+            if configs.get('chunk') is not None:
+                from cartesapp.chunk import get_chunk_configs
+                func_configs['chunk'] = get_chunk_configs(configs['chunk'])
+            if configs.get('compress') is not None:
+                func_configs['compress'] = get_compress_configs(configs['compress'])
 
             if configs.get('proxy') is not None:
                 if configs.get('msg_sender') is not None:
@@ -326,7 +409,7 @@ class Manager(object):
                 clone_model.__name__ = f"{model.__name__}{PROXY_SUFFIX}"
                 model = clone_model
 
-            cls.mutations_info[f"{module_name}.{func_name}"] = {"selector":header,"module":module_name,"method":func_name,"abi_types":abi_types,"model":model,"configs":configs}
+            cls.mutations_info[f"{module_name}.{func_name}"] = {"selector":header,"module":module_name,"method":func_name,"param":param_name,"abi_types":abi_types,"model":model,"configs":configs,"chunk":func_configs.get('chunk'),"compress":func_configs.get('compress')}
 
             if add_to_router:
                 LOGGER.info(f"Adding mutation {module_name}.{func_name} selector={header_selector}, model={model.__name__}")
@@ -338,7 +421,32 @@ class Manager(object):
                 if proxy is not None:
                     advance_kwargs['msg_sender'] = proxy
                     func_configs['has_proxy'] = True
-                cls.abi_router.advance(**advance_kwargs)(_make_mut(func,model,param is not None,module_name,**func_configs))
+                cls.abi_router.advance(**advance_kwargs)(_make_mut(func,model,param_name is not None,module_name,**func_configs))
+                stg = Setting.settings.get(module_name)
+                multicall = bool(stg is not None and hasattr(stg,'MULTICALL') and getattr(stg,'MULTICALL'))
+                if multicall and has_header and proxy is None and func_configs.get('chunk') is None:
+                    cls.calls_router.advance(**advance_kwargs)(_make_mut_call(func,model,param_name is not None,module_name,**func_configs))
+
+    @classmethod
+    def _register_multicall(cls):
+        if not MULTICALL_ENABLED or len(cls.calls_router.advance_ops) == 0: return
+        multicall_selector = MULTICALL_HEADER.to_bytes().hex()
+        if any(op.header_bytes == MULTICALL_HEADER.to_bytes() for op in cls.abi_router.advance_ops):
+            raise Exception(f"Duplicate mutation selector {MULTICALL_MODULE}.{MULTICALL_METHOD}")
+        LOGGER.info(f"Adding mutation {MULTICALL_MODULE}.{MULTICALL_METHOD} selector={multicall_selector}")
+        cls.abi_router.advance(header=MULTICALL_HEADER)(_make_multicall(cls.calls_router))
+
+    @classmethod
+    def _register_codecs(cls):
+        models = [info["model"] for info in cls.mutations_info.values()]
+        models.extend(info["model"] for info in Output.notices_info.values())
+        models.extend(info["model"] for info in Output.vouchers_info.values())
+        models.append(Multicall)
+        if any(info.get("chunk") is not None for info in cls.mutations_info.values()):
+            from cartesapp.chunk import InputChunk
+            models.append(InputChunk)
+        for model in models:
+            Codec.add(model)
 
     @classmethod
     def _run_setup_functions(cls):
@@ -350,6 +458,11 @@ class Manager(object):
         for app_setup in Setup.post_setup_functions:
             app_setup()
 
+    @classmethod
+    def _run_warmup_functions(cls):
+        for app_warmup in Setup.warmup_functions:
+            app_warmup()
+
     @classmethod
     def _get_app_config(cls):
         import importlib.util
@@ -362,7 +475,7 @@ class Manager(object):
     @classmethod
     def setup_manager(cls,reset_storage=False):
         cls.app = App(**cls._get_app_config())
-        cls.abi_router = ABIRouter()
+        cls.abi_router = MutationRouter()
         cls.url_router = URLRouter()
         cls.json_router = JSONRouter()
         cls.storage = Storage
@@ -370,15 +483,38 @@ class Manager(object):
         cls.app.add_router(cls.url_router)
         cls.app.add_router(cls.json_router)
         cls._import_apps()
+        if cls.use_route_manifest:
+            from cartesapp.manifest import load_route_manifest
+            cls.route_manifest = load_route_manifest()
+        Setting.freeze(Output.disabled_modules)
         cls._run_setup_functions()
         cls._register_queries()
         cls._register_mutations()
+        cls._register_multicall()
+        cls._register_codecs()
         cls.storage.initialize_storage(reset_storage)
         cls._run_post_setup_functions()
+        cls._run_warmup_functions()
 
     @classmethod
     def run(cls):
-        cls.app.run()
+        try:
+            cls.app.run()
+        finally:
+            Storage.flush()
+
+    @classmethod
+    def write_route_manifest(cls, path: str | None = None) -> str | None:
+        """Write the route manifest of the app loaded at boot (see cartesapp.manifest),
+        None if no module enables the ROUTE_MANIFEST setting."""
+        cls._import_apps()
+        if not cls.use_route_manifest:
+            return None
+        from cartesapp.manifest import build_route_manifest, save_route_manifest, app_files_hash
+        cls._register_queries(False)
+        cls._register_mutations(False)
+        manifest = build_route_manifest(cls.mutations_info, cls.queries_info, app_files_hash())
+        return save_route_manifest(manifest, path)
 
     @classmethod
     def generate_frontend_lib(cls,**extra_args):
@@ -0,0 +1,90 @@
+from os import getenv
+import os
+import sys
+import json
+import hashlib
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+###
+# Configs
+
+ROUTE_MANIFEST_FILE = getenv('CARTESAPP_ROUTE_MANIFEST') or 'cartesapp-routes.json'
+ROUTE_MANIFEST_VERSION = 1
+
+###
+# Route manifest
+#
+# setup_manager reflects over every handler (signature, abi types of the mutation
+# models, keccak of the selector headers) on each boot of the machine. `cartesapp
+# build` writes what it computes to a manifest in the app directory (so it is in
+# the app drive), keyed by a hash of the app source files. When the hash of the
+# files imported at boot matches, routes are registered from the manifest entries
+# (routes missing from it still use reflection).
+#
+# Hashing the app files and loading the manifest costs more than reflecting on the
+# routes of small apps, so it is opt-in: the ROUTE_MANIFEST module setting.
+
+def app_files_hash(root: str | None = None) -> str:
+    """Hash of the source files of the modules imported from the app directory
+    (module packages, FILES and whatever they import from the app, e.g. common models)."""
+    root = os.path.abspath(root or os.getcwd()) + os.sep
+    files = set()
+    for module in list(sys.modules.values()):
+        filename = getattr(module, '__file__', None)
+        # module files are absolute (the app dir is in sys.path as an absolute path)
+        if filename is not None and filename.startswith(root) and '-packages' + os.sep not in filename and os.path.isfile(filename):
+            files.add(filename)
+    digest = hashlib.sha256()
+    for filename in sorted(files):
+        digest.update(filename[len(root):].encode('utf-8'))
+        digest.update(b'\x00')
+        with open(filename, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def build_route_manifest(mutations_info: dict, queries_info: dict, files_hash: str) -> dict:
+    mutations = {}
+    for info in mutations_info.values():
+        header = info['selector']
+        mutations[f"{info['module']}.{info['method']}"] = {
+            "param": info['param'],
+            "abi_types": list(info['abi_types']),
+            "header": header.to_bytes().hex() if header is not None else None,
+            "model": info['model'].__name__,
+        }
+    queries = {}
+    for info in queries_info.values():
+        queries[f"{info['module']}.{info['method']}"] = {
+            "param": info['param'],
+            "selector": info['selector'],
+            "query_type": info['query_type'],
+            "model": info['model'].__name__,
+        }
+    return {"version": ROUTE_MANIFEST_VERSION, "hash": files_hash, "mutations": mutations, "queries": queries}
+
+def save_route_manifest(manifest: dict, path: str | None = None) -> str:
+    path = path or ROUTE_MANIFEST_FILE
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return path
+
+def load_route_manifest(path: str | None = None) -> dict | None:
+    """Manifest written by the build, None if missing or outdated."""
+    path = path or ROUTE_MANIFEST_FILE
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except Exception as e:
+        LOGGER.warning(f"Ignoring invalid route manifest {path}: {e}")
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != ROUTE_MANIFEST_VERSION:
+        LOGGER.info(f"Ignoring route manifest {path}: different version")
+        return None
+    if manifest.get('hash') != app_files_hash():
+        LOGGER.info(f"Ignoring route manifest {path}: app files changed")
+        return None
+    return manifest
@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+from typing import List
+from os import getenv
+
+from cartesi import abi
+from cartesi.models import ABIFunctionSelectorHeader
+
+from cartesapp.utils import str2bool
+
+###
+# Configs
+
+MULTICALL_ENABLED = str2bool(getenv('CARTESAPP_MULTICALL') or 'true') # modules opt in with MULTICALL = True
+MULTICALL_MAX_CALLS = int(getenv('CARTESAPP_MULTICALL_MAX_CALLS') or 256)
+MULTICALL_MODULE = "cartesapp"
+MULTICALL_METHOD = "multicall"
+
+###
+# Models
+
+# each call is a complete mutation payload (selector header + abi encoded model)
+class Multicall(BaseModel):
+    atomic: abi.Bool
+    calls:  List[abi.Bytes]
+
+MULTICALL_HEADER = ABIFunctionSelectorHeader(
+    function=f"{MULTICALL_MODULE}.{MULTICALL_METHOD}",
+    argument_types=abi.get_abi_types_from_model(Multicall)
+)
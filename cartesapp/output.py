@@ -1,9 +1,8 @@
 import json
 from pydantic import BaseModel
-from typing import Any, Dict, Tuple
+from typing import Tuple
 import logging
 import base64
-from Crypto.Hash import keccak
 from math import ceil
 from os import getenv
 
@@ -13,7 +12,9 @@ from cartesi.models import ABIFunctionSelectorHeader
 from cartesapp.utils import str2bytes, hex2bytes, bytes2hex, get_function_signature, get_class_name, IOType, OutputFormat, InputFormat
 
 from cartesapp.context import Context
-from cartesapp.setting import Setting
+from cartesapp.codec import encode_model
+from cartesapp.compression import compress_output
+from cartesapp.setting import Setting, ModuleConfig
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,19 +23,66 @@ LOGGER = logging.getLogger(__name__)
 
 MAX_OUTPUT_SIZE = int(getenv('CARTESAPP_MAX_OUTPUT_SIZE') or 1048567) # (2097152-17)/2
 MAX_AGGREGATED_OUTPUT_SIZE = int(getenv('CARTESAPP_MAX_AGGREGATED_OUTPUT_SIZE') or 4194248) # 4194248 = 4194304 (4MB - 56 B (extra 0x and json formating)
-MAX_SPLITTABLE_OUTPUT_SIZE = MAX_AGGREGATED_OUTPUT_SIZE - 1 # Extra byte means there's more data
+MAX_SPLITTABLE_OUTPUT_SIZE = int(getenv('CARTESAPP_MAX_SPLITTABLE_OUTPUT_SIZE') or MAX_AGGREGATED_OUTPUT_SIZE - 1) # Extra byte means there's more data
+MAX_INSPECT_PARTS = max(1, (MAX_AGGREGATED_OUTPUT_SIZE - 1) // MAX_SPLITTABLE_OUTPUT_SIZE) # parts (and extra byte) that fit in one inspect
 PROXY_SUFFIX = "Proxy"
 
+# compressed output formats: body of the base format, deflated
+COMPRESSED_FORMATS = {
+    OutputFormat.json_deflate: OutputFormat.json,
+    OutputFormat.columnar_deflate: OutputFormat.columnar,
+}
+
 ###
 # Outputs
 
+class OutputDescriptor:
+    """Per-class output layout, computed once when the notice/voucher is registered
+    (or on the first output of an unregistered model).
+
+    Holds the qualified class name, the abi types, the selector header of
+    header_abi outputs and the voucher function selector(s), computed on the
+    first voucher.
+    """
+    __slots__ = ('model', 'class_name', 'abi_types', 'header', 'selectors')
+
+    def __init__(self, model):
+        self.model = model
+        self.abi_types = tuple(abi.get_abi_types_from_model(model))
+        self.class_name = None
+        self.header = None
+        if '.' in model.__module__: # header function is the qualified class name
+            module_name,class_name = get_function_signature(model)
+            self.class_name = f"{module_name}.{class_name}"
+            self.header = ABIFunctionSelectorHeader(
+                function=self.class_name,
+                argument_types=list(self.abi_types)
+            ).to_bytes()
+        self.selectors = {}
+
+    @property
+    def selector(self) -> bytes:
+        return self.function_selector(self.model.__name__)
+
+    def function_selector(self, function: str) -> bytes:
+        selector = self.selectors.get(function)
+        if selector is None:
+            from Crypto.Hash import keccak # only apps with vouchers need it
+            sig_hash = keccak.new(digest_bits=256)
+            sig_hash.update(f'{function}({",".join(self.abi_types)})'.encode('utf-8'))
+            selector = sig_hash.digest()[:4]
+            self.selectors[function] = selector
+        return selector
+
 class Output:
     notices_info = {}
     reports_info = {}
     vouchers_info = {}
+    descriptors = {}
     disabled_modules = []
     add_output_index = None
     add_input_index = None
+    add_output_indexes = None # optional bulk add_output_index: list of (args, kwargs)
     def __new__(cls):
         return cls
 
@@ -49,10 +97,11 @@ class Output:
     def add_notice(cls, klass, **kwargs):
         module_name,class_name = get_function_signature(klass)
         if kwargs.get('module_name') is not None: module_name = kwargs.get('module_name')
-        abi_types = abi.get_abi_types_from_model(klass)
+        descriptor = OutputDescriptor(klass)
+        cls.descriptors[klass] = descriptor
+        abi_types = list(descriptor.abi_types)
 
-        stg = Setting.settings.get(module_name)
-        notice_format = OutputFormat[getattr(stg,'NOTICE_FORMAT')] if hasattr(stg,'NOTICE_FORMAT') else OutputFormat.header_abi
+        notice_format = Setting.get_config(module_name).notice_format
         notice_type = ""
         if notice_format == OutputFormat.abi: notice_type = "notice"
         elif notice_format == OutputFormat.header_abi: notice_type = "noticeHeader"
@@ -65,7 +114,9 @@ class Output:
     def add_voucher(cls, klass, **kwargs):
         module_name,class_name = get_function_signature(klass)
         if kwargs.get('module_name') is not None: module_name = kwargs.get('module_name')
-        abi_types = abi.get_abi_types_from_model(klass)
+        descriptor = OutputDescriptor(klass)
+        cls.descriptors[klass] = descriptor
+        abi_types = list(descriptor.abi_types)
         cls.vouchers_info[f"{module_name}.{class_name}"] = {"module":module_name,"class":class_name,"abi_types":abi_types,"model":klass}
 
     @classmethod
@@ -73,9 +124,18 @@ class Output:
         cls.notices_info = {}
         cls.reports_info = {}
         cls.vouchers_info = {}
+        cls.descriptors = {}
         cls.disabled_modules = []
         cls.add_output_index = None
         cls.add_input_index = None
+        cls.add_output_indexes = None
+
+def get_output_descriptor(klass) -> OutputDescriptor:
+    descriptor = Output.descriptors.get(klass)
+    if descriptor is None:
+        descriptor = OutputDescriptor(klass)
+        Output.descriptors[klass] = descriptor
+    return descriptor
 
 def notice(**kwargs):
     def decorator(klass):
@@ -95,43 +155,79 @@ def voucher(**kwargs):
         return klass
     return decorator
 
+def dumps_json(obj) -> bytes:
+    """Serialize plain data (dicts, lists, scalars) to json bytes. Always the json
+    module: outputs keep its layout (", " and ": " separators, NaN, float exponents)
+    whatever is installed, which faster backends (orjson) can't reproduce."""
+    return str2bytes(json.dumps(obj))
+
 def normalize_jsonrpc_output(data,encode_format, req_id, error = None) -> Tuple[bytes, str]:
-    serializable_data = None
+    body,class_name_str = normalize_jsonrpc_body(data,encode_format,error)
+    return add_jsonrpc_id(body,req_id),class_name_str
+
+def add_jsonrpc_id(body: bytes, req_id) -> bytes:
+    # same bytes as json.dumps with "id" as the last key
+    return body[:-1] + str2bytes(f', "id": {json.dumps(req_id)}}}')
+
+def normalize_jsonrpc_body(data,encode_format, error = None) -> Tuple[bytes, str]:
+    """JSON-RPC response without the id, so it can be reused across requests.
+    The envelope is written around the serialized result (models are serialized
+    once, not dumped/parsed/dumped)."""
+    raw_data = None # serialized result
     class_name_str = None
 
     if isinstance(data, bytes):
-        serializable_data = base64.b64encode(data).decode('ascii')
+        raw_data = dumps_json(base64.b64encode(data).decode('ascii'))
         class_name_str = 'bytes'
     elif isinstance(data, int):
-        serializable_data = data
+        raw_data = dumps_json(data)
         class_name_str = 'int'
     elif isinstance(data, str):
-        serializable_data = data
+        raw_data = dumps_json(data)
         class_name_str = 'str'
     elif isinstance(data, dict) or isinstance(data, list) or isinstance(data, tuple):
-        serializable_data = data
+        raw_data = dumps_json(data)
         class_name_str = type(data).__name__
+        if encode_format in COMPRESSED_FORMATS:
+            raw_data = _compress_result(raw_data)
     elif issubclass(data.__class__,BaseModel):
         module_name,class_name = get_class_name(data)
         class_name_str = f"{module_name}.{class_name}"
-        if encode_format == OutputFormat.abi:
-            serializable_data = f"0x{abi.encode_model(data).hex()}"
+        if encode_format in COMPRESSED_FORMATS:
+            body = normalize_output(data,COMPRESSED_FORMATS[encode_format])[0]
+            raw_data = _compress_result(body, encode_format == OutputFormat.columnar_deflate)
+        elif encode_format == OutputFormat.abi:
+            raw_data = dumps_json(f"0x{encode_model(data).hex()}")
         elif encode_format == OutputFormat.packed_abi:
-            serializable_data = f"0x{abi.encode_model(data,True).hex()}"
+            raw_data = dumps_json(f"0x{encode_model(data,True).hex()}")
         elif encode_format == OutputFormat.json:
-            serializable_data = json.loads(data.json(exclude_unset=True,exclude_none=True))
+            raw_data = str2bytes(data.json(exclude_unset=True,exclude_none=True))
+        elif encode_format == OutputFormat.columnar:
+            from cartesapp.columnar import encode_columnar
+            raw_data = dumps_json(f"0x{encode_columnar(data).hex()}")
+        else:
+            raw_data = b'null'
     else: raise Exception("Invalid output format")
 
-    dict_data: Dict[str,Any] = {"jsonrpc": "2.0"}
+    # same layout as json.dumps of {"jsonrpc", "result" | "error"}
     if error == True:
-        dict_data["error"] = {"code":1, "data":serializable_data}
-        dict_data["error"]["message"] = serializable_data if class_name_str == 'str' else "Error"
-    else:
-        dict_data["result"] = serializable_data
-    dict_data["id"] = req_id
-    return str2bytes(json.dumps(dict_data)),class_name_str
+        message = raw_data if class_name_str == 'str' else b'"Error"'
+        return b'{"jsonrpc": "2.0", "error": {"code": 1, "data": ' + raw_data + b', "message": ' + message + b'}}',class_name_str
+    return b'{"jsonrpc": "2.0", "result": ' + raw_data + b'}',class_name_str
+
+def _compress_result(body: bytes, hex_body: bool = False) -> bytes:
+    # result of the body (json, or its hex string for binary formats) replaced by
+    # the hex string of the compressed body if that is shorter ("0x" and quotes)
+    compressed = compress_output(body)
+    size = 2*len(body) + 4 if hex_body else len(body)
+    if compressed is not body and 2*len(compressed) + 4 < size:
+        return dumps_json(f"0x{compressed.hex()}")
+    return dumps_json(f"0x{body.hex()}") if hex_body else body
 
 def normalize_output(data,encode_format) -> Tuple[bytes, str]:
+    if encode_format in COMPRESSED_FORMATS:
+        body,class_name = normalize_output(data,COMPRESSED_FORMATS[encode_format])
+        return compress_output(body),class_name
     if isinstance(data, bytes): return data,'bytes'
     if isinstance(data, int): return data.to_bytes(32,byteorder='big'),'int'
     if isinstance(data, str):
@@ -139,20 +235,18 @@ def normalize_output(data,encode_format) -> Tuple[bytes, str]:
         return str2bytes(data),'str'
     if isinstance(data, dict) or isinstance(data, list) or isinstance(data, tuple):
         class_name = type(data).__name__
-        return str2bytes(json.dumps(data)),class_name
+        return dumps_json(data),class_name
     if issubclass(data.__class__,BaseModel):
         module_name,class_name = get_class_name(data)
         class_name_str = f"{module_name}.{class_name}"
-        if encode_format == OutputFormat.abi: return abi.encode_model(data),class_name_str
-        if encode_format == OutputFormat.packed_abi: return abi.encode_model(data,True),class_name_str
+        if encode_format == OutputFormat.abi: return encode_model(data),class_name_str
+        if encode_format == OutputFormat.packed_abi: return encode_model(data,True),class_name_str
         if encode_format == OutputFormat.header_abi:
-            header = ABIFunctionSelectorHeader(
-                function=class_name_str,
-                argument_types=abi.get_abi_types_from_model(data)
-            )
-            header_selector = header.to_bytes()
-            return header_selector+abi.encode_model(data),class_name_str
+            return get_output_descriptor(data.__class__).header+encode_model(data),class_name_str
         if encode_format == OutputFormat.json: return str2bytes(data.json(exclude_unset=True,exclude_none=True)),class_name
+        if encode_format == OutputFormat.columnar:
+            from cartesapp.columnar import encode_columnar
+            return encode_columnar(data),class_name_str
     raise Exception("Invalid output format")
 
 def normalize_voucher(*kargs) -> Tuple[bytes,abi.UInt256, str]:
@@ -164,14 +258,8 @@ def normalize_voucher(*kargs) -> Tuple[bytes,abi.UInt256, str]:
         if isinstance(kargs[0], bytes): return kargs[0],0,'bytes'
         if isinstance(kargs[0], str): return hex2bytes(kargs[0]),0,'hex'
         if issubclass(kargs[0].__class__,BaseModel):
-
-            args_types = abi.get_abi_types_from_model(kargs[0])
-            signature = f'{kargs[0].__class__.__name__}({",".join(args_types)})'
-            sig_hash = keccak.new(digest_bits=256)
-            sig_hash.update(signature.encode('utf-8'))
-
-            selector = sig_hash.digest()[:4]
-            data = abi.encode_model(kargs[0])
+            selector = get_output_descriptor(kargs[0].__class__).selector
+            data = encode_model(kargs[0])
             return selector+data,0,kargs[0].__class__.__name__
         raise Exception("Invalid voucher payload")
     if len(kargs) == 2: # class and value
@@ -186,18 +274,25 @@ def normalize_voucher(*kargs) -> Tuple[bytes,abi.UInt256, str]:
         if not issubclass(kargs[1].__class__,BaseModel): raise Exception("Invalid voucher model")
         if not isinstance(kargs[2], int): raise Exception("Invalid voucher value")
 
-        args_types = abi.get_abi_types_from_model(kargs[1])
-        signature = f'{kargs[0]}({",".join(args_types)})'
-        sig_hash = keccak.new(digest_bits=256)
-        sig_hash.update(signature.encode('utf-8'))
-
-        selector = sig_hash.digest()[:4]
-        data = abi.encode_model(kargs[1])
+        selector = get_output_descriptor(kargs[1].__class__).function_selector(kargs[0])
+        data = encode_model(kargs[1])
 
         value = kargs[2]
         return selector+data,value,kargs[1].__class__.__name__
     raise Exception("Invalid number of arguments")
 
+def get_module_config() -> ModuleConfig:
+    """Resolved settings of the current module (attached by Context.set_context)."""
+    cfg = Context.module_config
+    if cfg is None or cfg.module != Context.module: # module set without set_context
+        cfg = Setting.get_config(Context.module)
+    return cfg
+
+def get_inspect_parts(parts: int | None) -> int:
+    """Number of splittable output parts sent in one inspect (``parts`` param)."""
+    if parts is None or parts < 1: return 1
+    return min(parts, MAX_INSPECT_PARTS)
+
 def send_report(payload_data, **kwargs):
     ctx = Context
 
@@ -208,92 +303,220 @@ def send_report(payload_data, **kwargs):
     if ctx.metadata is None and ctx.n_input_reports > 0: # single report per inspect
         raise Exception("Can't add multiple reports")
 
-    if ctx.module in Output.disabled_modules:
+    cfg = get_module_config()
+    if cfg.outputs_disabled:
         LOGGER.debug(f"Skipping report: disabled {ctx.module} module")
         return
 
-    stg = Setting.settings.get(ctx.module)
+    body,class_name = normalize_jsonrpc_body(payload_data,cfg.report_format,kwargs.get('error')) \
+        if ctx.configs is not None and ctx.configs.get('query_format') == InputFormat.jsonrpc \
+        else normalize_output(payload_data,cfg.report_format)
+
+    if ctx.report_recorder is not None:
+        ctx.report_recorder.append((body,class_name,kwargs))
+    _send_report_body(body,class_name,cfg,**kwargs)
+
+def replay_report(body: bytes, class_name: str, **kwargs):
+    """Send a report body recorded by a previous (cached) request."""
+    ctx = Context
+
+    if ctx.rollup is None:
+        raise Exception("Can't send report without rollup context")
+
+    if ctx.metadata is None and ctx.n_input_reports > 0: # single report per inspect
+        raise Exception("Can't add multiple reports")
+
+    _send_report_body(body,class_name,get_module_config(),**kwargs)
 
-    report_format = OutputFormat[getattr(stg,'REPORT_FORMAT')] if hasattr(stg,'REPORT_FORMAT') else OutputFormat.json
-    payload,class_name = normalize_jsonrpc_output(payload_data,report_format,ctx.configs.get('id'),kwargs.get('error')) \
+def _send_report_body(body: bytes, class_name: str, cfg: ModuleConfig, **kwargs):
+    ctx = Context
+    payload = add_jsonrpc_id(body,ctx.configs.get('id')) \
         if ctx.configs is not None and ctx.configs.get('query_format') == InputFormat.jsonrpc \
-        else normalize_output(payload_data,report_format)
+        else body
 
+    # work on a view of the payload: parts, truncation and chunks are not copied
+    view = memoryview(payload)
+    trailer = b'' # more parts byte of splittable outputs
     extended_params = ctx.configs.get("extended_params") if ctx.configs else None
     if extended_params is not None and ctx.metadata is None: # inspect
-        part = extended_params.part
+        part = getattr(extended_params,'part',None)
+        parts = get_inspect_parts(getattr(extended_params,'parts',None))
         payload_len = len(payload)
         n_parts = ceil(payload_len / MAX_SPLITTABLE_OUTPUT_SIZE)
         if payload_len > MAX_SPLITTABLE_OUTPUT_SIZE and part is not None:
-            remaining_parts = n_parts - part - 1
+            remaining_parts = n_parts - part - parts
             if remaining_parts > 255: remaining_parts = 255
             if part >= 0:
                 startb = MAX_SPLITTABLE_OUTPUT_SIZE*(part)
-                endb = MAX_SPLITTABLE_OUTPUT_SIZE*(part+1)
-                payload = payload[startb:endb]
-                if endb < payload_len: payload += remaining_parts.to_bytes(1,'big')
+                endb = MAX_SPLITTABLE_OUTPUT_SIZE*(part+parts)
+                view = view[startb:endb]
+                if endb < payload_len: trailer = remaining_parts.to_bytes(1,'big')
 
-    if len(payload) > MAX_AGGREGATED_OUTPUT_SIZE:
+    payload_len = len(view) + len(trailer)
+    if payload_len > MAX_AGGREGATED_OUTPUT_SIZE:
         LOGGER.warn("Payload Data exceed maximum length. Truncating")
-    payload = payload[:MAX_AGGREGATED_OUTPUT_SIZE]
+        view = view[:MAX_AGGREGATED_OUTPUT_SIZE]
+        trailer = trailer[:MAX_AGGREGATED_OUTPUT_SIZE - len(view)]
+        payload_len = len(view) + len(trailer)
+
+    _emit_report_chunks(view,trailer,class_name,cfg,**kwargs)
+
+def _emit_report_chunks(view: memoryview, trailer: bytes, class_name: str, cfg: ModuleConfig, **kwargs):
+    ctx = Context
+    payload_len = len(view) + len(trailer)
 
     # For inspects always chunk if len > MAX_OUTPUT_SIZE, for advance raise error
-    if ctx.metadata is not None and len(payload) > MAX_OUTPUT_SIZE:
+    if ctx.metadata is not None and payload_len > MAX_OUTPUT_SIZE:
         raise Exception("Maximum report length violation")
 
     tags = kwargs.get('tags')
-    add_idx = ctx.metadata is not None and stg is not None \
-        and hasattr(stg,'INDEX_OUTPUTS') and getattr(stg,'INDEX_OUTPUTS')
+    add_idx = ctx.metadata is not None and cfg.index_outputs
 
     sent_bytes = 0
-    while sent_bytes < len(payload):
+    while sent_bytes < payload_len:
         inds = f" ({ctx.metadata.input_index}, {ctx.n_reports})" if ctx.metadata is not None else ""
         top_bytes = sent_bytes + MAX_OUTPUT_SIZE
-        if top_bytes > len(payload):
-            top_bytes = len(payload)
+        if top_bytes > payload_len:
+            top_bytes = payload_len
 
+        index = None
         if Output.add_output_index is not None and add_idx:
             splited_class_name = class_name.split('.')[-1]
             LOGGER.debug(f"Adding index report{inds} {tags=}")
             index_kwargs = {}
             if kwargs.get('value') is not None: index_kwargs['value'] = kwargs['value']
-            Output.add_output_index(ctx.metadata,ctx.app_contract,IOType.report,ctx.n_reports,ctx.module,splited_class_name,tags,**index_kwargs)
+            index = (Output.add_output_index,(ctx.metadata,ctx.app_contract,IOType.report,ctx.n_reports,ctx.module,splited_class_name,tags),index_kwargs)
 
         LOGGER.debug(f"Sending report{inds} {top_bytes - sent_bytes} bytes")
-        ctx.rollup.report(bytes2hex(payload[sent_bytes:top_bytes]))
+        chunk = view[sent_bytes:top_bytes]
+        if top_bytes > len(view): # last chunk carries the trailer
+            chunk = bytes(chunk) + trailer
+        _emit_output('report',chunk,index)
         ctx.inc_reports()
         sent_bytes = top_bytes
 
+###
+# Streamed reports
+#
+# Streaming queries (generator functions) yield rows, or lists of rows, instead of
+# building the whole output. The report is a json array of the rows (the result
+# of the JSON-RPC response), serialized row by row into a buffer that only holds
+# the bytes of the window being sent: the requested parts of splittable outputs
+# (rows before it are only measured) or the aggregated output size. Iteration
+# stops at the end of the window, so later rows are never fetched. Since the
+# total size isn't known, the more parts byte of a part that is not the last
+# one is 1 (at least one more part).
+
+def _serialize_row(row) -> bytes:
+    if isinstance(row, BaseModel): return str2bytes(row.json(exclude_unset=True,exclude_none=True))
+    return dumps_json(row)
+
+def _iter_stream_pieces(rows, prefix: bytes, suffix: bytes, result: list):
+    # prefix, each row (with its separator) and suffix; result gets the generator return value
+    yield prefix
+    separator = b''
+    while True:
+        try:
+            item = next(rows)
+        except StopIteration as e:
+            result.append(e.value)
+            break
+        for row in (item if isinstance(item, (list, tuple)) else (item,)):
+            yield separator + _serialize_row(row)
+            separator = b','
+    yield suffix
+
+def send_report_stream(rows, **kwargs):
+    """Send the rows yielded by a streaming query as one (json array) report.
+    Returns the value returned by the generator (None if it was not exhausted)."""
+    ctx = Context
+
+    if ctx.rollup is None:
+        raise Exception("Can't send report without rollup context")
+
+    if ctx.metadata is None and ctx.n_input_reports > 0: # single report per inspect
+        raise Exception("Can't add multiple reports")
+
+    cfg = get_module_config()
+    if cfg.outputs_disabled:
+        LOGGER.debug(f"Skipping report: disabled {ctx.module} module")
+        rows.close()
+        return None
+
+    prefix,suffix = b'[',b']'
+    if ctx.configs is not None and ctx.configs.get('query_format') == InputFormat.jsonrpc:
+        prefix = b'{"jsonrpc": "2.0", "result": ['
+        suffix = add_jsonrpc_id(b']}',ctx.configs.get('id'))
+
+    start,end = 0,None
+    extended_params = ctx.configs.get("extended_params") if ctx.configs else None
+    part = getattr(extended_params,'part',None)
+    if ctx.metadata is None and part is not None and part >= 0:
+        start = MAX_SPLITTABLE_OUTPUT_SIZE*part
+        end = MAX_SPLITTABLE_OUTPUT_SIZE*(part + get_inspect_parts(getattr(extended_params,'parts',None)))
+
+    buffer = bytearray()
+    trailer = b''
+    result = []
+    pieces = _iter_stream_pieces(rows, prefix, suffix, result)
+    try:
+        if end is None: # whole output, up to the aggregated size
+            max_size = MAX_AGGREGATED_OUTPUT_SIZE - len(suffix)
+            for piece in pieces:
+                if piece is suffix:
+                    buffer += suffix
+                elif len(buffer) + len(piece) > max_size: # keep the output valid json
+                    LOGGER.warn("Payload Data exceed maximum length. Truncating rows")
+                    buffer += suffix
+                    break
+                else:
+                    buffer += piece
+        else: # bytes [start, end) of the output, more parts byte if it goes on
+            offset = 0
+            for piece in pieces:
+                piece_end = offset + len(piece)
+                if piece_end > start:
+                    buffer += memoryview(piece)[max(start - offset,0):end - offset]
+                offset = piece_end
+                if offset > end or (offset == end and piece is not suffix):
+                    trailer = b'\x01'
+                    break
+    finally:
+        pieces.close()
+        rows.close()
+
+    LOGGER.debug(f"Streamed report {len(buffer)} bytes")
+    _emit_report_chunks(memoryview(buffer),trailer,'list',cfg,**kwargs)
+    return result[0] if result else None
+
 def send_notice(payload_data, **kwargs):
     ctx = Context
 
     if ctx.metadata is None or ctx.rollup is None:
         raise Exception("Can't send notice without advance context")
 
-    if ctx.module in Output.disabled_modules:
+    cfg = get_module_config()
+    if cfg.outputs_disabled:
         LOGGER.debug(f"Skipping notice: disabled {ctx.module} module")
         return
 
-    stg = Setting.settings.get(ctx.module)
-
-    notice_format = OutputFormat[getattr(stg,'NOTICE_FORMAT')] if hasattr(stg,'NOTICE_FORMAT') else OutputFormat.header_abi
-
-    payload,class_name = normalize_output(payload_data,notice_format)
+    payload,class_name = normalize_output(payload_data,cfg.notice_format)
 
     if len(payload) > MAX_OUTPUT_SIZE: raise Exception("Maximum output length violation")
 
     tags = kwargs.get('tags')
 
     inds = f" ({ctx.metadata.input_index}, {ctx.n_notices})" if ctx.metadata is not None else ""
-    if Output.add_output_index is not None and ctx.metadata is not None and stg is not None and hasattr(stg,'INDEX_OUTPUTS') and getattr(stg,'INDEX_OUTPUTS'):
+    index = None
+    if Output.add_output_index is not None and ctx.metadata is not None and cfg.index_outputs:
         LOGGER.debug(f"Adding index notice{inds} {tags=}")
         splited_class_name = class_name.split('.')[-1]
         index_kwargs = {}
         if kwargs.get('value') is not None: index_kwargs['value'] = kwargs['value']
-        Output.add_output_index(ctx.metadata,ctx.app_contract,IOType.notice,ctx.n_outputs,ctx.module,splited_class_name,tags,**index_kwargs)
+        index = (Output.add_output_index,(ctx.metadata,ctx.app_contract,IOType.notice,ctx.n_outputs,ctx.module,splited_class_name,tags),index_kwargs)
 
     LOGGER.debug(f"Sending notice{inds} {len(payload)} bytes")
-    ctx.rollup.notice(bytes2hex(payload))
+    _emit_output('notice',bytes2hex(payload),index)
     ctx.inc_notices()
 
 def send_voucher(destination: str, *kargs, **kwargs):
@@ -306,25 +529,25 @@ def send_voucher(destination: str, *kargs, **kwargs):
     payload,value,class_name = normalize_voucher(*kargs)
 
     if len(payload) > MAX_OUTPUT_SIZE: raise Exception("Maximum output length violation")
-    if ctx.module in Output.disabled_modules:
+    cfg = get_module_config()
+    if cfg.outputs_disabled:
         LOGGER.debug(f"Skipping voucher: disabled {ctx.module} module")
         return
 
-    stg = Setting.settings.get(ctx.module)
     tags = kwargs.get('tags')
     inds = f" ({ctx.metadata.input_index}, {ctx.n_vouchers})" if ctx.metadata is not None else ""
-    if Output.add_output_index is not None and ctx.metadata is not None and stg is not None and hasattr(stg,'INDEX_OUTPUTS') and getattr(stg,'INDEX_OUTPUTS'):
+    index = None
+    if Output.add_output_index is not None and ctx.metadata is not None and cfg.index_outputs:
         LOGGER.debug(f"Adding index voucher{inds} {tags=}")
         splited_class_name = class_name.split('.')[-1]
         index_kwargs = {'eth_value':value}
         if kwargs.get('value') is not None: index_kwargs['value'] = kwargs['value']
-        Output.add_output_index(ctx.metadata,ctx.app_contract,IOType.voucher,ctx.n_outputs,ctx.module,splited_class_name,tags,**index_kwargs)
+        index = (Output.add_output_index,(ctx.metadata,ctx.app_contract,IOType.voucher,ctx.n_outputs,ctx.module,splited_class_name,tags),index_kwargs)
 
     LOGGER.debug(f"Sending voucher{inds}")
     if value is None: value = 0
     hex_value = "0x" + value.to_bytes(32,byteorder='big').hex()
-    voucher_dict = {"destination":destination,"value":hex_value,"payload":bytes2hex(payload)}
-    ctx.rollup.voucher({"destination":destination,"value":hex_value,"payload":bytes2hex(payload)})
+    _emit_output('voucher',{"destination":destination,"value":hex_value,"payload":bytes2hex(payload)},index)
     ctx.inc_vouchers()
 
 def send_delegate_call_voucher(destination: str, *kargs, **kwargs):
@@ -340,25 +563,80 @@ def send_delegate_call_voucher(destination: str, *kargs, **kwargs):
         raise Exception("Delegate call voucher can't have a value")
 
     if len(payload) > MAX_OUTPUT_SIZE: raise Exception("Maximum output length violation")
-    if ctx.module in Output.disabled_modules:
+    cfg = get_module_config()
+    if cfg.outputs_disabled:
         LOGGER.debug(f"Skipping delegate call voucher: disabled {ctx.module} module")
         return
 
-    stg = Setting.settings.get(ctx.module)
     tags = kwargs.get('tags')
     inds = f" ({ctx.metadata.input_index}, {ctx.n_vouchers})" if ctx.metadata is not None else ""
-    if Output.add_output_index is not None and ctx.metadata is not None and stg is not None and hasattr(stg,'INDEX_OUTPUTS') and getattr(stg,'INDEX_OUTPUTS'):
+    index = None
+    if Output.add_output_index is not None and ctx.metadata is not None and cfg.index_outputs:
         LOGGER.debug(f"Adding index delegate call voucher{inds} {tags=}")
         splited_class_name = class_name.split('.')[-1]
         index_kwargs = {}
         if kwargs.get('value') is not None: index_kwargs['value'] = kwargs['value']
-        Output.add_output_index(ctx.metadata,ctx.app_contract,IOType.delegate_call_voucher,ctx.n_outputs,ctx.module,splited_class_name,tags,**index_kwargs)
+        index = (Output.add_output_index,(ctx.metadata,ctx.app_contract,IOType.delegate_call_voucher,ctx.n_outputs,ctx.module,splited_class_name,tags),index_kwargs)
 
     LOGGER.debug(f"Sending delegate call voucher{inds}")
-    ctx.rollup.delegate_call_voucher({"destination":destination,"payload":bytes2hex(payload)})
+    _emit_output('delegate_call_voucher',{"destination":destination,"payload":bytes2hex(payload)},index)
     ctx.inc_delegate_call_vouchers()
 
 
+###
+# Output queue
+#
+# Report payloads are kept binary (views of the serialized body) until they are
+# handed to the rollup. Mutations defer their outputs (Context.defer_outputs): the index rows are added
+# in one pass just before the commit and the rollup outputs are sent after it.
+# Outputs of a rolled back mutation are discarded (except reports, see
+# Context.discard_outputs). Without a queue (inspects, outputs sent outside a
+# mutation) outputs are sent right away.
+
+def _emit_output(method: str | None, payload, index: tuple | None = None):
+    queue = Context.output_queue
+    if queue is not None:
+        queue.append((method,payload,index))
+        return
+    if index is not None:
+        index[0](*index[1],**index[2])
+    if method is not None:
+        _send_to_rollup(Context.rollup,method,payload)
+
+def _send_to_rollup(rollup, method: str, payload):
+    if method == 'report': # binary chunk: hex only for rollups that need it
+        low_level = getattr(rollup,'_rollup',None)
+        if low_level is not None and hasattr(low_level,'emit_report'):
+            low_level.emit_report(bytes(payload))
+            return
+        payload = bytes2hex(payload)
+    getattr(rollup,method)(payload)
+
+def write_output_indexes():
+    """Add the index rows of the queued outputs (in the mutation db_session)."""
+    queue = Context.output_queue
+    if not queue: return
+    bulk = []
+    for i,(method,payload,index) in enumerate(queue):
+        if index is None: continue
+        if Output.add_output_indexes is not None and index[0] is Output.add_output_index:
+            bulk.append((index[1],index[2]))
+        else:
+            index[0](*index[1],**index[2])
+        queue[i] = (method,payload,None)
+    if len(bulk) > 0:
+        Output.add_output_indexes(bulk)
+
+def flush_outputs():
+    """Send the queued outputs to the rollup."""
+    queue = Context.output_queue
+    if not queue: return
+    rollup = Context.rollup
+    for method,payload,_ in queue:
+        if method is not None:
+            _send_to_rollup(rollup,method,payload)
+    queue.clear()
+
 # Aliases
 output = report
 event = notice
@@ -371,17 +649,15 @@ submit_contract_call = send_voucher
 def index_input(**kwargs):
     ctx = Context
 
-    if ctx.module in Output.disabled_modules:
+    cfg = get_module_config()
+    if cfg.outputs_disabled:
         LOGGER.debug(f"Skipping input index: disabled {ctx.module} module")
         return
 
     if ctx.set_input_indexes:
         raise Exception("Can't add input index multiple times")
 
-    stg = Setting.settings.get(ctx.module)
-
-    if not (Output.add_input_index is not None and ctx.metadata is not None \
-            and stg is not None and hasattr(stg,'INDEX_OUTPUTS') and getattr(stg,'INDEX_OUTPUTS')):
+    if not (Output.add_input_index is not None and ctx.metadata is not None and cfg.index_outputs):
         LOGGER.warning("Can't add index inputs: not enabled")
         return
 
@@ -392,6 +668,6 @@ def index_input(**kwargs):
     class_name = ctx.input_payload.__class__.__name__
     index_kwargs = {}
     if kwargs.get('value') is not None: index_kwargs['value'] = kwargs['value']
-    Output.add_input_index(ctx.metadata,ctx.app_contract,ctx.module,class_name,tags,**index_kwargs)
+    _emit_output(None,None,(Output.add_input_index,(ctx.metadata,ctx.app_contract,ctx.module,class_name,tags),index_kwargs))
 
     ctx.set_input_indexes = True
@@ -0,0 +1,167 @@
+from os import getenv
+import base64
+import json
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from pony.orm.core import Attribute
+
+from cartesapp.storage import helpers
+from cartesapp.context import Context
+
+###
+# Configs
+
+PAGINATE_DEFAULT_LIMIT = int(getenv('CARTESAPP_PAGINATE_DEFAULT_LIMIT') or 100)
+PAGINATE_MAX_LIMIT = int(getenv('CARTESAPP_PAGINATE_MAX_LIMIT') or 1000)
+
+# extra params of paginated queries (like splittable_query_params)
+paginated_query_params = {"cursor":(str,None),"limit":(int,None)}
+
+###
+# Keyset pagination
+#
+# Offset pagination (or splittable outputs) makes the node compute and skip all
+# the rows before the page. @query(paginate=...) routes get a Cursor that orders
+# the select by a key and filters it to the rows after the last key of the
+# previous page (WHERE key > ?), so each page only reads its own rows. The key
+# values of the last row are sent to the client as an opaque cursor (base64 json).
+
+# key values that aren't json types: (type, name, encode, decode). They go in the
+# cursor as {name: encoded} (datetime before date, its base class). Other attribute
+# types (bytes, Json) can't be compared in queries, so they aren't valid keys
+_cursor_types = (
+    (datetime, 'datetime', datetime.isoformat, datetime.fromisoformat),
+    (date, 'date', date.isoformat, date.fromisoformat),
+    (time, 'time', time.isoformat, time.fromisoformat),
+    (timedelta, 'timedelta', lambda v: [v.days, v.seconds, v.microseconds], lambda v: timedelta(*v)),
+    (Decimal, 'decimal', str, Decimal),
+    (UUID, 'uuid', str, UUID),
+)
+_cursor_decoders = {name: decode for _, name, _, decode in _cursor_types}
+_cursor_key_types = (str, int, float) + tuple(typ for typ, _, _, _ in _cursor_types)
+
+def _encode_key_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    for typ, name, encode, _ in _cursor_types:
+        if isinstance(value, typ):
+            return {name: encode(value)}
+    raise Exception(f"Unsupported pagination key value type {type(value).__name__}")
+
+def _decode_key_value(value):
+    if isinstance(value, dict):
+        if len(value) != 1:
+            raise ValueError("Invalid key value")
+        name, encoded = next(iter(value.items()))
+        return _cursor_decoders[name](encoded)
+    return value
+
+def get_paginate_configs(paginate) -> dict:
+    """Normalize the ``paginate`` option of ``@query`` (True or a dict with
+    key/limit/max_limit). Keys are attribute names, prefixed with '-' for
+    descending order (the entity primary key is appended to make them unique)."""
+    configs = {"key": None, "limit": PAGINATE_DEFAULT_LIMIT, "max_limit": PAGINATE_MAX_LIMIT}
+    if isinstance(paginate, dict):
+        unknown = set(paginate.keys()).difference(configs.keys())
+        if len(unknown) > 0:
+            raise Exception(f"Invalid paginate configs {unknown}")
+        configs.update(paginate)
+    elif paginate is not True:
+        raise Exception("Paginate option must be True or a dict of configs")
+    if isinstance(configs["key"], str):
+        configs["key"] = (configs["key"],)
+    elif configs["key"] is not None:
+        configs["key"] = tuple(configs["key"])
+    if configs["limit"] < 1 or configs["max_limit"] < configs["limit"]:
+        raise Exception("Invalid paginate limits")
+    return configs
+
+def encode_cursor(values: list) -> str:
+    values = [_encode_key_value(v) for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(values, list):
+            raise ValueError("Cursor is not a list")
+        return [_decode_key_value(v) for v in values]
+    except Exception:
+        raise Exception("Invalid cursor")
+
+class Cursor:
+    """Page of a paginated query: the key, the page size and the key values of the
+    last row of the previous page (``after``, None on the first page).
+
+    ``page`` runs the keyset query and sets ``next_cursor`` (None on the last page),
+    which the query sends with the page as the ``next_cursor`` field of its output
+    (followed by the generated TS page iterators).
+    """
+    __slots__ = ('key', 'limit', 'after', 'next_cursor')
+
+    def __init__(self, key: tuple | None, limit: int, after: list | None = None):
+        self.key = key
+        self.limit = limit
+        self.after = after
+        self.next_cursor = None
+
+    def _key_attrs(self, entity) -> list:
+        key = list(self.key or ())
+        names = [k.lstrip('-') for k in key]
+        key.extend(a.name for a in entity._pk_attrs_ if a.name not in names)
+        attrs = []
+        for k in key:
+            name = k.lstrip('-')
+            attr = getattr(entity, name, None) if name.isidentifier() else None
+            if not isinstance(attr, Attribute) or attr.is_relation or attr.is_collection \
+                    or not issubclass(attr.py_type, _cursor_key_types):
+                raise Exception(f"Invalid pagination key {name} for {entity.__name__}")
+            attrs.append((name, attr, k.startswith('-')))
+        return attrs
+
+    def page(self, query) -> list:
+        """Return the page of a Pony query of entities (ordered by the key) and
+        set ``next_cursor``."""
+        entity = getattr(getattr(query, '_translator', None), 'expr_type', None)
+        if entity is None or not hasattr(entity, '_pk_attrs_'):
+            raise Exception("Only queries of entities can be paginated")
+        attrs = self._key_attrs(entity)
+        if self.after is not None:
+            if len(self.after) != len(attrs):
+                raise Exception("Invalid cursor")
+            # (k0 > v0) or (k0 == v0 and k1 > v1) or ...
+            clauses = []
+            for i, (name, _, descending) in enumerate(attrs):
+                terms = [f"x.{attrs[j][0]} == v{j}" for j in range(i)]
+                terms.append(f"x.{name} {'<' if descending else '>'} v{i}")
+                clauses.append(f"({' and '.join(terms)})")
+            query = query.filter(f"lambda x: {' or '.join(clauses)}", {}, {f"v{i}": v for i, v in enumerate(self.after)})
+        query = query.order_by(*(helpers.desc(attr) if descending else attr for _, attr, descending in attrs))
+        rows = query.limit(self.limit + 1)[:]
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            self.next_cursor = encode_cursor([getattr(last, name) for name, _, _ in attrs])
+        else:
+            self.next_cursor = None
+        return rows
+
+def get_cursor() -> Cursor:
+    """Cursor of the current paginated query request."""
+    configs = Context.configs
+    paginate = configs.get('paginate') if configs is not None else None
+    if paginate is None:
+        raise Exception("Query is not paginated")
+    params = configs.get('extended_params')
+    limit = paginate["limit"]
+    after = None
+    if params is not None:
+        if getattr(params, 'limit', None) is not None:
+            if params.limit < 1:
+                raise Exception("Invalid page limit")
+            limit = min(params.limit, paginate["max_limit"])
+        if getattr(params, 'cursor', None):
+            after = decode_cursor(params.cursor)
+    return Cursor(paginate["key"], limit, after)
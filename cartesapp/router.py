@@ -0,0 +1,79 @@
+import logging
+
+from cartesi import ABIRouter
+
+LOGGER = logging.getLogger(__name__)
+
+###
+# Routers
+
+class MutationRouter(ABIRouter):
+    """ABIRouter with constant-time advance dispatch.
+
+    ``ABIRouter.get_handler`` walks every registered advance route until one
+    matches. Here advance routes are also indexed by their header bytes
+    (``ABIFunctionSelectorHeader``/``ABILiteralHeader``) plus the msg_sender
+    constraint (``msg_sender``/``proxy``), so an advance is matched with a couple
+    of dict lookups. Routes without header (``no_header``) go to a small fallback
+    list. The first registered matching route still wins, as in ``ABIRouter``,
+    and ``advance_ops`` is kept as is. Inspects use the parent implementation.
+    """
+
+    def __init__(self, namespace: str = ''):
+        super().__init__(namespace)
+        self.header_index = {}      # (header_bytes, msg_sender | None) -> (seq, op)
+        self.header_lengths = []    # distinct header lengths, ascending (usually [4])
+        self.fallback_ops = []      # (seq, op) for routes without header
+
+    def advance(self, header=None, msg_sender=None, **kwargs):
+        register = super().advance(header=header, msg_sender=msg_sender, **kwargs)
+        def decorator(func):
+            register(func)
+            self._index_advance_op(len(self.advance_ops) - 1, self.advance_ops[-1])
+            return func
+        return decorator
+
+    def _index_advance_op(self, seq, op):
+        if op.header_bytes is None:
+            self.fallback_ops.append((seq, op))
+            return
+        key = (op.header_bytes, op.msg_sender)
+        if key in self.header_index:
+            LOGGER.warning(f"Advance route {op.operationId} is shadowed by {self.header_index[key][1].operationId}")
+            return
+        self.header_index[key] = (seq, op)
+        header_len = len(op.header_bytes)
+        if header_len not in self.header_lengths:
+            self.header_lengths.append(header_len)
+            self.header_lengths.sort()
+
+    def get_advance_op(self, req_data: bytes, msg_sender: str | None):
+        """Return the first registered advance route matching payload and sender."""
+        sender = msg_sender.lower() if msg_sender is not None else None
+        best = None
+        for header_len in self.header_lengths:
+            if len(req_data) < header_len:
+                break
+            header = req_data[:header_len]
+            for key in ((header, sender), (header, None)):
+                match = self.header_index.get(key)
+                if match is not None and (best is None or match[0] < best[0]):
+                    best = match
+        for seq, op in self.fallback_ops:
+            if best is not None and seq > best[0]:
+                break
+            if op.msg_sender is None or op.msg_sender == sender:
+                best = (seq, op)
+                break
+        return best[1] if best is not None else None
+
+    def get_handler(self, request):
+        if request.request_type != 'advance_state':
+            return super().get_handler(request)
+        try:
+            req_data = request.data.bytes_payload()
+        except Exception:
+            return None
+        metadata = request.data.metadata
+        op = self.get_advance_op(req_data, metadata.msg_sender if metadata is not None else None)
+        return op.handler if op is not None else None
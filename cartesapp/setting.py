@@ -1,9 +1,27 @@
-from cartesapp.utils import get_module_name
+from cartesapp.utils import get_module_name, OutputFormat
 
 
+class ModuleConfig:
+    """Output settings of a module, resolved once (formats as enums, flags as
+    bools) so the output functions only read attributes.
+
+    Built for every module by ``Setting.freeze`` during setup and attached to the
+    Context by ``set_context``.
+    """
+    __slots__ = ('module', 'report_format', 'notice_format', 'index_outputs', 'outputs_disabled')
+
+    def __init__(self, module: str | None, stg = None, outputs_disabled: bool = False):
+        self.module = module
+        self.report_format = OutputFormat[getattr(stg,'REPORT_FORMAT')] if hasattr(stg,'REPORT_FORMAT') else OutputFormat.json
+        self.notice_format = OutputFormat[getattr(stg,'NOTICE_FORMAT')] if hasattr(stg,'NOTICE_FORMAT') else OutputFormat.header_abi
+        self.index_outputs = bool(stg is not None and hasattr(stg,'INDEX_OUTPUTS') and getattr(stg,'INDEX_OUTPUTS'))
+        self.outputs_disabled = outputs_disabled
+
 # Settings
 class Setting:
     settings = {}
+    configs = {}
+    disabled_modules = frozenset()
 
     def __new__(cls):
         return cls
@@ -12,6 +30,24 @@ class Setting:
     def add(cls, mod):
         cls.settings[get_module_name(mod)] = mod
 
+    @classmethod
+    def freeze(cls, disabled_modules):
+        """Resolve the config of every module (and of modules with disabled outputs)."""
+        cls.disabled_modules = frozenset(disabled_modules)
+        cls.configs = {}
+        for module in set(cls.settings.keys()).union(cls.disabled_modules):
+            cls.get_config(module)
+
+    @classmethod
+    def get_config(cls, module: str | None) -> ModuleConfig:
+        config = cls.configs.get(module)
+        if config is None: # modules without settings (or before freeze)
+            config = ModuleConfig(module, cls.settings.get(module), module in cls.disabled_modules)
+            cls.configs[module] = config
+        return config
+
     @classmethod
     def reset(cls):
         cls.settings = {}
+        cls.configs = {}
+        cls.disabled_modules = frozenset()
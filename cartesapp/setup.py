@@ -1,4 +1,12 @@
+import logging
+
+from cartesi.models import RollupMetadata
+
 from cartesapp.storage import Storage, helpers
+from cartesapp.context import Context
+from cartesapp.utils import get_function_signature
+
+LOGGER = logging.getLogger(__name__)
 
 ###
 # Setup
@@ -6,6 +14,7 @@ from cartesapp.storage import Storage, helpers
 class Setup:
     setup_functions = []
     post_setup_functions = []
+    warmup_functions = []
 
     def __new__(cls):
         return cls
@@ -18,10 +27,15 @@ class Setup:
     def add_post_setup(cls, func):
         cls.post_setup_functions.append(_make_setup_function(func))
 
+    @classmethod
+    def add_warmup(cls, func):
+        cls.warmup_functions.append(_make_warmup_function(func))
+
     @classmethod
     def reset(cls):
         cls.setup_functions = []
         cls.post_setup_functions = []
+        cls.warmup_functions = []
 
 def _make_setup_function(f):
     @helpers.db_session
@@ -29,6 +43,45 @@ def _make_setup_function(f):
         f()
     return setup_func
 
+###
+# Warm-up
+#
+# Pony translates each query to sql the first time its code runs, so the first
+# inputs after a boot pay for the translations (and lazy imports). Warm-up
+# functions run after the post setup, before the rollup loop (so they are already
+# done in a snapshot of the machine): they can call the app queries and mutations
+# with representative payloads. Their outputs are dropped and their writes are
+# rolled back; errors are only logged.
+
+class _WarmupRollup:
+    def report(self, payload): pass
+    def notice(self, payload): pass
+    def voucher(self, payload): pass
+    def delegate_call_voucher(self, payload): pass
+
+_WARMUP_ADDRESS = f"{0:#042x}"
+
+def _make_warmup_function(f):
+    module_name, func_name = get_function_signature(f)
+    @helpers.db_session
+    def warmup_func():
+        ctx = Context
+        app_contract = ctx.app_contract
+        metadata = RollupMetadata(chain_id=0, app_contract=_WARMUP_ADDRESS, msg_sender=_WARMUP_ADDRESS,
+            input_index=0, block_number=0, block_timestamp=0, prev_randao="0x0")
+        ctx.set_context(_WarmupRollup(), metadata, module_name)
+        ctx.defer_outputs()
+        try:
+            f()
+        except Exception as e:
+            LOGGER.warning(f"Warm-up {module_name}.{func_name} failed: {e}")
+        finally:
+            ctx.discard_outputs()
+            helpers.rollback()
+            ctx.clear_context()
+            ctx.app_contract = app_contract
+    return warmup_func
+
 def setup(**kwargs):
     def decorator(func):
         Setup.add_setup(func)
@@ -40,3 +93,9 @@ def post_setup(**kwargs):
         Setup.add_post_setup(func)
         return func
     return decorator
+
+def warmup(**kwargs):
+    def decorator(func):
+        Setup.add_warmup(func)
+        return func
+    return decorator
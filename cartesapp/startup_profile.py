@@ -0,0 +1,278 @@
+import sys
+import time
+import json
+import logging
+import tracemalloc
+import importlib
+from importlib.abc import MetaPathFinder
+
+LOGGER = logging.getLogger(__name__)
+
+###
+# Configs
+
+STARTUP_PROFILE_FILE = 'cartesapp-startup.json'
+
+# setup_manager phases (Manager classmethods, Storage for initialize_storage)
+SETUP_PHASES = (
+    '_import_apps',
+    '_run_setup_functions',
+    '_register_queries',
+    '_register_mutations',
+    '_register_multicall',
+    '_register_codecs',
+    'initialize_storage',
+    '_run_post_setup_functions',
+    '_run_warmup_functions',
+)
+
+###
+# Import tracing
+#
+# Runs in a fresh interpreter (the cli imports the framework itself): each module
+# executed by an import is timed, and its allocations (still held after the
+# import) measured with tracemalloc. Self values exclude the imports nested in the
+# module, so they add up to the total per package.
+
+class ImportRecord:
+    __slots__ = ('name','order','cumulative','self_time','cumulative_memory','self_memory')
+    def __init__(self, name: str, order: int):
+        self.name = name
+        self.order = order
+        self.cumulative = 0.0
+        self.self_time = 0.0
+        self.cumulative_memory = None
+        self.self_memory = None
+
+    def to_dict(self) -> dict:
+        return {"module": self.name, "self_time": self.self_time, "cumulative_time": self.cumulative,
+            "self_memory": self.self_memory, "cumulative_memory": self.cumulative_memory}
+
+class _TracedLoader:
+    """Wraps the loader of a module spec to time its exec_module"""
+    def __init__(self, loader, tracer: 'ImportTracer'):
+        self.loader = loader
+        self.tracer = tracer
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # the module only sees its own loader
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.tracer.trace(module.__name__, self.loader.exec_module, module)
+
+class ImportTracer(MetaPathFinder):
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.records: list[ImportRecord] = []
+        self.stack: list[list] = []
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TracedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def trace(self, name: str, exec_module, module):
+        record = ImportRecord(name, len(self.records))
+        self.records.append(record)
+        # time and memory of the nested imports
+        frame = [0.0, 0]
+        self.stack.append(frame)
+        memory = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        start = time.perf_counter()
+        try:
+            exec_module(module)
+        finally:
+            record.cumulative = time.perf_counter() - start
+            self.stack.pop()
+            record.self_time = record.cumulative - frame[0]
+            if self.stack:
+                self.stack[-1][0] += record.cumulative
+            if self.trace_memory:
+                record.cumulative_memory = tracemalloc.get_traced_memory()[0] - memory
+                record.self_memory = record.cumulative_memory - frame[1]
+                if self.stack:
+                    self.stack[-1][1] += record.cumulative_memory
+
+    def packages(self) -> list[dict]:
+        """Self time and memory of the imported modules grouped by top level package"""
+        packages = {}
+        for record in self.records:
+            name = record.name.split('.')[0]
+            package = packages.setdefault(name, {"package": name, "modules": 0, "time": 0.0,
+                "memory": 0 if self.trace_memory else None})
+            package["modules"] += 1
+            package["time"] += record.self_time
+            if self.trace_memory:
+                package["memory"] += record.self_memory
+        return sorted(packages.values(), key=lambda p: p["time"], reverse=True)
+
+###
+# Setup phases
+
+class PhaseTimer:
+    """Times the setup_manager phases by replacing the methods while profiling"""
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases: list[dict] = []
+        self.replaced: list[tuple] = []
+
+    def install(self):
+        from cartesapp.manager import Manager
+        from cartesapp.storage import Storage
+        for name in SETUP_PHASES:
+            cls = Storage if name == 'initialize_storage' else Manager
+            self.replaced.append((cls, name, cls.__dict__[name]))
+            setattr(cls, name, staticmethod(self._timed(name, getattr(cls, name))))
+
+    def uninstall(self):
+        for cls, name, method in reversed(self.replaced):
+            setattr(cls, name, method)
+        self.replaced = []
+
+    def _timed(self, name, method):
+        def timed(*args, **kwargs):
+            memory = None
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+                memory = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                phase = {"phase": name, "time": time.perf_counter() - start, "memory": None, "peak_memory": None}
+                if self.trace_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    phase["memory"] = current - memory
+                    phase["peak_memory"] = peak - memory
+                self.phases.append(phase)
+        return timed
+
+###
+# Profile
+
+def max_rss() -> int | None:
+    """Peak resident memory of the process in bytes"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def profile_startup(modules: list[str] | None = None, reset_storage: bool = False, trace_memory: bool = True) -> dict:
+    """Imports the framework and runs Manager.setup_manager with the imports and
+    setup phases traced (the rollup loop is not started). Should run in a fresh
+    interpreter: modules imported before are not traced."""
+    if trace_memory:
+        tracemalloc.start()
+    tracer = ImportTracer(trace_memory)
+    timer = PhaseTimer(trace_memory)
+    start = time.perf_counter()
+    tracer.install()
+    try:
+        imports_start = time.perf_counter()
+        manager_module = importlib.import_module('cartesapp.manager')
+        import_time = time.perf_counter() - imports_start
+        manager_module.fix_imports()
+        if modules is None:
+            from cartesapp.utils import get_modules
+            modules = get_modules()
+        m = manager_module.Manager()
+        for mod in modules:
+            m.add_module(mod)
+        timer.install()
+        setup_start = time.perf_counter()
+        try:
+            m.setup_manager(reset_storage=reset_storage)
+        finally:
+            timer.uninstall()
+        setup_time = time.perf_counter() - setup_start
+    finally:
+        tracer.uninstall()
+        total = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    phases = [{"phase": "import cartesapp.manager", "time": import_time, "memory": None, "peak_memory": None}]
+    phases.extend(timer.phases)
+    phases.append({"phase": "setup_manager (other)", "time": setup_time - sum(p["time"] for p in timer.phases),
+        "memory": None, "peak_memory": None})
+    return {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "modules": modules,
+        "total_time": total,
+        "traced_memory": memory,
+        "max_rss": max_rss(),
+        "phases": phases,
+        "packages": tracer.packages(),
+        "imports": [r.to_dict() for r in sorted(tracer.records, key=lambda r: r.self_time, reverse=True)],
+    }
+
+def _fmt_time(seconds: float | None) -> str:
+    return '-' if seconds is None else f"{seconds * 1e3:.2f} ms"
+
+def _fmt_memory(size: int | None) -> str:
+    return '-' if size is None else f"{size / 1024:.1f} KiB"
+
+def _table(title: str, header: list[str], rows: list[list]) -> str:
+    widths = [max(len(str(c)) for c in col) for col in zip(header, *rows)]
+    lines = [title, "  ".join(h.ljust(w) for h, w in zip(header, widths)), "  ".join("-" * w for w in widths)]
+    lines.extend("  ".join(str(c).ljust(w) for c, w in zip(row, widths)) for row in rows)
+    return "\n".join(lines)
+
+def format_startup_profile(profile: dict, top: int = 30) -> str:
+    phases = sorted(profile["phases"], key=lambda p: p["time"], reverse=True)
+    sections = [
+        f"Startup {_fmt_time(profile['total_time'])}, traced memory {_fmt_memory(profile['traced_memory'])}, "
+            f"max rss {_fmt_memory(profile['max_rss'])}",
+        _table("Setup phases", ["phase", "time", "memory", "peak memory"],
+            [[p["phase"], _fmt_time(p["time"]), _fmt_memory(p["memory"]), _fmt_memory(p["peak_memory"])] for p in phases]),
+        _table("Imports by package (self)", ["package", "modules", "time", "memory"],
+            [[p["package"], p["modules"], _fmt_time(p["time"]), _fmt_memory(p["memory"])] for p in profile["packages"][:top]]),
+        _table(f"Top {top} modules (self)", ["module", "self time", "cumulative", "self memory", "cumulative memory"],
+            [[r["module"], _fmt_time(r["self_time"]), _fmt_time(r["cumulative_time"]), _fmt_memory(r["self_memory"]),
+                _fmt_memory(r["cumulative_memory"])] for r in profile["imports"][:top]]),
+    ]
+    return "\n\n".join(sections)
+
+def save_startup_profile(profile: dict, path: str | None = None) -> str:
+    path = path or STARTUP_PROFILE_FILE
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    return path
+
+def run():
+    """python -m cartesapp.startup_profile [OUTPUT [TOP [RESET_STORAGE [TRACE_MEMORY]]]]"""
+    # no cartesapp.utils here, it imports pydantic before the tracing
+    str2bool = lambda v: v.lower() in ("yes", "true", "t", "1", "y")
+    output = sys.argv[1] if len(sys.argv) > 1 else None
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    reset_storage = str2bool(sys.argv[3]) if len(sys.argv) > 3 else False
+    trace_memory = str2bool(sys.argv[4]) if len(sys.argv) > 4 else True
+    profile = profile_startup(reset_storage=reset_storage, trace_memory=trace_memory)
+    print(format_startup_profile(profile, top))
+    print(f"\nStartup profile written to {save_startup_profile(profile, output)}")
+
+if __name__ == '__main__':
+    run()
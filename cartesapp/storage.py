@@ -2,12 +2,50 @@ import pony.orm
 import logging
 import os
 import shutil
+import hashlib
+import re
 
 from cartesi.abi import String, Bytes, Int, UInt
 
+from cartesapp.utils import str2bool
+
 
 helpers = pony.orm
 
+LOGGER = logging.getLogger(__name__)
+
+###
+# Configs
+
+# strict: os.sync() after every commit (flushes every filesystem)
+# file: fsync only the database (and WAL) files after every commit
+# deferred: os.sync() once every STORAGE_SYNC_INPUTS commits (and on shutdown)
+DURABILITY_MODES = ('strict', 'file', 'deferred')
+DEFAULT_DURABILITY = 'strict'
+DEFAULT_SYNC_INPUTS = 100
+
+# sqlite pragmas of the STORAGE_PROFILE presets (STORAGE_PRAGMAS overrides them)
+STORAGE_PROFILES = {
+    'default': {}, # sqlite defaults (rollback journal, synchronous full)
+    'safe': {'journal_mode': 'wal', 'synchronous': 'full', 'temp_store': 'memory'},
+    'balanced': {'journal_mode': 'wal', 'synchronous': 'normal', 'temp_store': 'memory',
+        'cache_size': -16384, 'mmap_size': 67108864}, # 16 MB cache, 64 MB mmap
+    'fast': {'page_size': 8192, 'journal_mode': 'wal', 'synchronous': 'off', 'temp_store': 'memory',
+        'cache_size': -65536, 'mmap_size': 268435456}, # 64 MB cache, 256 MB mmap
+}
+DEFAULT_STORAGE_PROFILE = 'default'
+
+# run queries (inspects) on a separate query_only connection (file databases)
+READ_ONLY_QUERIES = str2bool(os.getenv('CARTESAPP_READ_ONLY_QUERIES') or 'true')
+
+# values sqlite reads back as numbers
+PRAGMA_ENUMS = {
+    'synchronous': {'off': 0, 'normal': 1, 'full': 2, 'extra': 3},
+    'temp_store': {'default': 0, 'file': 1, 'memory': 2},
+}
+NEW_DB_PRAGMAS = ('page_size', 'auto_vacuum') # only take effect before the first table
+MEMORY_DB_PRAGMAS = ('journal_mode', 'mmap_size') # not applicable to in-memory databases
+
 
 ###
 # Storage
@@ -17,6 +55,18 @@ class Storage:
     seeds = []
     STORAGE_PATH = None
     CASE_INSENSITIVITY_LIKE = None
+    STORAGE_DURABILITY = None
+    STORAGE_SYNC_INPUTS = None
+    STORAGE_PROFILE = None
+    STORAGE_PRAGMAS = None
+    STORAGE_EXPLAIN = None
+    indexes = []
+    READ_ONLY_QUERIES = READ_ONLY_QUERIES
+    query_connection = None # (pool, pid, write connection, connection) of the read-only connection
+    pragmas = {}        # pragmas applied on connect
+    filename = None     # database file (None in memory)
+    pending_syncs = 0   # commits not synced yet (deferred)
+    sync_fds = {}       # path -> fd of the database files (file)
 
     def __new__(cls):
         return cls
@@ -26,6 +76,7 @@ class Storage:
         filename = ":memory:"
         create_db = True
         if reset_storage:
+            cls.close_query_connection()
             cls.db.provider = cls.db.schema = None
         if cls.STORAGE_PATH is not None:
             uname = os.uname()
@@ -46,12 +97,179 @@ class Storage:
             def sqlite_case_sensitivity(db, connection):
                 cursor = connection.cursor()
                 cursor.execute('PRAGMA case_sensitive_like = OFF')
+        if cls.STORAGE_DURABILITY is not None and cls.STORAGE_DURABILITY not in DURABILITY_MODES:
+            raise Exception(f"Invalid storage durability {cls.STORAGE_DURABILITY}")
+        cls.filename = filename if filename != ":memory:" else None
+        pragmas = get_storage_pragmas(cls.STORAGE_PROFILE, cls.STORAGE_PRAGMAS)
+        if cls.filename is None:
+            pragmas = {k: v for k, v in pragmas.items() if k not in MEMORY_DB_PRAGMAS}
+        if not create_db:
+            pragmas = {k: v for k, v in pragmas.items() if k not in NEW_DB_PRAGMAS}
+        cls.pragmas = pragmas
+        if len(pragmas) > 0:
+            @cls.db.on_connect(provider='sqlite')
+            def sqlite_pragmas(db, connection):
+                cursor = connection.cursor()
+                for name, value in pragmas.items():
+                    cursor.execute(f'PRAGMA {name} = {value}')
         cls.db.bind(provider="sqlite", filename=filename, create_db=create_db)
-        # cls.db.execute("PRAGMA journal_mode = OFF;")
         # cls.db.provider.converter_classes.append((Enum, EnumConverter))
         cls.db.generate_mapping(create_tables=create_db)
+        cls.check_pragmas()
+        cls.create_indexes()
+        if cls.STORAGE_EXPLAIN:
+            cls.enable_explain()
         for s in cls.seeds: s()
 
+    @classmethod
+    @pony.orm.db_session
+    def check_pragmas(cls):
+        """Check the pragmas applied on connect were accepted by sqlite."""
+        for name, value in cls.pragmas.items():
+            if name == 'mmap_size': continue # capped by the sqlite build (SQLITE_MAX_MMAP_SIZE)
+            row = cls.db.execute(f'PRAGMA {name}').fetchone()
+            current = row[0] if row is not None else None
+            if isinstance(current, str): current = current.lower()
+            if current != PRAGMA_ENUMS.get(name, {}).get(value, value):
+                raise Exception(f"Storage pragma {name} is {current}, expected {value}")
+
+    @classmethod
+    def query_session(cls, func):
+        """Decorator for query functions: a db_session on the read-only connection
+        (see ``read_only_connection``). Pony's optimistic=False is not used, it
+        makes the session take the write lock (BEGIN IMMEDIATE)."""
+        session_func = pony.orm.db_session(func)
+        def query_session_func(*args, **kwargs):
+            pool = cls._swap_query_connection()
+            if pool is None:
+                return session_func(*args, **kwargs)
+            write_connection = pool.con
+            connection = cls.query_connection[3]
+            pool.con = connection
+            try:
+                return session_func(*args, **kwargs)
+            finally:
+                if pool.con is not connection: # pony dropped it (and maybe reconnected)
+                    if pool.con is not None and pool.con is not write_connection:
+                        pool.con.close()
+                    cls.close_query_connection()
+                pool.con = write_connection
+        query_session_func.__name__ = func.__name__
+        query_session_func.__doc__ = func.__doc__
+        return query_session_func
+
+    @classmethod
+    def _swap_query_connection(cls):
+        """Pony pool (of this thread) to switch to the read-only connection, or None
+        to keep the shared one (disabled, in memory, or already inside a session).
+        The read-only connection is reopened when the pool, the process or the
+        pool's connection changed (rebind, fork, disconnect)."""
+        if not cls.READ_ONLY_QUERIES or cls.filename is None or pony.orm.core.local.db_session is not None:
+            return None
+        provider = cls.db.provider
+        if provider is None: return None
+        pool = provider.pool
+        pid = os.getpid()
+        query_connection = cls.query_connection
+        if query_connection is None or query_connection[0] is not pool or query_connection[1] != pid \
+                or query_connection[2] is not pool.con:
+            cls.close_query_connection()
+            cls.query_connection = (pool, pid, pool.con, cls.read_only_connection())
+        return pool
+
+    @classmethod
+    def read_only_connection(cls):
+        """New connection set up by pony (functions, on_connect pragmas) with
+        PRAGMA query_only, so query sessions can't write or take the write lock."""
+        pool = cls.db.provider.pool
+        write_connection, pid = pool.con, pool.pid
+        pool.con = None
+        try:
+            connection, _ = pool.connect()
+            cls.db.call_on_connect(connection)
+            connection.execute('PRAGMA query_only = ON')
+        finally:
+            pool.con, pool.pid = write_connection, pid
+        return connection
+
+    @classmethod
+    def close_query_connection(cls):
+        if cls.query_connection is not None:
+            cls.query_connection[3].close()
+            cls.query_connection = None
+
+    @classmethod
+    def add_index(cls, entity, columns, where: str | None = None, unique: bool = False, name: str | None = None):
+        cls.indexes.append(Index(entity, columns, where, unique, name))
+
+    @classmethod
+    @pony.orm.db_session
+    def create_indexes(cls):
+        """Create the declared indexes missing in the database (new or existing).
+        Indexes with the default name (idx_<table>_<hash>) of a spec that changed
+        or was removed are dropped, so writes don't keep maintaining them."""
+        provider = cls.db.provider
+        names = set()
+        for idx in cls.indexes:
+            names.add(idx.index_name(provider))
+            cls.db.execute(idx.sql(provider))
+        tables = {e._table_ for e in cls.db.entities.values() if isinstance(e._table_, str)}
+        for name, table in cls.db.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'").fetchall():
+            if name not in names and table in tables and re.fullmatch(f"idx_{re.escape(table)}_[0-9a-f]{{10}}", name):
+                LOGGER.info(f"Dropping stale index {name}")
+                cls.db.execute(f"DROP INDEX {provider.quote_name(name)}")
+
+    @classmethod
+    def enable_explain(cls):
+        """Log the plans of the selects that scan a whole table (once per statement)."""
+        exec_sql = cls.db._exec_sql
+        explained = set()
+        def explain_exec_sql(sql, arguments=None, returning_id=False, start_transaction=False):
+            if sql not in explained and sql.lstrip()[:6].upper() == 'SELECT':
+                explained.add(sql)
+                plan = [row[-1] for row in exec_sql(f"EXPLAIN QUERY PLAN {sql}", arguments).fetchall()]
+                if any(_is_full_scan(detail) for detail in plan):
+                    LOGGER.warning(f"Full scan in query plan:\n{sql}\n" + "\n".join(plan))
+            return exec_sql(sql, arguments, returning_id, start_transaction)
+        cls.db._exec_sql = explain_exec_sql
+
+    @classmethod
+    def sync(cls):
+        """Make a commit durable, according to STORAGE_DURABILITY."""
+        durability = cls.STORAGE_DURABILITY or DEFAULT_DURABILITY
+        if durability == 'file':
+            cls._sync_files()
+        elif durability == 'deferred':
+            cls.pending_syncs += 1
+            if cls.pending_syncs >= (cls.STORAGE_SYNC_INPUTS or DEFAULT_SYNC_INPUTS):
+                cls.flush()
+        else:
+            os.sync()
+
+    @classmethod
+    def flush(cls):
+        """Sync the commits deferred so far."""
+        if cls.pending_syncs > 0:
+            cls.pending_syncs = 0
+            os.sync()
+
+    @classmethod
+    def _sync_files(cls):
+        if cls.filename is None: return
+        for path in (cls.filename, f"{cls.filename}-wal"):
+            fd = cls.sync_fds.get(path)
+            if fd is not None and os.fstat(fd).st_nlink == 0: # wal removed since it was opened
+                os.close(fd)
+                fd = None
+            if fd is None:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    cls.sync_fds.pop(path, None)
+                    continue
+                cls.sync_fds[path] = fd
+            os.fsync(fd)
+
     @classmethod
     def add_seed(cls, func):
         cls.seeds.append(_make_seed_function(func))
@@ -61,6 +279,104 @@ class Storage:
         cls.seeds = []
         cls.STORAGE_PATH = None
         cls.CASE_INSENSITIVITY_LIKE = None
+        cls.STORAGE_DURABILITY = None
+        cls.STORAGE_SYNC_INPUTS = None
+        cls.STORAGE_PROFILE = None
+        cls.STORAGE_PRAGMAS = None
+        cls.STORAGE_EXPLAIN = None
+        cls.indexes = []
+        cls.READ_ONLY_QUERIES = READ_ONLY_QUERIES
+        cls.close_query_connection()
+        cls.pending_syncs = 0
+        for fd in cls.sync_fds.values(): os.close(fd)
+        cls.sync_fds = {}
+
+def get_storage_pragmas(profile: str | None, pragmas: dict | None = None) -> dict:
+    """Pragmas of a STORAGE_PROFILE preset updated with custom STORAGE_PRAGMAS
+    (name -> int or keyword value), in the order they are applied."""
+    profile = profile or DEFAULT_STORAGE_PROFILE
+    if profile not in STORAGE_PROFILES:
+        raise Exception(f"Invalid storage profile {profile}")
+    result = dict(STORAGE_PROFILES[profile])
+    for name, value in (pragmas or {}).items():
+        if not isinstance(name, str) or not name.isidentifier():
+            raise Exception(f"Invalid storage pragma {name}")
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or (isinstance(value, str) and not value.isidentifier()):
+            raise Exception(f"Invalid value {value!r} for storage pragma {name}")
+        result[name.lower()] = value.lower() if isinstance(value, str) else value
+    # page_size must come before journal_mode (can't change once in wal)
+    return dict(sorted(result.items(), key=lambda p: p[0] not in NEW_DB_PRAGMAS))
+
+###
+# Indexes
+#
+# Secondary indexes beyond what helpers.Optional(index=...)/composite_index
+# declare: columns are attribute names (prefixed with '-' for descending order)
+# or sql expressions (e.g. 'lower(address)'), optionally partial (``where`` sql)
+# and covering (every column a query reads). They are created after the mapping
+# with CREATE INDEX IF NOT EXISTS, so they are also added to existing databases.
+
+class Index:
+    """Index of an entity table. The default name has a hash of the definition,
+    so a changed spec creates a new index (Storage.create_indexes drops the old one)."""
+    __slots__ = ('entity', 'columns', 'where', 'unique', 'name')
+
+    def __init__(self, entity, columns, where: str | None = None, unique: bool = False, name: str | None = None):
+        if isinstance(columns, str):
+            columns = (columns,)
+        if len(columns) == 0:
+            raise Exception(f"Index of {entity.__name__} without columns")
+        self.entity = entity
+        self.columns = tuple(columns)
+        self.where = where
+        self.unique = unique
+        self.name = name
+
+    def _column_sql(self, column: str, quote) -> list:
+        name = column.lstrip('-')
+        if not name.isidentifier(): # expression
+            return [column]
+        attr = getattr(self.entity, name, None)
+        if not isinstance(attr, pony.orm.core.Attribute) or attr.is_collection:
+            raise Exception(f"Invalid index column {name} for {self.entity.__name__}")
+        order = ' DESC' if column.startswith('-') else ''
+        return [f"{quote(c)}{order}" for c in attr.columns]
+
+    def _definition(self, provider) -> str:
+        quote = provider.quote_name
+        columns = ', '.join(c for column in self.columns for c in self._column_sql(column, quote))
+        definition = f"ON {quote(self.entity._table_)} ({columns})"
+        if self.where is not None:
+            definition += f" WHERE {self.where}"
+        return definition
+
+    def index_name(self, provider, definition: str | None = None) -> str:
+        if self.name is not None:
+            return self.name
+        if definition is None:
+            definition = self._definition(provider)
+        table = self.entity._table_
+        table_name = table if isinstance(table, str) else '_'.join(table)
+        return f"idx_{table_name}_{hashlib.sha1(definition.encode('utf-8')).hexdigest()[:10]}"
+
+    def sql(self, provider) -> str:
+        definition = self._definition(provider)
+        name = self.index_name(provider, definition)
+        return f"CREATE {'UNIQUE ' if self.unique else ''}INDEX IF NOT EXISTS {provider.quote_name(name)} {definition}"
+
+def index(*columns, where: str | None = None, unique: bool = False, name: str | None = None):
+    """Entity class decorator declaring a secondary index."""
+    def decorator(entity):
+        Storage.add_index(entity, columns, where=where, unique=unique, name=name)
+        return entity
+    return decorator
+
+def _is_full_scan(detail: str) -> bool:
+    # 'SCAN t' ('SCAN TABLE t' before sqlite 3.36), not 'SCAN t USING INDEX ...'
+    return detail.startswith('SCAN ') and ' USING ' not in detail and 'CONSTANT ROW' not in detail
+
+###
+# Seeds
 
 def _make_seed_function(f):
     @helpers.db_session
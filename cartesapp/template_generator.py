@@ -10,7 +10,7 @@ from cartesapp.external_tools import popen_cmd
 
 from cartesapp.utils import convert_camel_case
 
-from cartesapp.output import MAX_SPLITTABLE_OUTPUT_SIZE
+from cartesapp.output import MAX_SPLITTABLE_OUTPUT_SIZE, MAX_INSPECT_PARTS
 
 LOGGER = logging.getLogger(__name__)
 
@@ -199,6 +199,7 @@ def render_templates(settings,mutations_info,queries_info,notices_info,reports_i
             template_content = files('cartesapp.__templates__').joinpath('module-lib.ts.jinja').read_text()
             lib_template_output = Template(template_content).render({
                 "MAX_SPLITTABLE_OUTPUT_SIZE":MAX_SPLITTABLE_OUTPUT_SIZE,
+                "MAX_INSPECT_PARTS":MAX_INSPECT_PARTS,
                 "mutations_info":module_mutations_info,
                 "queries_info":module_queries_info,
                 "mutations_payload_info":mutations_payload_info,
@@ -14,7 +14,8 @@ from cartesi.models import ABIFunctionSelectorHeader
 from cartesapp.manager import Manager
 from cartesapp.utils import get_modules, hex2bytes, read_config_file, DEFAULT_CONFIGS, deep_merge_dicts, str2bool
 from cartesapp.input import encode_advance_input, encode_inspect_url_input, encode_inspect_jsonrpc_input, encode_query_jsonrpc_input, \
-    encode_query_url_input, encode_mutation_input, encode_inspect_json_input, encode_query_json_input
+    encode_query_url_input, encode_mutation_input, encode_inspect_json_input, encode_query_json_input, \
+    encode_chunked_advance_input, encode_chunked_mutation_input, encode_batch_advance_input, encode_batch_mutation_input
 from cartesapp.external_tools import run_cm, run_cmd
 
 import logging
@@ -27,6 +28,10 @@ class InputHelper:
     encode_inspect_jsonrpc_input = encode_inspect_jsonrpc_input
     encode_inspect_json_input = encode_inspect_json_input
     encode_mutation_input = encode_mutation_input
+    encode_chunked_advance_input = encode_chunked_advance_input
+    encode_chunked_mutation_input = encode_chunked_mutation_input
+    encode_batch_advance_input = encode_batch_advance_input
+    encode_batch_mutation_input = encode_batch_mutation_input
     encode_query_url_input = encode_query_url_input
     encode_query_jsonrpc_input = encode_query_jsonrpc_input
     encode_query_json_input = encode_query_json_input
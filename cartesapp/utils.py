@@ -245,6 +245,9 @@ class OutputFormat(Enum):
     packed_abi = 1
     json = 2
     header_abi = 3
+    columnar = 4
+    json_deflate = 5
+    columnar_deflate = 6
 
 class InputFormat(Enum):
     abi = 0
@@ -0,0 +1,32 @@
+"""Timing helpers shared by the benchmark scripts in this directory.
+
+Benchmarks are plain scripts, not collected by pytest. Run them from the repo
+root with the framework installed, e.g.::
+
+    python tests/benchmarks/bench_decode_plan.py
+"""
+import timeit
+
+
+def measure(func, repeat: int = 5) -> float:
+    """Best per-call wall time (seconds) of ``func`` over ``repeat`` autoranged runs."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def fmt_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def print_table(title: str, header: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(c)) for c in col) for col in zip(header, *rows)]
+    print(f"\n{title}")
+    print("  ".join(str(h).ljust(w) for h, w in zip(header, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
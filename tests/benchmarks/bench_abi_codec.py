@@ -0,0 +1,64 @@
+"""Generic ``abi.encode_model``/``abi.decode_to_model`` against the per-model
+``ModelCodec`` built at ``setup_manager`` time.
+
+Models mirror the example apps: echo_app mutation payload, count_app url_app
+``MessageReceived`` notice, ledger_app deposit payload and ERC-1155 voucher.
+"""
+from pydantic import BaseModel
+
+from cartesi import abi
+
+from cartesapp.codec import ModelCodec
+
+from _bench import measure, fmt_time, print_table
+
+
+class EchoPayload(BaseModel):               # examples/echo_app
+    message: abi.Bytes
+
+class MessageReceived(BaseModel):           # examples/count_app/url_app
+    message: abi.String
+    user_address: abi.Address
+    timestamp: abi.UInt256
+    index: abi.Int
+
+class DepositErc20Payload(BaseModel):       # examples/ledger_app
+    token: abi.Address
+    sender: abi.Address
+    amount: abi.UInt256
+    exec_layer_data: abi.Bytes
+
+class Erc1155SingleVoucher(BaseModel):      # examples/ledger_app
+    sender: abi.Address
+    receiver: abi.Address
+    token_id: abi.UInt256
+    amount: abi.UInt256
+    data: abi.Bytes
+
+
+SAMPLES = [
+    EchoPayload(message=b"hello world" * 10),
+    MessageReceived(message="hello world", user_address="0x" + "cd" * 20, timestamp=1700000000, index=42),
+    DepositErc20Payload(token="0x" + "11" * 20, sender="0x" + "22" * 20, amount=10**18, exec_layer_data=b""),
+    Erc1155SingleVoucher(sender="0x" + "11" * 20, receiver="0x" + "22" * 20, token_id=1, amount=5, data=b"\x01" * 64),
+]
+
+
+def main():
+    rows = []
+    for sample in SAMPLES:
+        model = sample.__class__
+        codec = ModelCodec(model)
+        data = abi.encode_model(sample)
+        assert codec.encode(sample) == data and codec.decode(data) == abi.decode_to_model(data=data, model=model)
+        t_enc_generic = measure(lambda: abi.encode_model(sample))
+        t_enc_codec = measure(lambda: codec.encode(sample))
+        t_dec_generic = measure(lambda: abi.decode_to_model(data=data, model=model))
+        t_dec_codec = measure(lambda: codec.decode(data))
+        rows.append([model.__name__, "encode", fmt_time(t_enc_generic), fmt_time(t_enc_codec), f"{t_enc_generic / t_enc_codec:.2f}x"])
+        rows.append([model.__name__, "decode", fmt_time(t_dec_generic), fmt_time(t_dec_codec), f"{t_dec_generic / t_dec_codec:.2f}x"])
+    print_table("ABI codec latency", ["model", "op", "generic", "ModelCodec", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Report size and serialization time of a 10k rows ``ExtendedMessages`` result
+(examples/count_app/jsonrpc_app) with the json and columnar report formats, and
+the splittable parts needed to fetch it."""
+import json
+from math import ceil
+from typing import List
+
+from pydantic import BaseModel
+
+from cartesapp.columnar import decode_columnar
+from cartesapp.output import normalize_output, MAX_SPLITTABLE_OUTPUT_SIZE
+from cartesapp.utils import OutputFormat
+
+from _bench import measure, fmt_time, print_table
+
+
+class ExtendedMessage(BaseModel):           # examples/count_app/jsonrpc_app
+    index:          int
+    message:        str
+    user:           str
+    created_at:     int
+
+class ExtendedMessages(BaseModel):
+    data:   List[ExtendedMessage]
+    total:  int
+
+ExtendedMessages.__module__ = "jsonrpc_app.extended_messages"
+
+USERS = 200
+
+
+def make_result(rows):
+    return ExtendedMessages(
+        data=[ExtendedMessage(index=i, message=f"message {i}", user="0x" + f"{i % USERS:040x}", created_at=1700000000 + i) for i in range(rows)],
+        total=rows,
+    )
+
+
+def main():
+    table = []
+    for rows in (10_000, 100_000):
+        result = make_result(rows)
+        json_body = normalize_output(result, OutputFormat.json)[0]
+        columnar_body = normalize_output(result, OutputFormat.columnar)[0]
+        assert decode_columnar(columnar_body) == json.loads(json_body)
+        t_json = measure(lambda: normalize_output(result, OutputFormat.json), repeat=3)
+        t_columnar = measure(lambda: normalize_output(result, OutputFormat.columnar), repeat=3)
+        for name, body, t in (("json", json_body, t_json), ("columnar", columnar_body, t_columnar)):
+            table.append([f"{rows}", name, f"{len(body)}", fmt_time(t), f"{ceil(len(body) / MAX_SPLITTABLE_OUTPUT_SIZE)}"])
+    print_table(f"ExtendedMessages report ({USERS} distinct users)", ["rows", "format", "bytes", "serialize", "parts"], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Report size, serialization time and inspect round trips of a 100k rows
+``ExtendedMessages`` result (examples/count_app/jsonrpc_app) with the plain and
+compressed (``*_deflate``) report formats."""
+import json
+from math import ceil
+
+from cartesapp.columnar import decode_columnar
+from cartesapp.compression import decompress_output, OUTPUT_COMPRESS_LEVEL
+from cartesapp.output import normalize_output, MAX_SPLITTABLE_OUTPUT_SIZE
+from cartesapp.utils import OutputFormat
+
+from _bench import measure, fmt_time, print_table
+from bench_columnar_report import make_result, USERS
+
+ROWS = 100_000
+# a smaller splittable size (like a node with a lower inspect payload limit) makes
+# the round trip difference visible
+PART_SIZES = (MAX_SPLITTABLE_OUTPUT_SIZE, 1048576)
+
+
+def main():
+    result = make_result(ROWS)
+    expected = json.loads(normalize_output(result, OutputFormat.json)[0])
+    table = []
+    for encode_format in (OutputFormat.json, OutputFormat.json_deflate, OutputFormat.columnar, OutputFormat.columnar_deflate):
+        body = normalize_output(result, encode_format)[0]
+        decoded = decompress_output(body)
+        assert (decode_columnar(decoded) if encode_format.name.startswith('columnar') else json.loads(decoded)) == expected
+        t = measure(lambda: normalize_output(result, encode_format), repeat=3)
+        table.append([encode_format.name, f"{len(body)}", fmt_time(t)] + [f"{ceil(len(body) / size)}" for size in PART_SIZES])
+    print_table(
+        f"ExtendedMessages report of {ROWS} rows ({USERS} distinct users, deflate level {OUTPUT_COMPRESS_LEVEL})",
+        ["format", "bytes", "serialize"] + [f"inspects ({size} B parts)" for size in PART_SIZES],
+        table,
+    )
+
+
+if __name__ == '__main__':
+    main()
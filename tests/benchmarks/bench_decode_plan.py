@@ -0,0 +1,145 @@
+"""Inspect decode time with and without the per-route ``DecodePlan``.
+
+"before" is the previous decode path (copied below), which resolved the type
+hints, list flags and extended fields of the models on every request; "after"
+reuses the plan built once by ``Manager._register_queries``.
+"""
+from typing import get_type_hints, List, Optional
+
+from pydantic import BaseModel, create_model
+
+from cartesi import URLParameters
+
+from cartesapp.input import DecodePlan, _decode_url_params, _decode_json_request, splittable_query_params
+from cartesapp.utils import InputFormat
+
+from _bench import measure, fmt_time, print_table
+
+
+class MessagesQueryPayload(BaseModel):
+    user_address: Optional[str] = None
+    tags: Optional[List[str]] = None
+    page: Optional[int] = None
+    page_size: Optional[int] = None
+
+
+ExtendedPayload = create_model("MessagesQueryPayloadSplittable", __base__=MessagesQueryPayload, **splittable_query_params)
+
+
+def legacy_decode_url_params(model, params: URLParameters, func_configs: dict) -> list:
+    hints = get_type_hints(model)
+    fields = []
+    values = []
+    model_fields = model.__fields__.keys()
+    for k in model_fields:
+        if k in params.query_params:
+            field_str = str(hints[k])
+            if field_str.startswith('typing.List') or field_str.startswith('typing.Optional[typing.List'):
+                fields.append(k)
+                values.append(params.query_params[k])
+            else:
+                fields.append(k)
+                values.append(params.query_params[k][0])
+        if k in params.path_params:
+            fields.append(k)
+            values.append(params.path_params[k])
+    param = model.parse_obj(dict(zip(fields, values)))
+
+    extended_model = func_configs.get("extended_model")
+    if extended_model is not None:
+        extended_hints = get_type_hints(extended_model)
+        for k in list(set(extended_model.__fields__.keys()).difference(model_fields)):
+            if k in params.query_params:
+                field_str = str(extended_hints[k])
+                if field_str.startswith('typing.List') or field_str.startswith('typing.Optional[typing.List'):
+                    fields.append(k)
+                    values.append(params.query_params[k])
+                else:
+                    fields.append(k)
+                    values.append(params.query_params[k][0])
+        func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
+    return [param]
+
+
+def legacy_decode_json_request(model, has_param: bool, data: dict, func_configs: dict) -> list:
+    func_configs["query_format"] = InputFormat.json
+    if data.get("jsonrpc") == "2.0":
+        req_id = data.get('id')
+        if req_id is None: raise Exception("Missing id parameters for jsonrpc request")
+        func_configs["query_format"] = InputFormat.jsonrpc
+        func_configs["id"] = req_id
+
+    if not has_param:
+        return []
+
+    params = data.get('params')
+    fields = []
+    values = []
+    model_fields = list(model.__fields__.keys())
+    extended_model = func_configs.get("extended_model")
+    diff_fields = None
+    if extended_model is not None:
+        diff_fields = list(set(extended_model.__fields__.keys()).difference(model_fields))
+    if type(params) == type([]):
+        for i in range(min(len(params),len(model_fields))):
+            fields.append(model_fields[i])
+            values.append(params[i])
+        param = model.parse_obj(dict(zip(fields, values)))
+        if diff_fields is not None and extended_model is not None and len(params) > len(values):
+            initial_param_ind = len(values)
+            for i in range(min(len(params) - initial_param_ind,len(diff_fields))):
+                fields.append(diff_fields[i])
+                values.append(params[initial_param_ind+i])
+            func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
+    elif type(params) == type({}):
+        for k in params:
+            if k in model_fields:
+                fields.append(k)
+                values.append(params[k])
+        param = model.parse_obj(dict(zip(fields, values)))
+        if diff_fields is not None and extended_model is not None and len(params) > len(values):
+            for k in diff_fields:
+                fields.append(k)
+                values.append(params[k])
+            func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
+    else:
+        if len(model_fields) >= 1:
+            fields.append(model_fields[0])
+            values.append(params)
+            param = model.parse_obj(dict(zip(fields, values)))
+        elif diff_fields is not None and extended_model is not None and len(diff_fields) >= 1:
+            fields.append(diff_fields[0])
+            values.append(params)
+            func_configs["extended_params"] = extended_model.parse_obj(dict(zip(fields, values)))
+            return []
+        else:
+            raise Exception("Parameters format not supported")
+    return [param]
+
+
+def main():
+    url_params = URLParameters(path_params={"user_address": "0x" + "ab" * 20},
+                               query_params={"tags": ["a", "b"], "page": ["2"], "part": ["1"]})
+    json_data = {"jsonrpc": "2.0", "id": 1, "method": "m", "params": ["0x" + "ab" * 20, ["a", "b"], 2, 10, 1]}
+    plan = DecodePlan(MessagesQueryPayload, ExtendedPayload, ["user_address"])
+
+    cases = {
+        "url": (
+            lambda: legacy_decode_url_params(MessagesQueryPayload, url_params, {"extended_model": ExtendedPayload}),
+            lambda: _decode_url_params(MessagesQueryPayload, url_params, {"extended_model": ExtendedPayload}, plan),
+        ),
+        "jsonrpc": (
+            lambda: legacy_decode_json_request(MessagesQueryPayload, True, json_data, {"extended_model": ExtendedPayload}),
+            lambda: _decode_json_request(MessagesQueryPayload, True, json_data, {"extended_model": ExtendedPayload}, plan),
+        ),
+    }
+    rows = []
+    for name, (before, after) in cases.items():
+        t_before = measure(before)
+        t_after = measure(after)
+        rows.append([name, fmt_time(t_before), fmt_time(t_after), f"{t_before / t_after:.2f}x"])
+    print_table("Decode time per inspect", ["strategy", "before", "after", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
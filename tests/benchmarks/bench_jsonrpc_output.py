@@ -0,0 +1,60 @@
+"""JSON-RPC report serialization of a 10k rows ``ExtendedMessages`` result
+(examples/count_app/jsonrpc_app).
+
+The previous path serialized the model, parsed it back with ``json.loads`` and
+dumped the whole envelope again; ``normalize_jsonrpc_body`` writes the envelope
+around the model json. Plain data results (a list of dicts) are also timed.
+"""
+import json
+from typing import List
+
+from pydantic import BaseModel
+
+from cartesapp.output import normalize_jsonrpc_body
+from cartesapp.utils import OutputFormat, str2bytes
+
+from _bench import measure, fmt_time, print_table
+
+
+class ExtendedMessage(BaseModel):           # examples/count_app/jsonrpc_app
+    index:          int
+    message:        str
+    user:           str
+    created_at:     int
+
+class ExtendedMessages(BaseModel):
+    data:   List[ExtendedMessage]
+    total:  int
+
+ExtendedMessages.__module__ = "jsonrpc_app.extended_messages"
+
+ROWS = 10_000
+RESULT = ExtendedMessages(
+    data=[ExtendedMessage(index=i, message=f"message {i}", user="0x" + f"{i:040x}", created_at=1700000000 + i) for i in range(ROWS)],
+    total=ROWS,
+)
+ROWS_DATA = [row.dict() for row in RESULT.data]
+
+
+def legacy_body(data):
+    if isinstance(data, BaseModel):
+        data = json.loads(data.json(exclude_unset=True,exclude_none=True))
+    return str2bytes(json.dumps({"jsonrpc": "2.0", "result": data}))
+
+
+def main():
+    assert json.loads(normalize_jsonrpc_body(RESULT, OutputFormat.json)[0]) == json.loads(legacy_body(RESULT))
+    rows = []
+    t_legacy = measure(lambda: legacy_body(RESULT), repeat=3)
+    t_new = measure(lambda: normalize_jsonrpc_body(RESULT, OutputFormat.json), repeat=3)
+    rows.append(["ExtendedMessages model", fmt_time(t_legacy), fmt_time(t_new), f"{t_legacy / t_new:.2f}x"])
+
+    assert normalize_jsonrpc_body(ROWS_DATA, OutputFormat.json)[0] == legacy_body(ROWS_DATA)
+    t_legacy = measure(lambda: legacy_body(ROWS_DATA), repeat=3)
+    t_new = measure(lambda: normalize_jsonrpc_body(ROWS_DATA, OutputFormat.json), repeat=3)
+    rows.append(["list of dicts", fmt_time(t_legacy), fmt_time(t_new), f"{t_legacy / t_new:.2f}x"])
+    print_table(f"JSON-RPC result of {ROWS} rows", ["result", "round trip", "single pass", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
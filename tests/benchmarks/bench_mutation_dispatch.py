@@ -0,0 +1,48 @@
+"""Advance dispatch latency against the number of registered mutations.
+
+Compares the linear ``ABIRouter.get_handler`` scan with the selector-indexed
+``MutationRouter`` for the first, middle and last registered selector.
+"""
+from cartesi import ABIRouter
+from cartesi.models import ABIFunctionSelectorHeader, RollupData, RollupMetadata, RollupResponse
+
+from cartesapp.router import MutationRouter
+from cartesapp.utils import bytes2hex
+
+from _bench import measure, fmt_time, print_table
+
+ROUTE_COUNTS = [10, 50, 150, 500]
+SENDER = "0x" + "cd" * 20
+
+
+def build_router(router, n_routes):
+    headers = []
+    for i in range(n_routes):
+        header = ABIFunctionSelectorHeader(function=f"app.mutation_{i}", argument_types=["uint256", "bytes"])
+        router.advance(header=header)(lambda rollup, data: True)
+        headers.append(header.to_bytes())
+    return headers
+
+
+def advance(header: bytes):
+    metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender=SENDER,
+                              input_index=0, block_number=1, block_timestamp=1, prev_randao="0x0")
+    return RollupResponse(request_type="advance_state", data=RollupData(metadata=metadata, payload=bytes2hex(header + b"\x00" * 64)))
+
+
+def main():
+    rows = []
+    for n_routes in ROUTE_COUNTS:
+        linear, indexed = ABIRouter(), MutationRouter()
+        headers = build_router(linear, n_routes)
+        build_router(indexed, n_routes)
+        for position, header in (("first", headers[0]), ("middle", headers[n_routes // 2]), ("last", headers[-1])):
+            request = advance(header)
+            t_linear = measure(lambda: linear.get_handler(request))
+            t_indexed = measure(lambda: indexed.get_handler(request))
+            rows.append([n_routes, position, fmt_time(t_linear), fmt_time(t_indexed), f"{t_linear / t_indexed:.2f}x"])
+    print_table("Advance dispatch latency", ["routes", "selector", "ABIRouter", "MutationRouter", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
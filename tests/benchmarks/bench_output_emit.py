@@ -0,0 +1,99 @@
+"""Notice/voucher emission: selector header and voucher selector rebuilt on each
+output (previous behavior) against the per-class ``OutputDescriptor`` built when
+the output is registered.
+
+Emission goes through ``send_notice``/``send_voucher`` with a no-op rollup, so the
+rate includes the ABI encoding and settings lookups of a real advance.
+"""
+from pydantic import BaseModel
+
+from Crypto.Hash import keccak
+from cartesi import abi
+from cartesi.models import ABIFunctionSelectorHeader, RollupMetadata
+
+from cartesapp.codec import Codec, encode_model
+from cartesapp.context import Context
+from cartesapp.output import Output, send_notice, send_voucher
+
+from _bench import measure, fmt_time, print_table
+
+
+class MessageReceived(BaseModel):           # examples/count_app/url_app
+    message: abi.String
+    user_address: abi.Address
+    timestamp: abi.UInt256
+    index: abi.Int
+
+class Erc1155SingleVoucher(BaseModel):      # examples/ledger_app
+    sender: abi.Address
+    receiver: abi.Address
+    token_id: abi.UInt256
+    amount: abi.UInt256
+    data: abi.Bytes
+
+# registered outputs need a package-like module (module name is the app name)
+MessageReceived.__module__ = "bench.model"
+Erc1155SingleVoucher.__module__ = "bench.model"
+
+NOTICE = MessageReceived(message="hello world", user_address="0x" + "cd" * 20, timestamp=1700000000, index=42)
+VOUCHER = Erc1155SingleVoucher(sender="0x" + "11" * 20, receiver="0x" + "22" * 20, token_id=1, amount=5, data=b"\x01" * 64)
+DESTINATION = "0x" + "33" * 20
+
+
+class NullRollup:
+    def notice(self, payload): pass
+    def voucher(self, payload): pass
+
+
+def legacy_notice(data):
+    header = ABIFunctionSelectorHeader(
+        function="bench.MessageReceived",
+        argument_types=abi.get_abi_types_from_model(data)
+    )
+    return header.to_bytes()+encode_model(data)
+
+def legacy_voucher(data):
+    args_types = abi.get_abi_types_from_model(data)
+    sig_hash = keccak.new(digest_bits=256)
+    sig_hash.update(f'{data.__class__.__name__}({",".join(args_types)})'.encode('utf-8'))
+    return sig_hash.digest()[:4]+encode_model(data)
+
+def descriptor_notice(data):
+    return Output.descriptors[data.__class__].header+encode_model(data)
+
+def descriptor_voucher(data):
+    return Output.descriptors[data.__class__].selector+encode_model(data)
+
+
+def main():
+    Output.add_notice(MessageReceived)
+    Output.add_voucher(Erc1155SingleVoucher)
+    Codec.add(MessageReceived) # as registered by setup_manager
+    Codec.add(Erc1155SingleVoucher)
+    assert legacy_notice(NOTICE) == descriptor_notice(NOTICE)
+    assert legacy_voucher(VOUCHER) == descriptor_voucher(VOUCHER)
+
+    rows = []
+    for name, legacy, new, sample in [
+            ("notice payload", legacy_notice, descriptor_notice, NOTICE),
+            ("voucher payload", legacy_voucher, descriptor_voucher, VOUCHER)]:
+        t_legacy = measure(lambda: legacy(sample))
+        t_new = measure(lambda: new(sample))
+        rows.append([name, fmt_time(t_legacy), fmt_time(t_new), f"{t_legacy / t_new:.2f}x"])
+    print_table("Output payload build", ["output", "per output", "descriptor", "speedup"], rows)
+
+    Context.rollup = NullRollup()
+    Context.metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender="0x" + "cd" * 20,
+                                      input_index=0, block_number=1, block_timestamp=1, prev_randao="0x0")
+    Context.set_module("bench")
+    rows = []
+    for name, emit in [
+            ("send_notice", lambda: send_notice(NOTICE)),
+            ("send_voucher", lambda: send_voucher(DESTINATION, VOUCHER))]:
+        t = measure(emit)
+        rows.append([name, fmt_time(t), f"{1 / t:,.0f}"])
+    print_table("Emission rate", ["emit", "per output", "outputs/s"], rows)
+
+
+if __name__ == '__main__':
+    main()
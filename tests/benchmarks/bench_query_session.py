@@ -0,0 +1,84 @@
+"""Inspect latency of the count_app queries with and without read-only query
+sessions (CARTESAPP_READ_ONLY_QUERIES).
+
+The database (file backed) is filled with MESSAGES messages from a few senders
+by the count_app mutation, then each query wrapper is timed. Each variant runs
+in a fresh interpreter, since Pony binds the database only once per process.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from cartesi import URLParameters, abi
+from cartesi.models import RollupData, RollupMetadata
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "examples")
+sys.path.insert(0, os.path.join(EXAMPLES, "count_app"))
+
+from cartesapp.input import _make_mut, _make_url_query
+from cartesapp.storage import Storage
+from cartesapp.utils import bytes2hex
+
+from _bench import measure, fmt_time, print_table
+
+MESSAGES = 2000
+SENDERS = [f"{i:#042x}" for i in range(1, 21)]
+VARIANTS = {"db_session": "false", "read-only session": "true"}
+
+
+class NullRollup:
+    def report(self, payload): pass
+    def notice(self, payload): pass
+    def voucher(self, payload): pass
+
+
+def advance_data(i: int, payload: bytes) -> RollupData:
+    metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender=SENDERS[i % len(SENDERS)],
+                              input_index=i, block_number=1, block_timestamp=i, prev_randao="0x0")
+    return RollupData(metadata=metadata, payload=bytes2hex(payload))
+
+
+def run():
+    from url_app.messages import echo_and_update_count, messages, Payload, MessagesQueryPayload
+    from json_app.count import message_counts
+    from jsonrpc_app.extended_messages import messages_and_users
+    with tempfile.TemporaryDirectory() as path:
+        Storage.STORAGE_PATH = path
+        Storage.initialize_storage()
+        rollup = NullRollup()
+        mutation = _make_mut(echo_and_update_count, Payload, True, "url_app")
+        for i in range(MESSAGES):
+            assert mutation(rollup, advance_data(i, abi.encode_model(Payload(message=f"message {i}"))))
+        user = URLParameters(path_params={}, query_params={"user_address": [SENDERS[0]]})
+        queries = [
+            ("messages (1 user)", _make_url_query(messages, MessagesQueryPayload, True, "url_app"), user),
+            ("message_counts (1 user)", _make_url_query(message_counts, MessagesQueryPayload, True, "json_app"), user),
+            ("messages_and_users (1 user)", _make_url_query(messages_and_users, MessagesQueryPayload, True, "jsonrpc_app"), user),
+        ]
+        for name, query, params in queries:
+            assert query(rollup, params)
+            print(f"{name}|{measure(lambda: query(rollup, params))}")
+
+
+def main():
+    times = {}
+    for variant, enabled in VARIANTS.items():
+        env = dict(os.environ, CARTESAPP_READ_ONLY_QUERIES=enabled)
+        out = subprocess.run([sys.executable, __file__, "run"], check=True, capture_output=True, text=True, env=env).stdout
+        for line in out.splitlines():
+            name, seconds = line.split("|")
+            times.setdefault(name, {})[variant] = float(seconds)
+    rows = []
+    for name, t in times.items():
+        before, after = t["db_session"], t["read-only session"]
+        rows.append([name, fmt_time(before), fmt_time(after), f"{before / after:.2f}x"])
+    print_table(f"count_app inspect latency ({MESSAGES} messages)",
+                ["query", "db_session", "read-only session", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run()
+    else:
+        main()
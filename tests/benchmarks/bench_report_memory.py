@@ -0,0 +1,84 @@
+"""Peak memory while emitting a maximum-size splittable report (one full part
+plus the more-parts byte, chunked in MAX_OUTPUT_SIZE reports).
+
+The previous chunk loop (slice the part, append the trailer, truncate, then
+slice and hex every chunk) is compared with the memoryview loop of
+``_send_report_body``. Each variant runs in a fresh interpreter so peak RSS
+(ru_maxrss) is not shared; the tracemalloc peak is the memory allocated on top
+of the serialized body.
+"""
+import resource
+import subprocess
+import sys
+import tracemalloc
+from math import ceil
+
+from pydantic import BaseModel, create_model
+
+from cartesapp.context import Context
+from cartesapp.input import splittable_query_params
+from cartesapp.output import _send_report_body, MAX_SPLITTABLE_OUTPUT_SIZE, MAX_AGGREGATED_OUTPUT_SIZE, MAX_OUTPUT_SIZE
+from cartesapp.setting import Setting
+from cartesapp.utils import bytes2hex
+
+from _bench import print_table
+
+
+class Query(BaseModel):
+    pass
+
+QuerySplittable = create_model("QuerySplittable", __base__=Query, **splittable_query_params)
+
+
+class HexRollup: # like the http rollup: payloads go out as hex strings
+    def __init__(self):
+        self.sent = 0
+    def report(self, payload: str):
+        self.sent += len(payload)
+
+
+def legacy_send(payload, part, rollup):
+    n_parts = ceil(len(payload) / MAX_SPLITTABLE_OUTPUT_SIZE)
+    remaining_parts = min(n_parts - part - 1, 255)
+    payload = payload[MAX_SPLITTABLE_OUTPUT_SIZE*part:MAX_SPLITTABLE_OUTPUT_SIZE*(part+1)]
+    payload += remaining_parts.to_bytes(1,'big')
+    payload = payload[:MAX_AGGREGATED_OUTPUT_SIZE]
+    sent_bytes = 0
+    while sent_bytes < len(payload):
+        top_bytes = min(sent_bytes + MAX_OUTPUT_SIZE, len(payload))
+        rollup.report(bytes2hex(payload[sent_bytes:top_bytes]))
+        sent_bytes = top_bytes
+
+
+def run(variant: str):
+    body = bytes(range(256)) * (3 * MAX_SPLITTABLE_OUTPUT_SIZE // 256) # three parts
+    rollup = HexRollup()
+    Context.set_context(rollup, None, "bench", extended_params=QuerySplittable(part=1))
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    if variant == "legacy":
+        legacy_send(body, 1, rollup)
+    else:
+        _send_report_body(body, "bytes", Setting.get_config("bench"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss
+    assert rollup.sent == 2 * (MAX_SPLITTABLE_OUTPUT_SIZE + 1) + 2 * ceil((MAX_SPLITTABLE_OUTPUT_SIZE + 1) / MAX_OUTPUT_SIZE)
+    print(f"{peak} {rss * 1024}")
+
+
+def main():
+    rows = []
+    for variant in ("legacy", "memoryview"):
+        out = subprocess.run([sys.executable, __file__, variant], check=True, capture_output=True, text=True).stdout
+        peak, rss = (int(v) for v in out.split())
+        rows.append([variant, f"{peak / 2**20:.2f} MiB", f"{rss / 2**20:.2f} MiB", f"{peak / MAX_SPLITTABLE_OUTPUT_SIZE:.2f}x"])
+    print_table(f"Emitting a {MAX_SPLITTABLE_OUTPUT_SIZE / 2**20:.2f} MiB report part",
+                ["chunk loop", "tracemalloc peak", "peak RSS growth", "peak / part size"], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        main()
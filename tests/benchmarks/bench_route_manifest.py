@@ -0,0 +1,136 @@
+"""Route registration time of the example apps with and without the route
+manifest written by ``cartesapp build`` (apps enabling the ROUTE_MANIFEST setting).
+
+Runs in each example app directory (in a fresh interpreter): imports the app
+modules (settings and FILES), writes the manifest, then times the query and
+mutation registration of ``setup_manager`` reflecting over the handlers and
+loading the routes from the manifest. The app imports themselves are the same in
+both cases and are reported separately. Apps whose imports are not installed
+here (cartesapplib for the wallet/ledger examples) are skipped. A synthetic app
+with SYNTHETIC_ROUTES mutations and queries shows how both scale with the routes.
+"""
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from cartesi import URLRouter, JSONRouter
+
+from cartesapp.manager import Manager, fix_imports
+from cartesapp.manifest import app_files_hash, build_route_manifest, load_route_manifest, save_route_manifest
+from cartesapp.router import MutationRouter
+from cartesapp.setting import Setting
+from cartesapp.utils import get_modules
+
+from _bench import fmt_time, print_table
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "examples")
+REPEAT = 200
+SYNTHETIC_ROUTES = 100
+
+SYNTHETIC_FILE = '''from pydantic import BaseModel
+from cartesi.abi import UInt256, String, Address
+from cartesapp.input import mutation, query
+
+class Payload(BaseModel):
+    amount: UInt256
+    memo: String
+    receiver: Address
+
+class QueryPayload(BaseModel):
+    user: str
+'''
+
+SYNTHETIC_ROUTE = '''
+@mutation()
+def mutation_{i}(payload: Payload) -> bool:
+    return True
+
+@query(splittable_output={split})
+def query_{i}(payload: QueryPayload) -> bool:
+    return True
+'''
+
+
+def write_synthetic_app(path: str):
+    os.makedirs(os.path.join(path, "synthetic"))
+    with open(os.path.join(path, "synthetic", "settings.py"), "w") as f:
+        f.write("FILES = ['routes']\n")
+    with open(os.path.join(path, "synthetic", "routes.py"), "w") as f:
+        f.write(SYNTHETIC_FILE + "".join(SYNTHETIC_ROUTE.format(i=i, split=i % 2 == 0) for i in range(SYNTHETIC_ROUTES)))
+
+
+def import_app() -> float:
+    start = time.perf_counter()
+    fix_imports()
+    for module_name in get_modules():
+        try:
+            stg = importlib.import_module(f"{module_name}.settings")
+        except ModuleNotFoundError:
+            continue
+        Setting.add(stg)
+        for f in stg.FILES:
+            importlib.import_module(f"{module_name}.{f}")
+    return time.perf_counter() - start
+
+
+def register() -> float:
+    best = None
+    for _ in range(REPEAT):
+        Manager.mutations_info = {}
+        Manager.queries_info = {}
+        Manager.abi_router = MutationRouter()
+        Manager.url_router = URLRouter()
+        Manager.json_router = JSONRouter()
+        start = time.perf_counter()
+        Manager._register_queries()
+        Manager._register_mutations()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    import_time = import_app()
+    Manager._register_queries(False)
+    Manager._register_mutations(False)
+    n_routes = len(Manager.queries_info) + len(Manager.mutations_info)
+    with tempfile.TemporaryDirectory() as path:
+        manifest_file = os.path.join(path, "routes.json")
+        save_route_manifest(build_route_manifest(Manager.mutations_info, Manager.queries_info, app_files_hash()), manifest_file)
+        reflected = register()
+        start = time.perf_counter()
+        Manager.route_manifest = load_route_manifest(manifest_file)
+        load_time = time.perf_counter() - start
+        assert Manager.route_manifest is not None
+        manifest = register()
+    print(f"{n_routes}|{import_time}|{reflected}|{load_time}|{manifest}")
+
+
+def main():
+    rows = []
+    synthetic_dir = tempfile.TemporaryDirectory()
+    write_synthetic_app(synthetic_dir.name)
+    apps = [(app, os.path.join(EXAMPLES, app)) for app in sorted(os.listdir(EXAMPLES))]
+    apps.append((f"synthetic ({SYNTHETIC_ROUTES} + {SYNTHETIC_ROUTES})", synthetic_dir.name))
+    for app, cwd in apps:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.abspath(__file__))] + sys.path))
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "run"], cwd=cwd, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            rows.append([app, "-", "-", "-", "-", "skipped (imports)"])
+            continue
+        n_routes, import_time, reflected, load_time, manifest = result.stdout.splitlines()[-1].split("|")
+        reflected, load_time, manifest = float(reflected), float(load_time), float(manifest)
+        rows.append([app, n_routes, fmt_time(float(import_time)), fmt_time(reflected),
+                     f"{fmt_time(manifest)} (+{fmt_time(load_time)} load)", f"{reflected / (manifest + load_time):.2f}x"])
+    synthetic_dir.cleanup()
+    print_table("Route registration on boot", ["app", "routes", "app imports", "reflection", "manifest", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run()
+    else:
+        main()
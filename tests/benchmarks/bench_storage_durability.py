@@ -0,0 +1,89 @@
+"""Advances per second under each STORAGE_DURABILITY mode.
+
+Every advance runs a mutation that inserts one row in a file-backed database and
+commits it through ``_make_mut`` (so the mode's sync runs after each commit).
+Each mode runs in a fresh interpreter with its own database directory, since
+Pony binds the database only once per process.
+"""
+import subprocess
+import sys
+import tempfile
+import time
+
+from pydantic import BaseModel
+
+from cartesi import abi
+from cartesi.models import RollupData, RollupMetadata
+
+from cartesapp.input import _make_mut
+from cartesapp.storage import Entity, Storage, helpers, DURABILITY_MODES
+from cartesapp.utils import bytes2hex
+
+from _bench import print_table
+
+ADVANCES = 500
+SYNC_INPUTS = 100
+
+
+class Row(Entity):
+    id = helpers.PrimaryKey(int)
+    value = helpers.Required(str)
+
+
+class Payload(BaseModel):
+    id: abi.UInt256
+    value: abi.String
+
+
+def insert_row(payload: Payload):
+    Row(id=payload.id, value=payload.value)
+    return True
+
+
+class NullRollup:
+    def report(self, payload): pass
+    def notice(self, payload): pass
+    def voucher(self, payload): pass
+
+
+def advance_data(i: int) -> RollupData:
+    metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender="0x" + "cd" * 20,
+                              input_index=i, block_number=1, block_timestamp=1, prev_randao="0x0")
+    payload = bytes2hex(abi.encode_model(Payload(id=i, value=f"row {i}")))
+    return RollupData(metadata=metadata, payload=payload)
+
+
+def run(mode: str):
+    with tempfile.TemporaryDirectory() as path:
+        Storage.STORAGE_PATH = path
+        Storage.STORAGE_DURABILITY = mode
+        Storage.STORAGE_SYNC_INPUTS = SYNC_INPUTS
+        Storage.initialize_storage()
+        handler = _make_mut(insert_row, Payload, True, "bench")
+        rollup = NullRollup()
+        requests = [advance_data(i) for i in range(ADVANCES)]
+        start = time.perf_counter()
+        for data in requests:
+            assert handler(rollup, data)
+        Storage.flush()
+        elapsed = time.perf_counter() - start
+    print(f"{elapsed}")
+
+
+def main():
+    rows = []
+    base = None
+    for mode in DURABILITY_MODES:
+        out = subprocess.run([sys.executable, __file__, mode], check=True, capture_output=True, text=True).stdout
+        rate = ADVANCES / float(out.split()[-1])
+        base = base or rate
+        rows.append([mode, f"{rate:.0f}", f"{rate / base:.2f}x"])
+    print_table(f"{ADVANCES} committing advances (deferred: sync every {SYNC_INPUTS} inputs)",
+                ["durability", "advances/s", "vs strict"], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        main()
@@ -0,0 +1,111 @@
+"""Example app workloads under each STORAGE_PROFILE.
+
+Runs the mutation/query mix of the example apps against a file-backed database:
+
+- count_app: ``echo_and_update_count`` advances from a few senders, with one of
+  the ``messages`` / ``message_counts`` / ``messages_and_users`` inspects every
+  QUERY_EVERY advances (over the growing tables)
+- echo_app: ``echo_mutation`` advances and ``echo_query`` inspects (no entities:
+  the cost of the empty commits)
+
+Each (app, profile) pair runs in a fresh interpreter with its own database
+directory, since Pony binds the database only once per process.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from cartesi import URLParameters, abi
+from cartesi.models import RollupData, RollupMetadata
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "examples")
+sys.path.insert(0, os.path.join(EXAMPLES, "count_app"))
+sys.path.insert(0, os.path.join(EXAMPLES, "echo_app"))
+
+from cartesapp.input import _make_mut, _make_url_query
+from cartesapp.storage import Storage, STORAGE_PROFILES
+from cartesapp.utils import bytes2hex
+
+from _bench import print_table
+
+ADVANCES = 1000
+QUERY_EVERY = 4
+SENDERS = [f"{i:#042x}" for i in range(1, 21)]
+
+
+class NullRollup:
+    def report(self, payload): pass
+    def notice(self, payload): pass
+    def voucher(self, payload): pass
+
+
+def advance_data(i: int, payload: bytes) -> RollupData:
+    metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender=SENDERS[i % len(SENDERS)],
+                              input_index=i, block_number=1, block_timestamp=i, prev_randao="0x0")
+    return RollupData(metadata=metadata, payload=bytes2hex(payload))
+
+
+def count_app_mix():
+    from url_app.messages import echo_and_update_count, messages, Payload, MessagesQueryPayload
+    from json_app.count import message_counts
+    from jsonrpc_app.extended_messages import messages_and_users
+    mutation = _make_mut(echo_and_update_count, Payload, True, "url_app")
+    queries = [
+        (_make_url_query(messages, MessagesQueryPayload, True, "url_app"), lambda i: {"user_address": [SENDERS[i % len(SENDERS)]]}),
+        (_make_url_query(message_counts, MessagesQueryPayload, True, "json_app"), lambda i: {"user_address": [SENDERS[i % len(SENDERS)]]}),
+        (_make_url_query(messages_and_users, MessagesQueryPayload, True, "jsonrpc_app"), lambda i: {"user_address": [SENDERS[i % len(SENDERS)]]}),
+    ]
+    advances = [advance_data(i, abi.encode_model(Payload(message=f"message {i}"))) for i in range(ADVANCES)]
+    return mutation, advances, queries
+
+
+def echo_app_mix():
+    from echo.echo import echo_mutation, echo_query, Payload, QueryPayload
+    mutation = _make_mut(echo_mutation, Payload, True, "echo")
+    queries = [(_make_url_query(echo_query, QueryPayload, True, "echo"), lambda i: {"message": ["0x" + f"{i:08x}"]})]
+    advances = [advance_data(i, abi.encode_model(Payload(message=i.to_bytes(8, "big")))) for i in range(ADVANCES)]
+    return mutation, advances, queries
+
+
+MIXES = {"count_app": count_app_mix, "echo_app": echo_app_mix}
+
+
+def run(app: str, profile: str):
+    with tempfile.TemporaryDirectory() as path:
+        mutation, advances, queries = MIXES[app]()
+        Storage.STORAGE_PATH = path
+        Storage.STORAGE_PROFILE = profile
+        Storage.initialize_storage()
+        rollup = NullRollup()
+        n_queries = 0
+        start = time.perf_counter()
+        for i, data in enumerate(advances):
+            assert mutation(rollup, data)
+            if i % QUERY_EVERY == QUERY_EVERY - 1:
+                query, params = queries[n_queries % len(queries)]
+                assert query(rollup, URLParameters(path_params={}, query_params=params(i)))
+                n_queries += 1
+        elapsed = time.perf_counter() - start
+    print(f"{elapsed}")
+
+
+def main():
+    rows = []
+    for app in MIXES:
+        base = None
+        for profile in STORAGE_PROFILES:
+            out = subprocess.run([sys.executable, __file__, app, profile], check=True, capture_output=True, text=True).stdout
+            elapsed = float(out.split()[-1])
+            base = base or elapsed
+            rows.append([app, profile, f"{ADVANCES / elapsed:.0f}", f"{base / elapsed:.2f}x"])
+    print_table(f"{ADVANCES} advances with an inspect every {QUERY_EVERY} (durability strict)",
+                ["app", "profile", "advances/s", "vs default"], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,101 @@
+"""First input latency of count_app with and without a @warmup function.
+
+Pony translates a query to sql the first time its code runs, so the first
+advance and inspects after a boot (or a snapshot restore) are slower than the
+next ones. The warm-up variant registers a @warmup that calls the count_app
+mutation and queries once (rolled back, outputs dropped) before the first input.
+Each variant runs in a fresh interpreter with its own database directory.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from cartesi import URLParameters, abi
+from cartesi.models import RollupData, RollupMetadata
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "examples")
+sys.path.insert(0, os.path.join(EXAMPLES, "count_app"))
+
+from cartesapp.input import _make_mut, _make_url_query
+from cartesapp.manager import Manager
+from cartesapp.setup import warmup
+from cartesapp.storage import Storage
+from cartesapp.utils import bytes2hex
+
+from _bench import fmt_time, print_table
+
+SENDER = f"{1:#042x}"
+VARIANTS = ("cold", "warm-up")
+
+
+class NullRollup:
+    def report(self, payload): pass
+    def notice(self, payload): pass
+    def voucher(self, payload): pass
+
+
+def advance_data(i: int, payload: bytes) -> RollupData:
+    metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender=SENDER,
+                              input_index=i, block_number=1, block_timestamp=i, prev_randao="0x0")
+    return RollupData(metadata=metadata, payload=bytes2hex(payload))
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    assert func(*args)
+    return time.perf_counter() - start
+
+
+def run(variant: str):
+    from url_app.messages import echo_and_update_count, messages, Payload, MessagesQueryPayload
+    from json_app.count import message_counts
+    from jsonrpc_app.extended_messages import messages_and_users
+    with tempfile.TemporaryDirectory() as path:
+        Storage.STORAGE_PATH = path
+        Storage.initialize_storage()
+        if variant == "warm-up":
+            def warm_count_app():
+                echo_and_update_count(Payload(message="warm-up"))
+                for query in (messages, message_counts, messages_and_users):
+                    query(MessagesQueryPayload(user_address=SENDER))
+            warm_count_app.__module__ = "url_app.warmup" # as if defined in the app
+            warmup()(warm_count_app)
+            Manager._run_warmup_functions()
+        rollup = NullRollup()
+        mutation = _make_mut(echo_and_update_count, Payload, True, "url_app")
+        params = URLParameters(path_params={}, query_params={"user_address": [SENDER]})
+        inputs = [
+            ("advance echo_and_update_count", mutation, advance_data(0, abi.encode_model(Payload(message="first")))),
+            ("inspect messages", _make_url_query(messages, MessagesQueryPayload, True, "url_app"), params),
+            ("inspect message_counts", _make_url_query(message_counts, MessagesQueryPayload, True, "json_app"), params),
+            ("inspect messages_and_users", _make_url_query(messages_and_users, MessagesQueryPayload, True, "jsonrpc_app"), params),
+        ]
+        for name, handler, data in inputs:
+            first = timed(handler, rollup, data)
+            if handler is mutation:
+                data = advance_data(1, abi.encode_model(Payload(message="second")))
+            second = timed(handler, rollup, data)
+            print(f"{name}|{first}|{second}")
+
+
+def main():
+    times = {}
+    for variant in VARIANTS:
+        out = subprocess.run([sys.executable, __file__, variant], check=True, capture_output=True, text=True).stdout
+        for line in out.splitlines():
+            name, first, second = line.split("|")
+            times.setdefault(name, {})[variant] = (float(first), float(second))
+    rows = []
+    for name, t in times.items():
+        rows.append([name, fmt_time(t["cold"][0]), fmt_time(t["warm-up"][0]), fmt_time(t["cold"][1]),
+                     f"{t['cold'][0] / t['warm-up'][0]:.2f}x"])
+    print_table("count_app first input latency", ["input", "first (cold)", "first (warm-up)", "second (cold)", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        main()
@@ -9,9 +9,12 @@ populated as import side effects, so state leaks between successive
 ``setup_manager``/registration calls. ``Manager.reset()`` is invoked before
 every test to guarantee isolation.
 """
+import importlib
+
 import pytest
 
 from cartesapp.manager import Manager
+from cartesapp.storage import Storage
 
 
 @pytest.fixture(autouse=True)
@@ -19,3 +22,14 @@ def reset_framework_state():
     Manager.reset()
     yield
     Manager.reset()
+
+
+@pytest.fixture(scope="session")
+def storage():
+    """In-memory sqlite bound once per session (Pony can only bind/map once).
+
+    Framework entities defined outside the storage module (input chunks) must
+    exist before the mapping is generated, whichever test module binds first."""
+    importlib.import_module("cartesapp.chunk")
+    Storage.initialize_storage()  # in-memory sqlite + generate_mapping
+    yield Storage.db
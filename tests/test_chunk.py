@@ -0,0 +1,171 @@
+"""Tests for chunked mutation inputs (cartesapp.chunk and the ``chunk`` option).
+
+Chunks are stored in the session-bound in-memory database; the mutation wrapper
+is driven with a fake rollup as in the lifecycle tests.
+"""
+import pytest
+from pydantic import BaseModel
+
+from cartesi import abi
+from cartesi.models import RollupMetadata, RollupData
+
+from cartesapp.chunk import (
+    InputChunk, InputChunkUpload, InputChunkPart,
+    add_input_chunk, split_payload, get_chunk_configs,
+)
+from cartesapp.input import Mutation, _make_mut, encode_advance_input, encode_chunked_advance_input
+from cartesapp.storage import helpers
+from cartesapp.utils import hex2bytes
+
+
+MODULE = "chunked"
+SENDER = "0x" + "cd" * 20
+
+
+class Upload(BaseModel):
+    name: abi.String
+    data: abi.Bytes
+
+
+class FakeRollup:
+    def __init__(self):
+        self.reports = []
+
+    def report(self, payload):
+        self.reports.append(payload)
+
+
+def make_metadata(timestamp=1000, msg_sender=SENDER):
+    return RollupMetadata(
+        chain_id=1,
+        app_contract="0x" + "ab" * 20,
+        msg_sender=msg_sender,
+        input_index=0,
+        block_number=1,
+        block_timestamp=timestamp,
+        prev_randao="0x0",
+    )
+
+
+def configs(**overrides):
+    return get_chunk_configs(overrides or True)
+
+
+def count_uploads():
+    with helpers.db_session:
+        return helpers.count(u for u in InputChunkUpload), helpers.count(p for p in InputChunkPart)
+
+
+class TestChunkConfigs:
+    def test_defaults_and_overrides(self):
+        assert get_chunk_configs(True)["max_parts"] > 0
+        assert get_chunk_configs({"ttl": 5})["ttl"] == 5
+
+    def test_invalid_configs(self):
+        with pytest.raises(Exception, match="Invalid chunk configs"):
+            get_chunk_configs({"bogus": 1})
+        with pytest.raises(Exception, match="must be True"):
+            get_chunk_configs("yes")
+
+
+class TestSplitPayload:
+    def test_split_and_decode(self):
+        chunks = split_payload(b"abcdefghij", 4, upload_id=7)
+        decoded = [abi.decode_to_model(data=c, model=InputChunk) for c in chunks]
+        assert [c.index for c in decoded] == [0, 1, 2]
+        assert all(c.total == 3 and c.upload_id == 7 for c in decoded)
+        assert b"".join(c.data for c in decoded) == b"abcdefghij"
+
+    def test_empty_payload_is_single_chunk(self):
+        assert len(split_payload(b"", 4)) == 1
+
+
+class TestAddInputChunk:
+    def test_reassembles_out_of_order(self, storage):
+        chunks = split_payload(b"0123456789", 3, upload_id=1)
+        with helpers.db_session:
+            results = [add_input_chunk("m.f", SENDER, 10, c, configs()) for c in (chunks[2], chunks[0], chunks[3])]
+            assert results == [None, None, None]
+            assert add_input_chunk("m.f", SENDER, 11, chunks[1], configs()) == b"0123456789"
+        assert count_uploads() == (0, 0)
+
+    def test_uploads_are_keyed_by_sender(self, storage):
+        chunks = split_payload(b"abcd", 2, upload_id=2)
+        with helpers.db_session:
+            assert add_input_chunk("m.f", SENDER, 10, chunks[0], configs()) is None
+            assert add_input_chunk("m.f", "0x" + "ee" * 20, 10, chunks[1], configs()) is None
+            helpers.rollback()
+
+    def test_duplicate_chunk_raises(self, storage):
+        chunks = split_payload(b"abcd", 2, upload_id=3)
+        with helpers.db_session:
+            add_input_chunk("m.f", SENDER, 10, chunks[0], configs())
+            with pytest.raises(Exception, match="Duplicate chunk"):
+                add_input_chunk("m.f", SENDER, 10, chunks[0], configs())
+            helpers.rollback()
+
+    def test_limits(self, storage):
+        with helpers.db_session:
+            with pytest.raises(Exception, match="Invalid number of chunks"):
+                add_input_chunk("m.f", SENDER, 10, split_payload(b"abcd", 1, upload_id=4)[0], configs(max_parts=2))
+            with pytest.raises(Exception, match="exceeds maximum size"):
+                add_input_chunk("m.f", SENDER, 10, split_payload(b"abcd", 2, upload_id=5)[0], configs(max_size=1))
+            helpers.rollback()
+
+    def test_partial_uploads_expire(self, storage):
+        chunks = split_payload(b"abcd", 2, upload_id=6)
+        with helpers.db_session:
+            add_input_chunk("m.f", SENDER, 100, chunks[0], configs(ttl=50))
+            helpers.commit()
+            other = split_payload(b"xy", 4, upload_id=8)[0]
+            assert add_input_chunk("m.f", SENDER, 200, other, configs(ttl=50)) == b"xy"
+            # the expired upload is gone: its second chunk starts a new upload
+            assert add_input_chunk("m.f", SENDER, 200, chunks[1], configs(ttl=50)) is None
+            helpers.commit()
+            add_input_chunk("m.f", SENDER, 300, split_payload(b"z", 4, upload_id=9)[0], configs(ttl=50))
+        assert count_uploads() == (0, 0)
+
+
+received = []
+
+
+def upload_handler(payload: Upload):
+    received.append(payload)
+    return True
+
+
+upload_handler.__module__ = f"{MODULE}.file"
+
+
+class TestChunkedMutation:
+    @pytest.fixture(autouse=True)
+    def register(self):
+        Mutation.add(upload_handler, chunk=True)
+
+    def test_handler_runs_once_on_last_chunk(self, storage):
+        received.clear()
+        handler = _make_mut(upload_handler, Upload, True, MODULE, has_header=True, chunk=configs())
+        payload = Upload(name="replay", data=b"\x01" * 100)
+        inputs = encode_chunked_advance_input(upload_handler, payload, chunk_size=40)
+        assert len(inputs) > 1
+        rollup = FakeRollup()
+        results = [handler(rollup, RollupData(metadata=make_metadata(), payload=i)) for i in inputs]
+        assert all(results)
+        assert received == [payload]
+        assert count_uploads() == (0, 0)
+
+    def test_single_chunk_encoding(self, storage):
+        received.clear()
+        handler = _make_mut(upload_handler, Upload, True, MODULE, has_header=True, chunk=configs())
+        payload = Upload(name="small", data=b"\x02")
+        hex_input = encode_advance_input(upload_handler, payload)
+        assert handler(FakeRollup(), RollupData(metadata=make_metadata(), payload=hex_input))
+        assert received == [payload]
+        assert hex2bytes(hex_input)[:4] == hex2bytes(encode_chunked_advance_input(upload_handler, payload)[0])[:4]
+
+    def test_not_chunked_mutation_cant_split(self):
+        def plain(payload: Upload): return True
+        plain.__module__ = f"{MODULE}.file"
+        Mutation.add(plain)
+        with pytest.raises(Exception, match="not chunked"):
+            encode_chunked_advance_input(plain, Upload(name="a", data=b""))
@@ -0,0 +1,123 @@
+"""Tests for the per-model ABI codecs (cartesapp.codec): byte-for-byte parity
+with the generic abi.encode_model/abi.decode_to_model path, strict decoding and
+the generic fallback."""
+import random
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from cartesi import abi
+
+from cartesapp.codec import ModelCodec, Codec, encode_model, decode_to_model
+from cartesapp.manager import Manager
+from cartesapp.router import MutationRouter
+from cartesapp.input import Mutation
+from cartesapp.output import Output
+
+
+class AllTypes(BaseModel):
+    amount: abi.UInt256
+    owner: abi.Address
+    data: abi.Bytes
+    name: abi.String
+    flag: abi.Bool
+    delta: abi.Int8
+    tag: abi.Bytes4
+    count: abi.UInt32
+    digest: abi.Bytes32
+
+
+class WithList(BaseModel):
+    values: List[abi.UInt256]
+
+
+def random_sample(rng):
+    return AllTypes(
+        amount=rng.getrandbits(256),
+        owner="0x" + rng.randbytes(20).hex(),
+        data=rng.randbytes(rng.randint(0, 80)),
+        name="é" * rng.randint(0, 40),
+        flag=rng.random() < .5,
+        delta=rng.randint(-128, 127),
+        tag=rng.randbytes(rng.randint(0, 4)),
+        count=rng.getrandbits(32),
+        digest=rng.randbytes(32),
+    )
+
+
+class TestModelCodec:
+    def test_parity_with_generic_path(self):
+        codec = ModelCodec(AllTypes)
+        rng = random.Random(1)
+        for _ in range(200):
+            sample = random_sample(rng)
+            data = abi.encode_model(sample)
+            assert codec.encode(sample) == data
+            assert codec.decode(data) == abi.decode_to_model(data=data, model=AllTypes)
+
+    def test_malformed_data_is_rejected_like_generic_path(self):
+        codec = ModelCodec(AllTypes)
+        rng = random.Random(2)
+        data = abi.encode_model(random_sample(rng))
+        for _ in range(300):
+            corrupted = bytearray(data)
+            corrupted[rng.randrange(len(corrupted))] = rng.randrange(256)
+            corrupted = bytes(corrupted[:rng.randint(0, len(corrupted))]) if rng.random() < .3 else bytes(corrupted)
+            try:
+                expected = abi.decode_to_model(data=corrupted, model=AllTypes)
+            except Exception:
+                expected = None
+            if expected is None:
+                with pytest.raises(Exception):
+                    codec.decode(corrupted)
+            else:
+                assert codec.decode(corrupted) == expected
+
+    def test_out_of_bounds_values_raise(self):
+        class Small(BaseModel):
+            value: abi.UInt8
+        with pytest.raises(Exception, match="out of bounds"):
+            ModelCodec(Small).encode(Small(value=256))
+
+    def test_unsupported_types_raise(self):
+        with pytest.raises(Exception, match="Unsupported abi type"):
+            ModelCodec(WithList)
+
+
+class TestCodecRegistry:
+    def test_add_caches_and_falls_back(self):
+        assert Codec.add(AllTypes) is Codec.add(AllTypes)
+        assert Codec.add(WithList) is None
+        sample = WithList(values=[1, 2])
+        data = encode_model(sample)
+        assert data == abi.encode_model(sample)
+        assert decode_to_model(data, WithList) == sample
+
+    def test_helpers_use_registered_codec(self, monkeypatch):
+        Codec.add(AllTypes)
+        sample = random_sample(random.Random(3))
+        data = abi.encode_model(sample)
+        expected = abi.decode_to_model(data=data, model=AllTypes)
+        monkeypatch.setattr(abi, "encode_model", lambda *a, **k: pytest.fail("generic encode used"))
+        monkeypatch.setattr(abi, "decode_to_model", lambda *a, **k: pytest.fail("generic decode used"))
+        assert encode_model(sample) == data
+        assert decode_to_model(data, AllTypes) == expected
+
+    def test_packed_uses_generic_path(self):
+        Codec.add(AllTypes)
+        sample = random_sample(random.Random(4))
+        assert encode_model(sample, True) == abi.encode_model(sample, True)
+
+    def test_manager_registers_mutation_and_output_models(self):
+        def fn(payload: AllTypes): return True
+        fn.__module__ = "codecs.file"
+        Mutation.add(fn)
+        class ListVoucher(WithList): pass
+        ListVoucher.__module__ = "codecs.file"
+        Output.add_voucher(ListVoucher)
+        Manager.abi_router = MutationRouter()
+        Manager._register_mutations(True)
+        Manager._register_codecs()
+        assert isinstance(Codec.codecs[AllTypes], ModelCodec)
+        assert Codec.codecs[ListVoucher] is None
@@ -0,0 +1,110 @@
+"""Tests for the columnar report format (cartesapp.columnar and
+``REPORT_FORMAT = 'columnar'``)."""
+import json
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+from cartesapp.columnar import encode_columnar, decode_columnar, is_columnar, COLUMN_TYPES
+from cartesapp.output import normalize_output, normalize_jsonrpc_body
+from cartesapp.utils import OutputFormat, hex2bytes
+
+
+class ExtendedMessage(BaseModel):
+    index:          int
+    message:        str
+    user:           str
+    created_at:     int
+
+
+class ExtendedMessages(BaseModel):
+    data:   List[ExtendedMessage]
+    total:  int
+
+ExtendedMessages.__module__ = "jsonrpc_app.extended_messages"
+
+
+class Row(BaseModel):
+    big:    int
+    ratio:  float
+    flag:   bool
+    note:   Optional[str] = None
+    tags:   List[str] = []
+
+
+class Table(BaseModel):
+    rows:   List[Row]
+    empty:  List[Row] = []
+    title:  str
+
+
+def make_messages(n):
+    return ExtendedMessages(
+        data=[ExtendedMessage(index=i, message=f"message {i}", user=f"0x{i % 7:040x}", created_at=1700000000 + i) for i in range(n)],
+        total=n,
+    )
+
+
+def as_json(model):
+    return json.loads(model.json(exclude_unset=True, exclude_none=True))
+
+
+class TestColumnar:
+    def test_roundtrip_matches_json(self):
+        messages = make_messages(300)
+        data = encode_columnar(messages)
+        assert is_columnar(data)
+        assert decode_columnar(data) == as_json(messages)
+        assert len(data) < len(messages.json()) / 2
+
+    def test_column_types(self):
+        table = Table(title="t", rows=[
+            Row(big=2**40, ratio=.5, flag=True, tags=["a"]),
+            Row(big=-2**40, ratio=1.5, flag=False, note="n"),
+        ])
+        data = encode_columnar(table)
+        for column, column_type in (("big", "int64"), ("ratio", "float64"), ("flag", "bool"), ("note", "json"), ("tags", "json")):
+            assert column.encode() + bytes([COLUMN_TYPES[column_type]]) in data
+        decoded = decode_columnar(data)
+        assert decoded["rows"] == [
+            {"big": 2**40, "ratio": .5, "flag": True, "tags": ["a"]},
+            {"big": -2**40, "ratio": 1.5, "flag": False, "note": "n", "tags": []},
+        ]
+        assert decoded["title"] == "t"
+        assert "empty" not in decoded # not set
+
+    def test_values_out_of_int64_range(self):
+        table = Table(title="t", rows=[Row(big=2**70, ratio=0., flag=True)])
+        assert decode_columnar(encode_columnar(table))["rows"][0]["big"] == 2**70
+
+    def test_string_index_width(self):
+        messages = make_messages(70000) # more than 2**16 distinct messages
+        data = encode_columnar(messages)
+        assert decode_columnar(data)["data"][-1] == as_json(messages)["data"][-1]
+
+    def test_fixed_width_columns_are_aligned(self):
+        data = encode_columnar(make_messages(3))
+        offset = data.index(b"created_at") + len(b"created_at") + 1
+        offset += -offset % 4
+        assert int.from_bytes(data[offset:offset + 4], 'little') == 1700000000
+
+    def test_invalid_data(self):
+        with pytest.raises(Exception, match="Invalid columnar output"):
+            decode_columnar(b'{"total": 1}')
+
+
+class TestColumnarOutputFormat:
+    def test_normalize_output(self):
+        messages = make_messages(5)
+        body, class_name = normalize_output(messages, OutputFormat.columnar)
+        assert body == encode_columnar(messages)
+        assert class_name.endswith(".ExtendedMessages")
+        # plain data is still sent as json
+        assert json.loads(normalize_output([1, 2], OutputFormat.columnar)[0]) == [1, 2]
+
+    def test_jsonrpc_result(self):
+        messages = make_messages(5)
+        body, _ = normalize_jsonrpc_body(messages, OutputFormat.columnar)
+        result = json.loads(body)["result"]
+        assert decode_columnar(hex2bytes(result[2:])) == as_json(messages)
@@ -0,0 +1,214 @@
+"""Tests for compressed mutation payloads (cartesapp.compression and the
+``compress`` option of ``@mutation``) and compressed output formats."""
+import json
+import zlib
+from random import Random
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from cartesi import abi
+
+from cartesapp.compression import (
+    get_compress_configs, compress_payload, decompress_payload, zstd_available, COMPRESSION_FLAGS,
+    compress_output, decompress_output, is_compressed_output,
+)
+from cartesapp.input import Mutation, _decode_advance_payload, encode_advance_input, encode_chunked_advance_input
+from cartesapp.utils import hex2bytes, OutputFormat
+from cartesapp.columnar import decode_columnar
+from cartesapp.context import Context
+from cartesapp.output import normalize_output, normalize_jsonrpc_body, send_report
+from cartesapp.setting import Setting
+from cartesapp import output
+
+
+def random_bytes(n: int) -> bytes:
+    return Random(0).randbytes(n)
+
+
+class Batch(BaseModel):
+    name: abi.String
+    data: abi.Bytes
+
+
+class TestCompressConfigs:
+    def test_defaults(self):
+        assert get_compress_configs(True)["algorithm"] == "deflate"
+        assert get_compress_configs({"max_size": 10})["max_size"] == 10
+
+    def test_invalid(self):
+        with pytest.raises(Exception, match="Invalid compression algorithm"):
+            get_compress_configs("lz4")
+        with pytest.raises(Exception, match="Invalid compress configs"):
+            get_compress_configs({"bogus": 1})
+        with pytest.raises(Exception, match="must be True"):
+            get_compress_configs(1)
+
+
+class TestCompressPayload:
+    def test_deflate_roundtrip(self):
+        data = b"cartesi " * 1000
+        compressed = compress_payload(data, get_compress_configs(True))
+        assert compressed[0] == COMPRESSION_FLAGS["deflate"]
+        assert len(compressed) < len(data)
+        assert decompress_payload(compressed, get_compress_configs(True)) == data
+
+    def test_incompressible_payload_is_sent_raw(self):
+        data = bytes(range(16))
+        compressed = compress_payload(data, get_compress_configs(True))
+        assert compressed == bytes([COMPRESSION_FLAGS["none"]]) + data
+        assert decompress_payload(compressed, get_compress_configs(True)) == data
+
+    @pytest.mark.skipif(not zstd_available(), reason="zstd not available")
+    def test_zstd_roundtrip(self):
+        data = b"cartesi " * 1000
+        configs = get_compress_configs("zstd")
+        compressed = compress_payload(data, configs)
+        assert compressed[0] == COMPRESSION_FLAGS["zstd"]
+        assert decompress_payload(compressed, configs) == data
+
+    def test_decompression_bomb_is_capped(self):
+        bomb = bytes([COMPRESSION_FLAGS["deflate"]]) + zlib.compress(b"\0" * (4 * 1024 * 1024), 9)
+        with pytest.raises(Exception, match="exceeds maximum size"):
+            decompress_payload(bomb, get_compress_configs({"max_size": 1024 * 1024}))
+
+    def test_raw_payload_is_capped(self):
+        with pytest.raises(Exception, match="exceeds maximum size"):
+            decompress_payload(b"\0" + b"a" * 11, get_compress_configs({"max_size": 10}))
+
+    def test_large_payload_roundtrip(self):
+        # incompressible part spans many input blocks
+        data = bytes(range(256)) * 4096 + random_bytes(2 * 1024 * 1024)
+        configs = get_compress_configs({"max_size": 4 * 1024 * 1024})
+        assert decompress_payload(compress_payload(data, configs), configs) == data
+
+    def test_trailing_data_is_rejected(self):
+        compressed = compress_payload(b"cartesi " * 1000, get_compress_configs(True))
+        with pytest.raises(Exception, match="Unexpected data"):
+            decompress_payload(compressed + b"\x00", get_compress_configs(True))
+        with pytest.raises(Exception, match="Unexpected data"):
+            decompress_output(compress_output(b"cartesi " * 1000) + b"extra")
+
+    def test_truncated_and_unknown_payloads(self):
+        compressed = compress_payload(b"cartesi " * 1000, get_compress_configs(True))
+        with pytest.raises(Exception, match="Truncated"):
+            decompress_payload(compressed[:-8], get_compress_configs(True))
+        with pytest.raises(Exception, match="Unknown compression flag"):
+            decompress_payload(b"\x09abc", get_compress_configs(True))
+        with pytest.raises(Exception, match="missing the compression flag"):
+            decompress_payload(b"", get_compress_configs(True))
+
+
+def compressed_handler(payload: Batch): return True
+compressed_handler.__module__ = "compressed.file"
+
+
+class TestCompressedMutation:
+    @pytest.fixture(autouse=True)
+    def register(self):
+        Mutation.add(compressed_handler, compress=True)
+
+    def test_encode_decode_roundtrip(self):
+        model = Batch(name="batch", data=b"\x07" * 4096)
+        payload = hex2bytes(encode_advance_input(compressed_handler, model))
+        assert len(payload) < len(abi.encode_model(model))
+        out = _decode_advance_payload(payload, Batch, True,
+            {"has_header": True, "compress": get_compress_configs(True)})
+        assert out[0] == model
+
+    def test_compress_then_chunk(self):
+        Mutation.add(compressed_handler, compress=True, chunk=True)
+        model = Batch(name="batch", data=b"\x07" * 4096)
+        inputs = encode_chunked_advance_input(compressed_handler, model, chunk_size=16)
+        # chunks carry the compressed stream, not the raw abi encoding
+        assert len(inputs) < len(abi.encode_model(model)) // 16
+
+
+class Rows(BaseModel):
+    rows:   list
+    total:  int
+
+Rows.__module__ = "sample.rows"
+
+
+class Row(BaseModel):
+    index:  int
+    name:   str
+
+
+class Table(BaseModel):
+    data:   list[Row]
+
+Table.__module__ = "sample.rows"
+
+
+def make_rows(n):
+    return Rows(rows=[{"index": i, "name": f"row {i}"} for i in range(n)], total=n)
+
+
+class TestCompressedOutputs:
+    def test_roundtrip(self):
+        body = json.dumps(list(range(1000))).encode()
+        compressed = compress_output(body)
+        assert is_compressed_output(compressed) and len(compressed) < len(body)
+        assert decompress_output(compressed) == body
+
+    def test_incompressible_output_is_sent_raw(self):
+        body = b'{"a": 1}'
+        assert compress_output(body) is body
+        assert decompress_output(body) == body
+
+    def test_decompression_is_capped(self):
+        with pytest.raises(Exception, match="exceeds maximum size"):
+            decompress_output(compress_output(bytes(100000)), max_size=1000)
+
+    def test_normalize_output(self):
+        rows = make_rows(500)
+        body, class_name = normalize_output(rows, OutputFormat.json_deflate)
+        assert decompress_output(body) == normalize_output(rows, OutputFormat.json)[0]
+        assert class_name == normalize_output(rows, OutputFormat.json)[1]
+        table = Table(data=[Row(index=i, name=f"row {i % 10}") for i in range(500)])
+        body, _ = normalize_output(table, OutputFormat.columnar_deflate)
+        assert decode_columnar(decompress_output(body)) == json.loads(table.json())
+
+    def test_jsonrpc_result(self):
+        rows = make_rows(500)
+        body, _ = normalize_jsonrpc_body(rows, OutputFormat.json_deflate)
+        result = json.loads(body)["result"]
+        assert json.loads(decompress_output(hex2bytes(result[2:]))) == json.loads(rows.json())
+        # small results stay json
+        body, _ = normalize_jsonrpc_body(make_rows(1), OutputFormat.json_deflate)
+        assert json.loads(body)["result"]["total"] == 1
+
+    def test_jsonrpc_result_is_never_larger_than_json(self):
+        # deflates to ~60%: the hex string of the compressed body would be longer
+        rng = Random(0)
+        rows = [rng.randbytes(16).hex() for _ in range(200)]
+        body, _ = normalize_jsonrpc_body(rows, OutputFormat.json_deflate)
+        assert len(compress_output(json.dumps(rows).encode())) < len(json.dumps(rows))
+        assert body == normalize_jsonrpc_body(rows, OutputFormat.json)[0]
+        table = Table(data=[Row(index=rng.getrandbits(60), name=rng.randbytes(8).hex()) for _ in range(200)])
+        body, _ = normalize_jsonrpc_body(table, OutputFormat.columnar_deflate)
+        assert len(body) <= len(normalize_jsonrpc_body(table, OutputFormat.columnar)[0])
+
+    def test_split_after_compression(self, monkeypatch):
+        class Rollup:
+            def __init__(self):
+                self.reports = []
+            def report(self, payload):
+                self.reports.append(payload)
+        monkeypatch.setattr(output, "MAX_SPLITTABLE_OUTPUT_SIZE", 100)
+        monkeypatch.setitem(Setting.settings, "sample", SimpleNamespace(REPORT_FORMAT="json_deflate"))
+        rows = make_rows(500)
+        payload = b""
+        for part in range(100):
+            rollup = Rollup()
+            Context.set_context(rollup, None, "sample", extended_params=SimpleNamespace(part=part, parts=1))
+            send_report(rows)
+            data = b"".join(hex2bytes(r[2:]) for r in rollup.reports)
+            if len(data) <= 100:
+                payload += data
+                break
+            payload += data[:-1]
+        assert json.loads(decompress_output(payload)) == json.loads(rows.json())
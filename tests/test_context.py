@@ -4,7 +4,11 @@ from pydantic import BaseModel
 
 from cartesi.models import RollupMetadata
 
+from types import SimpleNamespace
+
 from cartesapp.context import Context, get_metadata, get_rollup, get_app_contract
+from cartesapp.setting import Setting
+from cartesapp.utils import OutputFormat
 
 
 def make_metadata(**overrides):
@@ -41,6 +45,24 @@ class TestContextLifecycle:
         assert Context.module is None
         assert Context.configs is None
 
+    def test_set_context_attaches_module_config(self):
+        Setting.settings["mymod"] = SimpleNamespace(REPORT_FORMAT="abi", INDEX_OUTPUTS=True)
+        Setting.freeze(["other"])
+        Context.set_context(FakeRollup(), None, "mymod")
+        cfg = Context.module_config
+        assert cfg is Setting.configs["mymod"]
+        assert cfg.report_format == OutputFormat.abi
+        assert cfg.notice_format == OutputFormat.header_abi
+        assert cfg.index_outputs and not cfg.outputs_disabled
+        assert Setting.configs["other"].outputs_disabled
+
+        Context.set_module("m") # module without settings: defaults
+        assert Context.module_config.report_format == OutputFormat.json
+        assert not Context.module_config.index_outputs
+
+        Context.clear_context()
+        assert Context.module_config is None
+
     def test_set_input(self):
         class P(BaseModel):
             x: int
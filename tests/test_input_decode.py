@@ -13,9 +13,10 @@ from cartesi import abi, URLParameters
 from cartesi.models import RollupMetadata
 
 from cartesapp import input as cinput
+from cartesapp import storage as cstorage
 from cartesapp.input import (
     _decode_advance_payload, _decode_url_params, _decode_json_request,
-    _finalize_mutation, _finalize_query,
+    _finalize_mutation, _finalize_query, DecodePlan,
 )
 from cartesapp.context import Context
 from cartesapp.utils import InputFormat
@@ -162,12 +163,50 @@ class TestDecodeJsonRequest:
         assert fc["query_format"] == InputFormat.json
 
 
+class TestDecodePlan:
+    def test_plan_layout(self):
+        ext = create_model("UrlQuerySplittable3", part=(int, None), __base__=UrlQuery)
+        plan = DecodePlan(UrlQuery, ext, ["name"])
+        assert plan.fields == ("name", "tags")
+        assert plan.url_fields == (("name", False), ("tags", True))
+        assert plan.path_fields == ("name",)
+        assert plan.extended_fields == ("part",)
+        assert plan.extended_url_fields == (("part", False),)
+
+    def test_plan_without_route_config_checks_every_path_slot(self):
+        plan = DecodePlan(UrlQuery)
+        assert plan.path_fields == ("name", "tags")
+        assert plan.extended_fields is None
+
+    def test_url_decode_with_precomputed_plan(self):
+        ext = create_model("UrlQuerySplittable4", part=(int, None), __base__=UrlQuery)
+        func_configs = {"extended_model": ext, "decode_plan": DecodePlan(UrlQuery, ext, ["name"])}
+        params = URLParameters(path_params={"name": "p"}, query_params={"tags": ["x", "y"], "part": ["1"]})
+        out = _decode_url_params(UrlQuery, params, func_configs)
+        assert out[0].name == "p" and out[0].tags == ["x", "y"]
+        assert func_configs["extended_params"].part == 1
+
+    def test_json_decode_with_precomputed_plan(self):
+        ext = create_model("UrlQuerySplittable5", part=(int, None), __base__=UrlQuery)
+        fc = {"extended_model": ext, "decode_plan": DecodePlan(UrlQuery, ext)}
+        out = _decode_json_request(UrlQuery, True, {"method": "m", "params": ["x", ["t"], 3]}, fc)
+        assert out[0].name == "x"
+        assert fc["extended_params"].part == 3
+
+    def test_plan_for_other_model_is_ignored(self):
+        class Other(BaseModel):
+            val: str
+        fc = {"decode_plan": DecodePlan(Other)}
+        out = _decode_json_request(UrlQuery, True, {"method": "m", "params": {"name": "a"}}, fc)
+        assert out[0].name == "a"
+
+
 class TestPersistencePolicies:
     def test_mutation_commits_on_truthy(self, monkeypatch):
         calls = []
         monkeypatch.setattr(cinput.helpers, "commit", lambda: calls.append("commit"))
         monkeypatch.setattr(cinput.helpers, "rollback", lambda: calls.append("rollback"))
-        monkeypatch.setattr(cinput.os, "sync", lambda: calls.append("sync"))
+        monkeypatch.setattr(cstorage.os, "sync", lambda: calls.append("sync"))
         _finalize_mutation(True)
         assert calls == ["commit", "sync"]
 
@@ -175,7 +214,7 @@ class TestPersistencePolicies:
         calls = []
         monkeypatch.setattr(cinput.helpers, "commit", lambda: calls.append("commit"))
         monkeypatch.setattr(cinput.helpers, "rollback", lambda: calls.append("rollback"))
-        monkeypatch.setattr(cinput.os, "sync", lambda: calls.append("sync"))
+        monkeypatch.setattr(cstorage.os, "sync", lambda: calls.append("sync"))
         _finalize_mutation(False)
         assert calls == ["rollback"]
 
@@ -12,10 +12,14 @@ from pydantic import BaseModel
 from cartesi import abi, URLParameters
 from cartesi.models import RollupMetadata, RollupData
 
-from cartesapp.storage import Storage, Entity, helpers
+from types import SimpleNamespace
+
+from cartesapp.context import Context
+from cartesapp.storage import Entity, helpers
 from cartesapp.input import _make_mut, _make_url_query
-from cartesapp.output import add_output
-from cartesapp.utils import bytes2hex
+from cartesapp.output import Output, add_output, send_notice
+from cartesapp.setting import Setting
+from cartesapp.utils import bytes2hex, IOType
 
 
 MODULE = "sample"
@@ -51,12 +55,6 @@ class FakeRollup:
         self.vouchers.append(payload)
 
 
-@pytest.fixture(scope="session")
-def storage():
-    Storage.initialize_storage()  # in-memory sqlite + generate_mapping
-    yield Storage.db
-
-
 @pytest.fixture
 def rollup():
     return FakeRollup()
@@ -149,3 +147,48 @@ class TestQueryLifecycle:
         result = query(rollup, params)
         assert result is True
         assert rollup.reports[-1] == bytes2hex(b"missing")
+
+
+# --- deferred outputs ---
+
+def notify_counter(payload: CounterInput):
+    Counter(key=payload.key, value=payload.value)
+    send_notice(payload.key)
+    add_output("report")
+    assert Context.rollup.notices == [] # sent only after the commit
+    return payload.value > 0
+
+
+@pytest.fixture
+def index_calls(monkeypatch):
+    calls = []
+    monkeypatch.setitem(Setting.settings, MODULE, SimpleNamespace(INDEX_OUTPUTS=True))
+    monkeypatch.setattr(Output, "add_output_index", lambda *args, **kwargs: calls.append(args[2]))
+    return calls
+
+
+class TestDeferredOutputs:
+    def test_outputs_sent_after_commit(self, storage, rollup, index_calls):
+        handler = _make_mut(notify_counter, CounterInput, True, MODULE)
+        assert handler(rollup, advance_data(CounterInput(key="e", value=1)))
+        assert rollup.notices == [bytes2hex(b"e")]
+        assert rollup.reports == [bytes2hex(b"report")]
+        assert index_calls == [IOType.notice, IOType.report]
+        assert Context.n_outputs == 1
+
+    def test_rollback_discards_outputs_but_keeps_reports(self, storage, rollup, index_calls):
+        handler = _make_mut(notify_counter, CounterInput, True, MODULE)
+        assert not handler(rollup, advance_data(CounterInput(key="f", value=0)))
+        assert rollup.notices == []
+        assert rollup.reports == [bytes2hex(b"report")]
+        assert index_calls == []
+        assert Context.n_outputs == 0
+        assert get_counter("f") is None
+
+    def test_bulk_index_hook(self, storage, rollup, index_calls, monkeypatch):
+        bulk = []
+        monkeypatch.setattr(Output, "add_output_indexes", bulk.append)
+        handler = _make_mut(notify_counter, CounterInput, True, MODULE)
+        assert handler(rollup, advance_data(CounterInput(key="g", value=1)))
+        assert index_calls == []
+        assert [args[2] for args, _ in bulk[0]] == [IOType.notice, IOType.report]
@@ -0,0 +1,140 @@
+"""Route manifest written by the build and loaded by setup_manager."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from pydantic import BaseModel
+
+from cartesi import abi, ABIRouter, URLRouter, JSONRouter
+
+import cartesapp.manager as manager_module
+from cartesapp.manager import Manager
+from cartesapp.manifest import app_files_hash, build_route_manifest, save_route_manifest, load_route_manifest, ROUTE_MANIFEST_VERSION
+from cartesapp.input import Mutation, Query
+
+
+class MutPayload(BaseModel):
+    n: abi.UInt256
+    name: abi.String
+
+
+class QueryPayload(BaseModel):
+    name: str
+
+
+def add_handlers():
+    def deposit(payload: MutPayload): return True
+    def ping(): return True
+    def fixed(payload: MutPayload): return True
+    def balance(query: QueryPayload): return True
+    for fn in (deposit, ping, fixed, balance):
+        fn.__module__ = "bank.file"
+    Mutation.add(deposit)
+    Mutation.add(ping, no_header=True)
+    Mutation.add(fixed, fixed_header="0xdeadbeef")
+    Query.add(balance, splittable_output=True)
+
+
+def set_routers():
+    Manager.abi_router = ABIRouter()
+    Manager.url_router = URLRouter()
+    Manager.json_router = JSONRouter()
+
+
+def registered_routes():
+    set_routers()
+    Manager._register_queries(True)
+    Manager._register_mutations(True)
+    return [op.header_bytes for op in Manager.abi_router.advance_ops]
+
+
+def test_manifest_routes_match_reflection(monkeypatch):
+    add_handlers()
+    Manager._register_queries(False)
+    Manager._register_mutations(False)
+    manifest = build_route_manifest(Manager.mutations_info, Manager.queries_info, "hash")
+    assert manifest["mutations"]["bank.deposit"] == {"param": "payload", "abi_types": ["uint256", "string"],
+        "header": Manager.mutations_info["bank.deposit"]["selector"].to_bytes().hex(), "model": "MutPayload"}
+    assert manifest["mutations"]["bank.ping"]["header"] is None
+    assert manifest["queries"]["bank.balance"] == {"param": "query", "selector": "bank_balance",
+        "query_type": "queryJsonPayload", "model": "QueryPayloadSplittable"}
+    reflected = registered_routes()
+
+    Manager.mutations_info = {}
+    Manager.queries_info = {}
+    Manager.route_manifest = json.loads(json.dumps(manifest))
+    monkeypatch.setattr(manager_module, "signature", lambda f: pytest.fail("reflected"))
+    monkeypatch.setattr(manager_module.abi, "get_abi_types_from_model", lambda m: pytest.fail("reflected"))
+    assert registered_routes() == reflected
+    assert Manager.mutations_info["bank.deposit"]["model"] is MutPayload
+    assert Manager.queries_info["bank.balance"]["model"].__name__ == "QueryPayloadSplittable"
+
+
+def test_routes_missing_from_manifest_are_reflected():
+    add_handlers()
+    Manager.route_manifest = {"version": ROUTE_MANIFEST_VERSION, "hash": "", "mutations": {}, "queries": {}}
+    assert registered_routes()[0] == Manager.mutations_info["bank.deposit"]["selector"].to_bytes()
+
+
+def test_load_route_manifest(tmp_path):
+    path = str(tmp_path / "routes.json")
+    assert load_route_manifest(path) is None
+    manifest = {"version": ROUTE_MANIFEST_VERSION, "hash": app_files_hash(), "mutations": {}, "queries": {}}
+    save_route_manifest(manifest, path)
+    assert load_route_manifest(path) == manifest
+    save_route_manifest(dict(manifest, hash="other"), path)
+    assert load_route_manifest(path) is None
+    save_route_manifest(dict(manifest, version=0), path)
+    assert load_route_manifest(path) is None
+    with open(path, "w") as f:
+        f.write("{")
+    assert load_route_manifest(path) is None
+
+
+def test_app_files_hash_follows_imported_files(tmp_path, monkeypatch):
+    (tmp_path / "manifest_app_mod.py").write_text("X = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    before = app_files_hash(str(tmp_path))
+    __import__("manifest_app_mod")
+    try:
+        imported = app_files_hash(str(tmp_path))
+        assert imported != before
+        (tmp_path / "manifest_app_mod.py").write_text("X = 2\n")
+        assert app_files_hash(str(tmp_path)) != imported
+    finally:
+        del sys.modules["manifest_app_mod"]
+
+
+BOOT_SCRIPT = """
+import sys
+from cartesapp.manager import Manager, fix_imports
+fix_imports()
+Manager.add_module("tiny")
+if sys.argv[1] == "build":
+    print(Manager.write_route_manifest())
+else:
+    Manager.setup_manager()
+    print(Manager.route_manifest is not None, "cartesapp.manifest" in sys.modules)
+"""
+
+
+def run_app(tmp_path, command):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-c", BOOT_SCRIPT, command], cwd=tmp_path, env=env,
+        capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.splitlines()[-1]
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_route_manifest_setting(tmp_path, enabled):
+    (tmp_path / "tiny").mkdir()
+    (tmp_path / "tiny" / "settings.py").write_text(f"FILES = ['tiny']\nROUTE_MANIFEST = {enabled}\n")
+    (tmp_path / "tiny" / "tiny.py").write_text(
+        "from cartesapp.input import mutation\n\n@mutation()\ndef ping() -> bool:\n    return True\n")
+    assert run_app(tmp_path, "build") == ("cartesapp-routes.json" if enabled else "None")
+    assert (tmp_path / "cartesapp-routes.json").exists() == enabled
+    # the manifest module isn't even imported on boot when it is off
+    assert run_app(tmp_path, "boot") == f"{enabled} {enabled}"
@@ -0,0 +1,242 @@
+"""Tests for the built-in multicall mutation (several mutation calls in one
+advance, one db_session), driven through the Manager registration with a fake
+rollup and the in-memory database."""
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from cartesi import abi
+from cartesi.models import RollupMetadata, RollupData
+
+from cartesapp import storage as cstorage
+from cartesapp.manager import Manager
+from cartesapp.router import MutationRouter
+from cartesapp.input import Mutation, encode_batch_advance_input, encode_advance_input
+from cartesapp.multicall import MULTICALL_HEADER, MULTICALL_MAX_CALLS
+from cartesapp.storage import Entity, helpers
+from cartesapp.context import Context
+from cartesapp.setting import Setting
+from cartesapp.output import send_notice, Output
+from cartesapp.input import index_input
+from cartesapp.utils import hex2bytes, bytes2hex
+
+
+MODULE = "batched"
+SENDER = "0x" + "cd" * 20
+OWNER = "0x" + "ee" * 20
+
+
+class BatchEntry(Entity):
+    key = helpers.PrimaryKey(str)
+    value = helpers.Required(int)
+
+
+class EntryInput(BaseModel):
+    key: abi.String
+    value: abi.UInt256
+
+
+class FakeRollup:
+    def __init__(self):
+        self.reports = []
+        self.notices = []
+
+    def report(self, payload):
+        self.reports.append(payload)
+
+    def notice(self, payload):
+        self.notices.append(payload)
+
+
+def make_metadata(msg_sender=SENDER):
+    return RollupMetadata(
+        chain_id=1,
+        app_contract="0x" + "ab" * 20,
+        msg_sender=msg_sender,
+        input_index=0,
+        block_number=1,
+        block_timestamp=1,
+        prev_randao="0x0",
+    )
+
+
+def set_entry(payload: EntryInput):
+    BatchEntry(key=payload.key, value=payload.value)
+    return True
+
+def reject_entry(payload: EntryInput):
+    BatchEntry(key=payload.key, value=payload.value)
+    return False
+
+def fail_entry(payload: EntryInput):
+    BatchEntry(key=payload.key, value=payload.value)
+    raise Exception("boom")
+
+def owner_entry(payload: EntryInput):
+    BatchEntry(key=payload.key, value=payload.value)
+    return True
+
+def chunked_entry(payload: EntryInput):
+    return True
+
+def notify_entry(payload: EntryInput):
+    BatchEntry(key=payload.key, value=payload.value)
+    send_notice(payload.key)
+    return True
+
+def notify_reject(payload: EntryInput):
+    send_notice(payload.key)
+    return False
+
+def indexed_entry(payload: EntryInput):
+    BatchEntry(key=payload.key, value=payload.value)
+    index_input(tags=[payload.key])
+    return payload.value > 0
+
+for f in (set_entry, reject_entry, fail_entry, owner_entry, chunked_entry, notify_entry, notify_reject, indexed_entry):
+    f.__module__ = f"{MODULE}.file"
+
+
+@pytest.fixture
+def manager(storage):
+    Setting.add(SimpleNamespace(__name__=f"{MODULE}.settings", MULTICALL=True, INDEX_OUTPUTS=True))
+    Mutation.add(set_entry)
+    Mutation.add(reject_entry)
+    Mutation.add(fail_entry)
+    Mutation.add(owner_entry, msg_sender=OWNER)
+    Mutation.add(chunked_entry, chunk=True)
+    Mutation.add(notify_entry)
+    Mutation.add(notify_reject)
+    Mutation.add(indexed_entry)
+    Manager.abi_router = MutationRouter()
+    Manager._register_mutations(True)
+    Manager._register_multicall()
+    yield Manager
+    with helpers.db_session:
+        BatchEntry.select().delete(bulk=True)
+
+
+def send(manager, payload_hex, msg_sender=SENDER, rollup=None):
+    data = RollupData(metadata=make_metadata(msg_sender), payload=payload_hex)
+    op = manager.abi_router.get_advance_op(hex2bytes(payload_hex), msg_sender)
+    return op.handler(rollup or FakeRollup(), data)
+
+
+def entries():
+    with helpers.db_session:
+        return {e.key: e.value for e in BatchEntry.select()}
+
+
+class TestMulticallRegistration:
+    def test_multicall_route_added(self, manager):
+        headers = [op.header_bytes for op in manager.abi_router.advance_ops]
+        assert MULTICALL_HEADER.to_bytes() in headers
+
+    def test_multicall_is_opt_in(self, storage):
+        Mutation.add(set_entry)
+        Manager.abi_router = MutationRouter()
+        Manager._register_mutations(True)
+        Manager._register_multicall()
+        assert len(Manager.calls_router.advance_ops) == 0
+        assert MULTICALL_HEADER.to_bytes() not in [op.header_bytes for op in Manager.abi_router.advance_ops]
+
+    def test_chunked_routes_are_not_batchable(self, manager):
+        assert len(manager.calls_router.advance_ops) == len(Mutation.mutations) - 1
+        with pytest.raises(Exception, match="can't be batched"):
+            encode_batch_advance_input([(chunked_entry, EntryInput(key="a", value=1))])
+
+
+class TestMulticall:
+    def test_calls_run_in_order_with_single_sync(self, manager, monkeypatch):
+        syncs = []
+        monkeypatch.setattr(cstorage.os, "sync", lambda: syncs.append(1))
+        payload = encode_batch_advance_input([
+            (set_entry, EntryInput(key="a", value=1)),
+            (set_entry, EntryInput(key="b", value=2)),
+        ])
+        assert send(manager, payload)
+        assert entries() == {"a": 1, "b": 2}
+        assert len(syncs) == 1
+
+    def test_atomic_batch_is_all_or_nothing(self, manager):
+        for failing in (reject_entry, fail_entry):
+            payload = encode_batch_advance_input([
+                (set_entry, EntryInput(key="a", value=1)),
+                (failing, EntryInput(key="b", value=2)),
+            ])
+            assert not send(manager, payload)
+            assert entries() == {}
+
+    def test_non_atomic_batch_skips_failed_calls(self, manager):
+        payload = encode_batch_advance_input([
+            (set_entry, EntryInput(key="a", value=1)),
+            (reject_entry, EntryInput(key="b", value=2)),
+            (fail_entry, EntryInput(key="c", value=3)),
+            (set_entry, EntryInput(key="d", value=4)),
+        ], atomic=False)
+        assert send(manager, payload)
+        assert entries() == {"a": 1, "d": 4}
+
+    def test_outputs_of_failed_calls_are_discarded(self, manager):
+        rollup = FakeRollup()
+        payload = encode_batch_advance_input([
+            (notify_entry, EntryInput(key="a", value=1)),
+            (notify_reject, EntryInput(key="b", value=2)),
+            (notify_entry, EntryInput(key="c", value=3)),
+        ], atomic=False)
+        assert send(manager, payload, rollup=rollup)
+        assert rollup.notices == [bytes2hex(b"a"), bytes2hex(b"c")]
+        assert Context.n_outputs == 2
+
+        rollup = FakeRollup()
+        payload = encode_batch_advance_input([
+            (notify_entry, EntryInput(key="d", value=4)),
+            (notify_reject, EntryInput(key="e", value=5)),
+        ])
+        assert not send(manager, payload, rollup=rollup)
+        assert rollup.notices == []
+        assert Context.n_outputs == 2
+
+    def test_each_call_indexes_the_input(self, manager, monkeypatch):
+        # one input index row per committed call, rows of discarded calls are dropped
+        rows = []
+        monkeypatch.setattr(Output, "add_input_index", lambda metadata, app_contract, module, class_name, tags: rows.append(tags))
+        payload = encode_batch_advance_input([
+            (indexed_entry, EntryInput(key="a", value=1)),
+            (indexed_entry, EntryInput(key="b", value=2)),
+        ])
+        assert send(manager, payload)
+        assert rows == [["a"], ["b"]]
+
+        rows.clear()
+        payload = encode_batch_advance_input([
+            (indexed_entry, EntryInput(key="c", value=3)),
+            (indexed_entry, EntryInput(key="d", value=0)),
+            (indexed_entry, EntryInput(key="e", value=5)),
+        ], atomic=False)
+        assert send(manager, payload)
+        assert rows == [["c"], ["e"]]
+        assert entries() == {"a": 1, "b": 2, "c": 3, "e": 5}
+
+    def test_sub_calls_keep_msg_sender_restrictions(self, manager):
+        payload = encode_batch_advance_input([(owner_entry, EntryInput(key="a", value=1))])
+        assert not send(manager, payload)
+        assert send(manager, payload, msg_sender=OWNER)
+        assert entries() == {"a": 1}
+
+    def test_unknown_call_fails_atomic_batch(self, manager):
+        from cartesapp.multicall import Multicall
+        payload = MULTICALL_HEADER.to_bytes() + abi.encode_model(Multicall(atomic=True, calls=[b"\x00" * 8]))
+        assert not send(manager, "0x" + payload.hex())
+
+    def test_too_many_calls(self, manager):
+        call = (set_entry, EntryInput(key="a", value=1))
+        assert not send(manager, encode_batch_advance_input([call] * (MULTICALL_MAX_CALLS + 1), atomic=False))
+        assert entries() == {}
+
+    def test_batched_payload_matches_single_input(self, manager):
+        from cartesapp.multicall import Multicall
+        model = EntryInput(key="a", value=1)
+        batch = abi.decode_to_model(data=hex2bytes(encode_batch_advance_input([(set_entry, model)]))[4:], model=Multicall)
+        assert batch.calls == [hex2bytes(encode_advance_input(set_entry, model))]
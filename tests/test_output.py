@@ -1,16 +1,23 @@
 """Unit tests for output normalization (cartesapp.output)."""
 import base64
 import json
+import sys
 
 import pytest
 from pydantic import BaseModel
 
 from cartesi import abi
-from cartesi.models import ABIFunctionSelectorHeader
+from cartesi.models import ABIFunctionSelectorHeader, RollupMetadata
+
+from Crypto.Hash import keccak
 
 from cartesapp.output import (
     normalize_output, normalize_voucher, normalize_jsonrpc_output,
+    Output, OutputDescriptor, get_output_descriptor, send_notice, send_report,
 )
+from cartesapp import output
+from cartesapp.context import Context
+from cartesapp.setting import Setting
 from cartesapp.utils import OutputFormat, str2bytes, hex2bytes
 
 
@@ -146,3 +153,116 @@ class TestNormalizeJsonrpcOutput:
     def test_int_result(self):
         payload, name = normalize_jsonrpc_output(42, OutputFormat.json, req_id=4)
         assert json.loads(payload)["result"] == 42 and name == "int"
+
+    def test_model_result_is_serialized_once(self):
+        m = SampleModel(n=7, data=b"hi")
+        payload, name = normalize_jsonrpc_output(m, OutputFormat.json, req_id=5)
+        assert name == "sample.SampleModel"
+        assert json.loads(payload) == {"jsonrpc": "2.0", "result": json.loads(m.json()), "id": 5}
+
+    def test_model_error_response(self):
+        m = SampleModel(n=7, data=b"hi")
+        payload, _ = normalize_jsonrpc_output(m, OutputFormat.json, req_id=6, error=True)
+        decoded = json.loads(payload)
+        assert decoded["error"] == {"code": 1, "data": json.loads(m.json()), "message": "Error"}
+
+    @pytest.mark.parametrize("orjson_installed", [True, False])
+    def test_same_bytes_as_json_dumps(self, monkeypatch, orjson_installed):
+        # the output bytes don't depend on the json packages installed
+        if orjson_installed:
+            pytest.importorskip("orjson")
+        else:
+            monkeypatch.setitem(sys.modules, "orjson", None)
+        data = {"a": [1, "b", 1e16, 1.5e-7, float("nan"), float("inf")], "text":"\u00e9"}
+        payload, _ = normalize_jsonrpc_output(data, OutputFormat.json, req_id="x")
+        assert payload == json.dumps({"jsonrpc": "2.0", "result": data, "id": "x"}).encode()
+        assert normalize_output(data, OutputFormat.json)[0] == json.dumps(data).encode()
+        m = SampleModel(n=7, data=b"hi")
+        payload, _ = normalize_jsonrpc_output(m, OutputFormat.json, req_id=5)
+        assert payload == b'{"jsonrpc": "2.0", "result": ' + m.json().encode() + b', "id": 5}'
+
+    def test_big_ints_fall_back_to_json(self):
+        payload, _ = normalize_jsonrpc_output([2**200], OutputFormat.json, req_id=1)
+        assert json.loads(payload)["result"] == [2**200]
+
+
+def keccak_selector(signature: str) -> bytes:
+    sig_hash = keccak.new(digest_bits=256)
+    sig_hash.update(signature.encode('utf-8'))
+    return sig_hash.digest()[:4]
+
+
+class TestOutputDescriptor:
+    def test_built_on_registration(self):
+        Output.add_notice(SampleModel)
+        descriptor = Output.descriptors[SampleModel]
+        assert descriptor.class_name == "sample.SampleModel"
+        assert descriptor.abi_types == ("uint256", "bytes")
+        assert Output.notices_info["sample.SampleModel"]["abi_types"] == ["uint256", "bytes"]
+
+    def test_header_matches_selector_header(self):
+        descriptor = OutputDescriptor(SampleModel)
+        assert descriptor.header == ABIFunctionSelectorHeader(
+            function="sample.SampleModel",
+            argument_types=["uint256", "bytes"],
+        ).to_bytes()
+
+    def test_voucher_selectors(self):
+        Output.add_voucher(SampleModel)
+        m = SampleModel(n=1, data=b"x")
+        payload, _, _ = normalize_voucher(m)
+        assert payload[:4] == keccak_selector("SampleModel(uint256,bytes)")
+        payload, _, _ = normalize_voucher("transfer", m, 3)
+        assert payload[:4] == keccak_selector("transfer(uint256,bytes)")
+        assert set(Output.descriptors[SampleModel].selectors) == {"SampleModel", "transfer"}
+
+    def test_unregistered_model_is_added_on_first_output(self):
+        assert SampleModel not in Output.descriptors
+        normalize_output(SampleModel(n=1, data=b""), OutputFormat.header_abi)
+        assert get_output_descriptor(SampleModel) is Output.descriptors[SampleModel]
+
+    def test_send_notice_uses_module_settings(self, monkeypatch):
+        class Settings:
+            NOTICE_FORMAT = "abi"
+        monkeypatch.setitem(Setting.settings, "sample", Settings)
+        Output.add_notice(SampleModel)
+
+        notices = []
+        class Rollup:
+            def notice(self, payload): notices.append(payload)
+        Context.rollup = Rollup()
+        Context.metadata = RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender="0x" + "cd" * 20,
+                                          input_index=0, block_number=1, block_timestamp=1, prev_randao="0x0")
+        Context.module = "sample"
+        m = SampleModel(n=7, data=b"hi")
+        send_notice(m)
+        assert notices == ["0x" + abi.encode_model(m).hex()]
+
+        Setting.freeze(["sample"]) # outputs disabled
+        Context.set_module("sample")
+        send_notice(m)
+        assert len(notices) == 1
+
+
+class TestReportChunks:
+    class Rollup:
+        def __init__(self):
+            self.reports = []
+        def report(self, payload):
+            self.reports.append(payload)
+
+    def test_inspect_report_is_chunked(self, monkeypatch):
+        monkeypatch.setattr(output, "MAX_OUTPUT_SIZE", 4)
+        monkeypatch.setattr(output, "MAX_AGGREGATED_OUTPUT_SIZE", 9)
+        rollup = self.Rollup()
+        Context.set_context(rollup, None, "sample")
+        send_report(b"abcdefghijkl") # truncated to the aggregated size
+        assert rollup.reports == ["0x" + b.hex() for b in (b"abcd", b"efgh", b"i")]
+
+    def test_binary_reports_for_low_level_rollups(self):
+        emitted = []
+        rollup = self.Rollup()
+        rollup._rollup = type("LowLevel", (), {"emit_report": lambda self, p: emitted.append(p)})()
+        Context.set_context(rollup, None, "sample")
+        send_report(b"\x01\x02")
+        assert emitted == [b"\x01\x02"] and rollup.reports == []
@@ -0,0 +1,242 @@
+"""Tests for keyset pagination of queries (``@query(paginate=...)``): the cursor
+helper pages Pony selects by key and returns an opaque next cursor."""
+import base64
+import json
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from pydantic import BaseModel, create_model
+
+from cartesi import URLParameters
+from cartesi.models import RollupData
+
+from cartesapp import cache, output
+from cartesapp.cache import QueryCache, PartCache
+from cartesapp.input import _make_url_query, _make_json_query, DecodePlan, Query, splittable_query_params
+from cartesapp.manager import Manager
+from cartesapp.output import add_output
+from cartesapp.pagination import get_paginate_configs, get_cursor, paginated_query_params, encode_cursor, decode_cursor, Cursor
+from cartesapp.storage import Entity, helpers
+from cartesapp.utils import str2hex
+
+
+MODULE = "paged"
+
+
+class PagedItem(Entity):
+    id = helpers.PrimaryKey(int)
+    group = helpers.Required(str)
+    score = helpers.Required(int)
+
+
+class PagedEvent(Entity):
+    id = helpers.PrimaryKey(int)
+    at = helpers.Required(datetime)
+    day = helpers.Required(date)
+    amount = helpers.Required(Decimal)
+    uid = helpers.Required(UUID)
+    tag = helpers.Required(bytes)
+    data = helpers.Optional(helpers.Json)
+
+
+class ItemsQuery(BaseModel):
+    group: str
+
+
+ItemsQueryPaginated = create_model("ItemsQueryPaginated", __base__=ItemsQuery, **paginated_query_params)
+ItemsQuerySplittablePaginated = create_model("ItemsQuerySplittablePaginated", __base__=ItemsQuery,
+                                             **splittable_query_params, **paginated_query_params)
+
+calls = []
+
+
+def list_items(payload: ItemsQuery):
+    calls.append(payload.group)
+    cursor = get_cursor()
+    rows = cursor.page(PagedItem.select(lambda i: i.group == payload.group))
+    add_output({"data": [[r.id, r.score] for r in rows], "next_cursor": cursor.next_cursor})
+    return True
+
+
+class FakeRollup:
+    def __init__(self):
+        self.reports = []
+
+    def report(self, payload):
+        self.reports.append(payload)
+
+
+@pytest.fixture
+def items(storage):
+    calls.clear()
+    with helpers.db_session:
+        PagedItem.select().delete(bulk=True)
+        for i in range(1, 26):
+            PagedItem(id=i, group="a" if i % 5 else "b", score=i % 3)
+    yield
+    with helpers.db_session:
+        PagedItem.select().delete(bulk=True)
+
+
+def url_query(paginate, extended_model=ItemsQueryPaginated, **func_configs):
+    return _make_url_query(list_items, ItemsQuery, True, MODULE, paginate=get_paginate_configs(paginate),
+                           extended_model=extended_model, decode_plan=DecodePlan(ItemsQuery, extended_model), **func_configs)
+
+
+def fetch(query, cursor=None, limit=None, group="a", part=None):
+    query_params = {"group": [group]}
+    if cursor is not None: query_params["cursor"] = [cursor]
+    if limit is not None: query_params["limit"] = [str(limit)]
+    if part is not None: query_params.update(part=[str(part)], parts=["100"])
+    rollup = FakeRollup()
+    query(rollup, URLParameters(path_params={}, query_params=query_params))
+    return json.loads(bytes.fromhex(rollup.reports[-1][2:]))
+
+
+def fetch_all(query, **kwargs):
+    pages = []
+    cursor = None
+    while True:
+        page = fetch(query, cursor, **kwargs)
+        pages.append(page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+class TestPaginateConfigs:
+    def test_defaults(self):
+        configs = get_paginate_configs(True)
+        assert configs["key"] is None and configs["limit"] <= configs["max_limit"]
+        assert get_paginate_configs({"key": "score"})["key"] == ("score",)
+
+    def test_invalid(self):
+        with pytest.raises(Exception, match="Invalid paginate configs"):
+            get_paginate_configs({"order": "id"})
+        with pytest.raises(Exception, match="must be True"):
+            get_paginate_configs(10)
+        with pytest.raises(Exception, match="Invalid paginate limits"):
+            get_paginate_configs({"limit": 10, "max_limit": 5})
+
+    def test_cursor_roundtrip(self):
+        assert decode_cursor(encode_cursor([1, "a"])) == [1, "a"]
+        values = [datetime(2024, 1, 2, 3, 4, 5, 6), date(2024, 1, 2), timedelta(1, 2, 3), Decimal("1.10"),
+                  UUID(int=7), None, 1.5, True]
+        assert decode_cursor(encode_cursor(values)) == values
+        assert [type(v) for v in decode_cursor(encode_cursor(values))] == [type(v) for v in values]
+        with pytest.raises(Exception, match="Invalid cursor"):
+            decode_cursor("not a cursor")
+        with pytest.raises(Exception, match="Invalid cursor"):
+            decode_cursor(base64.urlsafe_b64encode(b'[{"x": 1}]').decode())
+        with pytest.raises(Exception, match="Unsupported pagination key"):
+            encode_cursor([b"\x00"])
+
+
+class TestKeysetPagination:
+    def test_pages_by_primary_key(self, items):
+        pages = fetch_all(url_query({"limit": 7}))
+        assert [len(p) for p in pages] == [7, 7, 6]
+        assert [r[0] for p in pages for r in p] == [i for i in range(1, 26) if i % 5]
+
+    def test_descending_key_with_ties(self, items):
+        pages = fetch_all(url_query({"key": "-score", "limit": 4}))
+        rows = [tuple(r) for p in pages for r in p]
+        expected = sorted(((i, i % 3) for i in range(1, 26) if i % 5), key=lambda r: (-r[1], r[0]))
+        assert rows == expected
+
+    def test_limit_param_is_capped(self, items):
+        query = url_query({"limit": 3, "max_limit": 5})
+        assert len(fetch(query, limit=10)["data"]) == 5
+        assert len(fetch(query, limit=2)["data"]) == 2
+
+    def test_last_page_has_no_cursor(self, items):
+        assert fetch(url_query(True), group="b") == {"data": [[i, i % 3] for i in (5, 10, 15, 20, 25)], "next_cursor": None}
+
+    def test_invalid_cursor_and_key(self, items):
+        rollup = FakeRollup()
+        assert not url_query(True)(rollup, URLParameters(path_params={}, query_params={"group": ["a"], "cursor": ["x"]}))
+        rollup = FakeRollup()
+        assert not url_query({"key": "group.x"})(rollup, URLParameters(path_params={}, query_params={"group": ["a"]}))
+
+    def test_json_query_params(self, items):
+        query = _make_json_query(list_items, ItemsQuery, True, MODULE, paginate=get_paginate_configs({"limit": 7}),
+                                 extended_model=ItemsQueryPaginated, decode_plan=DecodePlan(ItemsQuery, ItemsQueryPaginated))
+        def fetch_json(params):
+            rollup = FakeRollup()
+            query(rollup, RollupData(metadata=None, payload=str2hex(json.dumps({"params": params}))))
+            return json.loads(bytes.fromhex(rollup.reports[-1][2:]))
+        first = fetch_json({"group": "a"})
+        second = fetch_json({"group": "a", "cursor": first["next_cursor"]}) # without limit
+        assert second["data"][0][0] == 9
+        # a request without cursor starts over
+        assert fetch_json({"group": "a"}) == first
+
+    def test_cached_pages(self, items):
+        query = url_query({"limit": 7}, cache=QueryCache.add_route(f"{MODULE}.list_items", True))
+        pages = fetch_all(query)
+        assert [len(p) for p in pages] == [7, 7, 6]
+        assert fetch_all(query) == pages
+        assert len(fetch(query, limit=3)["data"]) == 3
+        assert calls == ["a"] * 4
+
+    def test_part_cached_pages(self, items, monkeypatch):
+        # every page is split in parts (and sent whole in one inspect)
+        monkeypatch.setattr(cache, "MAX_SPLITTABLE_OUTPUT_SIZE", 16)
+        monkeypatch.setattr(output, "MAX_SPLITTABLE_OUTPUT_SIZE", 16)
+        monkeypatch.setattr(output, "MAX_INSPECT_PARTS", 100)
+        query = url_query({"limit": 7}, ItemsQuerySplittablePaginated,
+                          part_cache=PartCache.add_route(f"{MODULE}.list_items"))
+        pages = fetch_all(query, part=0)
+        assert [len(p) for p in pages] == [7, 7, 6]
+        assert fetch_all(query, part=0) == pages
+        assert calls == ["a"] * 3
+
+
+@pytest.fixture
+def events(storage):
+    with helpers.db_session:
+        PagedEvent.select().delete(bulk=True)
+        for i in range(1, 11):
+            PagedEvent(id=i, at=datetime(2024, 1, 1) + timedelta(hours=i % 4), day=date(2024, 1, 1 + i % 3),
+                       amount=Decimal(i % 5) / 4, uid=UUID(int=i * 7919 % 11), tag=bytes([i % 6]))
+    yield
+    with helpers.db_session:
+        PagedEvent.select().delete(bulk=True)
+
+
+@pytest.mark.parametrize("key", ["at", "-day", "amount", "-uid"])
+def test_pages_by_non_json_keys(events, key):
+    name = key.lstrip("-")
+    with helpers.db_session:
+        # ties by ascending id (stable sort)
+        expected = sorted(((getattr(e, name), e.id) for e in PagedEvent.select()), key=lambda r: r[1])
+        expected.sort(key=lambda r: r[0], reverse=key.startswith("-"))
+        rows = []
+        after = None
+        while True:
+            cursor = Cursor((key,), 3, None if after is None else decode_cursor(after))
+            rows.extend((getattr(e, name), e.id) for e in cursor.page(PagedEvent.select()))
+            after = cursor.next_cursor
+            if after is None:
+                break
+    assert rows == expected
+
+
+@pytest.mark.parametrize("key", ["tag", "data"])
+def test_incomparable_attributes_are_not_pagination_keys(events, key):
+    with helpers.db_session:
+        with pytest.raises(Exception, match=f"Invalid pagination key {key}"):
+            Cursor((key,), 3).page(PagedEvent.select())
+
+
+def test_registration_extends_the_query_model():
+    def listing(payload: ItemsQuery):
+        return True
+    listing.__module__ = f"{MODULE}.file"
+    Query.add(listing, paginate=True, splittable_output=True)
+    Manager._register_queries(False)
+    model = Manager.queries_info[f"{MODULE}.listing"]["model"]
+    assert model.__name__ == "ItemsQuerySplittablePaginated"
+    assert {"group", "part", "parts", "cursor", "limit"} == set(model.__fields__)
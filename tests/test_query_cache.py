@@ -0,0 +1,335 @@
+"""Tests for the inspect result caches: @query(cache=...) hits replay the
+recorded reports without running the query, committed mutations invalidate
+(globally or per entity) and the cache is bounded in bytes. Splittable outputs
+serve the parts after the first one from the part cache."""
+import json
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel, create_model
+
+from cartesi import abi, URLParameters, URLRouter, JSONRouter
+from cartesi.models import RollupMetadata, RollupData, RollupResponse, ABIFunctionSelectorHeader
+
+from cartesapp import cache, output
+from cartesapp.cache import QueryCache, PartCache
+from cartesapp.input import Query, _make_mut, _make_mut_call, _make_multicall, _make_url_query, _make_json_query, DecodePlan, splittable_query_params
+from cartesapp.multicall import Multicall, MULTICALL_HEADER
+from cartesapp.output import add_output
+from cartesapp.manager import Manager
+from cartesapp.router import MutationRouter
+from cartesapp.setting import Setting
+from cartesapp.storage import Entity, helpers
+from cartesapp.utils import bytes2hex, str2hex
+
+
+MODULE = "cached"
+
+
+class CachedItem(Entity):
+    key = helpers.PrimaryKey(str)
+    value = helpers.Required(int)
+
+
+class OtherItem(Entity):
+    key = helpers.PrimaryKey(str)
+
+
+class ItemInput(BaseModel):
+    key: abi.String
+    value: abi.UInt256
+
+
+class ItemQuery(BaseModel):
+    key: str
+
+
+class FakeRollup:
+    def __init__(self):
+        self.reports = []
+
+    def report(self, payload):
+        self.reports.append(payload)
+
+
+def make_metadata():
+    return RollupMetadata(chain_id=1, app_contract="0x" + "ab" * 20, msg_sender="0x" + "cd" * 20,
+                          input_index=0, block_number=1, block_timestamp=1, prev_randao="0x0")
+
+
+calls = []
+
+
+def read_item(payload: ItemQuery):
+    calls.append(payload.key)
+    item = CachedItem.get(key=payload.key)
+    add_output({"key": payload.key, "value": item.value if item else None})
+    return True
+
+
+def read_item_fails(payload: ItemQuery):
+    calls.append(payload.key)
+    add_output("nope")
+    return False
+
+
+def set_item(payload: ItemInput):
+    item = CachedItem.get(key=payload.key)
+    if item is None:
+        CachedItem(key=payload.key, value=payload.value)
+    else:
+        item.value = payload.value
+    return True
+
+
+def set_other(payload: ItemInput):
+    OtherItem(key=payload.key)
+    return True
+
+
+def reject_item(payload: ItemInput):
+    return False
+
+
+def clear_items(payload: ItemInput):
+    CachedItem.select().delete(bulk=True)
+    return True
+
+
+@pytest.fixture(autouse=True)
+def clean(storage):
+    calls.clear()
+    yield
+    with helpers.db_session:
+        CachedItem.select().delete(bulk=True)
+        OtherItem.select().delete(bulk=True)
+
+
+def mutate(func, key="a", value=1):
+    handler = _make_mut(func, ItemInput, True, MODULE)
+    payload = bytes2hex(abi.encode_model(ItemInput(key=key, value=value)))
+    assert handler(FakeRollup(), RollupData(metadata=make_metadata(), payload=payload))
+
+
+def multicall(*calls):
+    """Non atomic multicall of (func, key, value) sub-calls."""
+    router = MutationRouter()
+    headers = {}
+    for func in (set_item, reject_item):
+        headers[func] = ABIFunctionSelectorHeader(function=f"{MODULE}.{func.__name__}",
+            argument_types=abi.get_abi_types_from_model(ItemInput))
+        router.advance(header=headers[func])(_make_mut_call(func, ItemInput, True, MODULE, has_header=True))
+    batch = Multicall(atomic=False, calls=[headers[func].to_bytes() + abi.encode_model(ItemInput(key=key, value=value))
+        for func, key, value in calls])
+    payload = bytes2hex(MULTICALL_HEADER.to_bytes() + abi.encode_model(batch))
+    assert _make_multicall(router)(FakeRollup(), RollupData(metadata=make_metadata(), payload=payload))
+
+
+def url_query(func=read_item, cache=True):
+    configs = QueryCache.add_route(f"{MODULE}.{func.__name__}", cache)
+    return _make_url_query(func, ItemQuery, True, MODULE, cache=configs)
+
+
+def url_inspect(query, key="a"):
+    rollup = FakeRollup()
+    assert query(rollup, URLParameters(path_params={}, query_params={"key": [key]})) is not None
+    return rollup.reports
+
+
+def jsonrpc_inspect(query, req_id, key="a"):
+    rollup = FakeRollup()
+    payload = {"jsonrpc": "2.0", "method": "x", "params": {"key": key}, "id": req_id}
+    query(rollup, RollupData(metadata=None, payload=str2hex(json.dumps(payload))))
+    return rollup.reports
+
+
+class TestQueryCache:
+    def test_hit_replays_reports(self):
+        mutate(set_item, value=5)
+        query = url_query()
+        first = url_inspect(query)
+        assert url_inspect(query) == first
+        assert url_inspect(query, "b") != first
+        assert calls == ["a", "b"]
+
+    def test_failed_queries_are_not_cached(self):
+        query = url_query(read_item_fails)
+        url_inspect(query)
+        url_inspect(query)
+        assert calls == ["a", "a"]
+
+    def test_jsonrpc_hit_uses_request_id(self):
+        configs = QueryCache.add_route(f"{MODULE}.read_item", True)
+        query = _make_json_query(read_item, ItemQuery, True, MODULE, cache=configs)
+        first = jsonrpc_inspect(query, 1)
+        second = jsonrpc_inspect(query, "req-2")
+        assert calls == ["a"]
+        assert json.loads(bytes.fromhex(first[0][2:]))["id"] == 1
+        response = json.loads(bytes.fromhex(second[0][2:]))
+        assert response["id"] == "req-2"
+        assert response["result"] == {"key": "a", "value": None}
+
+    def test_commit_invalidates(self):
+        query = url_query()
+        url_inspect(query)
+        mutate(set_item, value=7)
+        reports = url_inspect(query)
+        assert calls == ["a", "a"]
+        assert json.loads(bytes.fromhex(reports[0][2:]))["value"] == 7
+
+    def test_entity_scoped_invalidation(self):
+        query = url_query(cache={"entities": [CachedItem]})
+        mutate(set_item, value=1)
+        url_inspect(query)
+        mutate(set_other, key="x")
+        url_inspect(query)
+        assert calls == ["a"]
+        mutate(set_item, value=2)
+        url_inspect(query)
+        assert calls == ["a", "a"]
+
+    def test_multicall_commits_invalidate_when_the_last_call_fails(self):
+        query = url_query(cache={"entities": [CachedItem]})
+        url_inspect(query)
+        multicall((set_item, "a", 3), (reject_item, "a", 4))
+        reports = url_inspect(query)
+        assert calls == ["a", "a"]
+        assert json.loads(bytes.fromhex(reports[0][2:]))["value"] == 3
+
+    def test_unattributed_writes_invalidate_everything(self):
+        query = url_query(cache={"entities": ["OtherItem"]})
+        mutate(set_item, value=1)
+        url_inspect(query)
+        mutate(clear_items) # bulk delete: entity objects are not loaded
+        url_inspect(query)
+        assert calls == ["a", "a"]
+
+    def test_lru_bounded_by_bytes(self, monkeypatch):
+        query = url_query()
+        url_inspect(query, "a")
+        entry_size = QueryCache.size
+        monkeypatch.setattr(QueryCache, "max_size", entry_size * 2)
+        url_inspect(query, "b")
+        url_inspect(query, "a") # a is now the most recent
+        url_inspect(query, "c") # evicts b
+        assert QueryCache.size <= entry_size * 2
+        url_inspect(query, "a")
+        url_inspect(query, "b")
+        assert calls == ["a", "b", "c", "b"]
+
+    def test_invalid_configs(self):
+        with pytest.raises(Exception, match="Invalid cache configs"):
+            QueryCache.add_route("m.f", {"ttl": 1})
+
+
+class BigQuery(BaseModel):
+    size: int
+
+
+BigQuerySplittable = create_model("BigQuerySplittable", __base__=BigQuery, **splittable_query_params)
+
+
+def read_big(payload: BigQuery):
+    calls.append(payload.size)
+    add_output(bytes(range(256)) * (payload.size // 256))
+    return True
+
+read_big.__module__ = f"{MODULE}.file"
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    # parts of 100 bytes, up to 3 parts per inspect
+    monkeypatch.setattr(cache, "MAX_SPLITTABLE_OUTPUT_SIZE", 100)
+    monkeypatch.setattr(output, "MAX_SPLITTABLE_OUTPUT_SIZE", 100)
+    monkeypatch.setattr(output, "MAX_AGGREGATED_OUTPUT_SIZE", 301)
+    monkeypatch.setattr(output, "MAX_INSPECT_PARTS", 3)
+
+
+def splittable_query():
+    configs = PartCache.add_route(f"{MODULE}.read_big")
+    return _make_url_query(read_big, BigQuery, True, MODULE, part_cache=configs,
+                           extended_model=BigQuerySplittable,
+                           decode_plan=DecodePlan(BigQuery, BigQuerySplittable))
+
+
+def fetch(query, size, part, parts=None):
+    query_params = {"size": [str(size)], "part": [str(part)]}
+    if parts is not None: query_params["parts"] = [str(parts)]
+    rollup = FakeRollup()
+    query(rollup, URLParameters(path_params={}, query_params=query_params))
+    return b"".join(bytes.fromhex(r[2:]) for r in rollup.reports)
+
+
+def fetch_all(query, size, parts=None):
+    data = b""
+    part = 0
+    step = parts or 1
+    while True:
+        out = fetch(query, size, part, parts)
+        if len(out) <= step * 100:
+            return data + out
+        data += out[:-1]
+        part += step
+
+
+class TestPartCache:
+    def test_parts_are_sliced_from_cache(self, small_parts):
+        query = splittable_query()
+        assert fetch_all(query, 512) == bytes(range(256)) * 2
+        assert calls == [512]
+
+    def test_remaining_parts_byte(self, small_parts):
+        query = splittable_query()
+        assert fetch(query, 512, 0)[-1] == 5
+        assert fetch(query, 512, 4)[-1] == 1
+        assert len(fetch(query, 512, 5)) == 12 # last part: no extra byte
+
+    def test_several_parts_per_inspect(self, small_parts):
+        query = splittable_query()
+        first = fetch(query, 512, 0, parts=3)
+        assert len(first) == 301 and first[-1] == 3
+        assert fetch_all(query, 512, parts=3) == bytes(range(256)) * 2
+        # capped by what fits in one inspect
+        assert len(fetch(query, 512, 0, parts=10)) == 301
+        assert calls == [512]
+
+    @pytest.mark.parametrize("query_format", ["url", "json"])
+    def test_registered_query_accepts_parts(self, small_parts, query_format):
+        Setting.add(SimpleNamespace(__name__=f"{MODULE}.settings", QUERY_FORMAT=query_format))
+        Query.add(read_big, splittable_output=True)
+        Manager.url_router = URLRouter()
+        Manager.json_router = JSONRouter()
+        Manager._register_queries(True)
+        selector = Manager.queries_info[f"{MODULE}.read_big"]["selector"]
+        for part in (0, 2, 4):
+            rollup = FakeRollup()
+            if query_format == "url":
+                route = next(r for r in Manager.url_router.routes if r.path == selector)
+                params = {"size": ["512"], "part": [str(part)], "parts": ["2"]}
+                assert route.handler(rollup, URLParameters(path_params={}, query_params=params))
+            else:
+                payload = json.dumps({"method": selector, "params": {"size": 512, "part": part, "parts": 2}})
+                data = RollupData(metadata=None, payload=str2hex(payload))
+                assert Manager.json_router.get_handler(RollupResponse(request_type="inspect_state", data=data))(rollup, data)
+            out = b"".join(bytes.fromhex(r[2:]) for r in rollup.reports)
+            expected = (bytes(range(256)) * 2)[part * 100:(part + 2) * 100]
+            # 6 parts of 100 bytes: remaining parts byte unless the last ones were sent
+            assert out == (expected + bytes([6 - part - 2]) if part < 4 else expected)
+        assert calls == [512]
+
+    def test_commit_bumps_state_version(self, small_parts):
+        query = splittable_query()
+        fetch(query, 512, 0)
+        version = PartCache.version
+        mutate(set_other, key="y")
+        assert PartCache.version == version + 1
+        fetch(query, 512, 1)
+        assert calls == [512, 512]
+
+    def test_small_outputs_are_not_cached(self, small_parts):
+        query = splittable_query()
+        fetch(query, 0, 0)
+        fetch(query, 0, 0)
+        assert calls == [0, 0]
+        assert len(PartCache.entries) == 0
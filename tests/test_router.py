@@ -0,0 +1,94 @@
+"""Unit tests for the selector-indexed advance dispatch (cartesapp.router)."""
+import pytest
+
+from cartesi.models import ABILiteralHeader, RollupData, RollupMetadata, RollupResponse
+
+from cartesapp.router import MutationRouter
+from cartesapp.utils import bytes2hex
+
+
+SENDER = "0x" + "cd" * 20
+OTHER = "0x" + "ee" * 20
+
+
+def advance(payload: bytes, msg_sender: str = SENDER):
+    metadata = RollupMetadata(
+        chain_id=1,
+        app_contract="0x" + "ab" * 20,
+        msg_sender=msg_sender,
+        input_index=0,
+        block_number=1,
+        block_timestamp=1,
+        prev_randao="0x0",
+    )
+    return RollupResponse(request_type="advance_state", data=RollupData(metadata=metadata, payload=bytes2hex(payload)))
+
+
+def register(router, name, header=None, msg_sender=None):
+    def handler(rollup, data): return name
+    handler.__name__ = name
+    kwargs = {}
+    if header is not None: kwargs["header"] = ABILiteralHeader(header=header)
+    if msg_sender is not None: kwargs["msg_sender"] = msg_sender
+    router.advance(**kwargs)(handler)
+    return handler
+
+
+class TestMutationRouter:
+    def test_matches_by_header(self):
+        router = MutationRouter()
+        register(router, "a", b"\x01\x02\x03\x04")
+        b = register(router, "b", b"\x05\x06\x07\x08")
+        assert router.get_handler(advance(b"\x05\x06\x07\x08rest")) is b
+        assert len(router.advance_ops) == 2
+
+    def test_unknown_header_returns_none(self):
+        router = MutationRouter()
+        register(router, "a", b"\x01\x02\x03\x04")
+        assert router.get_handler(advance(b"\xff\xff\xff\xff")) is None
+        assert router.get_handler(advance(b"\x01")) is None
+
+    def test_msg_sender_constraint(self):
+        router = MutationRouter()
+        filtered = register(router, "filtered", b"\x01\x02\x03\x04", SENDER)
+        assert router.get_handler(advance(b"\x01\x02\x03\x04", SENDER.upper().replace("0X", "0x"))) is filtered
+        assert router.get_handler(advance(b"\x01\x02\x03\x04", OTHER)) is None
+
+    def test_same_header_sender_specific_and_open(self):
+        router = MutationRouter()
+        filtered = register(router, "filtered", b"\x01\x02\x03\x04", SENDER)
+        open_route = register(router, "open", b"\x01\x02\x03\x04")
+        assert router.get_handler(advance(b"\x01\x02\x03\x04", SENDER)) is filtered
+        assert router.get_handler(advance(b"\x01\x02\x03\x04", OTHER)) is open_route
+
+    def test_no_header_fallback(self):
+        router = MutationRouter()
+        register(router, "a", b"\x01\x02\x03\x04")
+        proxied = register(router, "proxied", msg_sender=OTHER)
+        fallback = register(router, "fallback")
+        assert router.get_handler(advance(b"\x09\x09\x09\x09", OTHER)) is proxied
+        assert router.get_handler(advance(b"\x09\x09\x09\x09", SENDER)) is fallback
+
+    def test_first_registered_route_wins(self):
+        """Same precedence as ABIRouter: a catch-all registered first shadows later routes."""
+        router = MutationRouter()
+        catch_all = register(router, "catch_all")
+        register(router, "a", b"\x01\x02\x03\x04")
+        assert router.get_handler(advance(b"\x01\x02\x03\x04")) is catch_all
+
+    def test_mixed_header_lengths(self):
+        router = MutationRouter()
+        short = register(router, "short", b"\x01\x02")
+        register(router, "long", b"\x01\x02\x03\x04")
+        assert router.get_handler(advance(b"\x01\x02\x03\x04")) is short
+
+    @pytest.mark.parametrize("n_routes", [1, 10, 200])
+    def test_agrees_with_linear_scan(self, n_routes):
+        router = MutationRouter()
+        for i in range(n_routes):
+            register(router, f"r{i}", i.to_bytes(4, "big"), SENDER if i % 3 == 0 else None)
+        for i in range(n_routes):
+            for sender in (SENDER, OTHER):
+                request = advance(i.to_bytes(4, "big") + b"payload", sender)
+                linear = super(MutationRouter, router).get_handler(request)
+                assert router.get_handler(request) is linear
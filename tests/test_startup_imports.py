@@ -0,0 +1,61 @@
+"""Modules imported by a minimal app boot: optional subsystems (vouchers keccak,
+columnar outputs, chunks, route manifest, templates, cartesapplib, the cli and
+machine tools) must only be imported when used."""
+import json
+import os
+import subprocess
+import sys
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples")
+
+BOOT_SCRIPT = """
+import sys, json
+# imported by the framework dependencies themselves
+import cartesi, cartesi.abi, cartesi.models, pony.orm, pydantic
+baseline = set(sys.modules)
+from cartesapp.manager import Manager, fix_imports
+from cartesapp.utils import get_modules
+fix_imports()
+m = Manager()
+for mod in get_modules():
+    m.add_module(mod)
+m.setup_manager()
+print(json.dumps(sorted(set(sys.modules) - baseline)))
+"""
+
+ECHO_APP_CARTESAPP_MODULES = {
+    "cartesapp",
+    "cartesapp.cache",
+    "cartesapp.codec",
+    "cartesapp.compression",
+    "cartesapp.context",
+    "cartesapp.input",
+    "cartesapp.manager",
+    "cartesapp.multicall",
+    "cartesapp.output",
+    "cartesapp.pagination",
+    "cartesapp.router",
+    "cartesapp.setting",
+    "cartesapp.setup",
+    "cartesapp.storage",
+    "cartesapp.utils",
+}
+
+
+def boot_modules(app: str) -> set:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-c", BOOT_SCRIPT], cwd=os.path.join(EXAMPLES, app),
+        env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def test_echo_app_boot_imports():
+    modules = boot_modules("echo_app")
+    assert {m for m in modules if m.split(".")[0] == "cartesapp"} == ECHO_APP_CARTESAPP_MODULES
+    assert {m for m in modules if m.split(".")[0] == "echo"} == {"echo", "echo.settings", "echo.echo"}
+    # besides the app and the framework only pony's sqlite provider (and stdlib)
+    packages = {m.split(".")[0] for m in modules} - {"cartesapp", "echo"}
+    assert {p for p in packages if p.lstrip("_") not in sys.stdlib_module_names} == {"pony"}
+    for optional in ("orjson", "jinja2", "zstandard", "cartesapplib", "typer", "pycmt", "watchdog"):
+        assert optional not in modules
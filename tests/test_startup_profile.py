@@ -0,0 +1,70 @@
+"""Startup profiler: import tracing and setup phases of `cartesapp profile-startup`."""
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+from typer.testing import CliRunner
+
+from cartesapp import cli
+from cartesapp.startup_profile import ImportTracer, format_startup_profile
+
+runner = CliRunner()
+
+
+def test_import_tracer_self_and_cumulative(tmp_path, monkeypatch):
+    (tmp_path / "profiled_outer.py").write_text("import profiled_inner\nX = [0] * 1000\n")
+    (tmp_path / "profiled_inner.py").write_text("Y = [0] * 100000\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    tracer = ImportTracer()
+    tracemalloc.start()
+    tracer.install()
+    try:
+        import profiled_outer
+    finally:
+        tracer.uninstall()
+        tracemalloc.stop()
+        sys.modules.pop("profiled_outer", None)
+        sys.modules.pop("profiled_inner", None)
+    assert tracer not in sys.meta_path
+    assert profiled_outer.__loader__ is profiled_outer.__spec__.loader
+    assert type(profiled_outer.__loader__).__name__ == "SourceFileLoader"
+    outer, inner = tracer.records
+    assert (outer.name, inner.name) == ("profiled_outer", "profiled_inner")
+    assert outer.cumulative >= inner.cumulative
+    assert abs(outer.self_time - (outer.cumulative - inner.cumulative)) < 1e-9
+    assert inner.self_memory >= 100000 * 8
+    assert outer.self_memory == outer.cumulative_memory - inner.cumulative_memory
+    assert {p["package"]: p["modules"] for p in tracer.packages()} == {"profiled_outer": 1, "profiled_inner": 1}
+
+
+def test_profile_startup_of_an_app(tmp_path):
+    (tmp_path / "tiny").mkdir()
+    (tmp_path / "tiny" / "settings.py").write_text("FILES = ['tiny']\n")
+    (tmp_path / "tiny" / "tiny.py").write_text(
+        "from cartesapp.input import mutation\n\n@mutation()\ndef ping() -> bool:\n    return True\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-m", "cartesapp.startup_profile", "profile.json", "5"],
+        cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Setup phases" in result.stdout
+    profile = json.loads((tmp_path / "profile.json").read_text())
+    assert profile["modules"] == ["tiny"]
+    phases = {p["phase"]: p for p in profile["phases"]}
+    for phase in ("import cartesapp.manager", "_import_apps", "_run_setup_functions", "_register_queries",
+            "_register_mutations", "initialize_storage", "_run_post_setup_functions"):
+        assert phase in phases
+    assert phases["_import_apps"]["memory"] is not None
+    packages = {p["package"] for p in profile["packages"]}
+    assert {"pony", "pydantic", "cartesi", "tiny"} <= packages
+    assert any(r["module"] == "tiny.tiny" for r in profile["imports"])
+    assert format_startup_profile(profile, 3).count("\n") > 10
+
+
+def test_cli_runs_profile_in_a_fresh_interpreter(monkeypatch):
+    calls = []
+    monkeypatch.setattr(subprocess, "run", lambda args: calls.append(args) or subprocess.CompletedProcess(args, 0))
+    result = runner.invoke(cli.app, ["profile-startup", "--output", "out.json", "--top", "10", "--no-trace-memory"])
+    assert result.exit_code == 0, result.output
+    assert calls == [[sys.executable, "-m", "cartesapp.startup_profile", "out.json", "10", "False", "False"]]
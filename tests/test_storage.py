@@ -0,0 +1,320 @@
+"""Durability modes of the commits (Storage.sync / Storage.flush)."""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from cartesapp.manager import Manager
+from cartesapp.storage import Entity, Storage, helpers, index, get_storage_pragmas
+
+
+@pytest.fixture
+def syncs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(os, "sync", lambda: calls.append("sync"))
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(os.readlink(f"/proc/self/fd/{fd}")))
+    return calls
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    filename = str(tmp_path / "storage.db")
+    with open(filename, "wb") as f:
+        f.write(b"db")
+    monkeypatch.setattr(Storage, "filename", filename)
+    return filename
+
+
+def test_strict_syncs_every_commit(syncs):
+    Storage.sync()
+    Storage.sync()
+    assert syncs == ["sync", "sync"]
+
+
+def test_file_fsyncs_database_files(syncs, db_file):
+    Storage.STORAGE_DURABILITY = "file"
+    Storage.sync()
+    assert syncs == [db_file]  # no wal yet
+    with open(f"{db_file}-wal", "wb") as f:
+        f.write(b"wal")
+    Storage.sync()
+    assert syncs == [db_file, db_file, f"{db_file}-wal"]
+
+
+def test_file_reopens_replaced_wal(syncs, db_file):
+    Storage.STORAGE_DURABILITY = "file"
+    wal = f"{db_file}-wal"
+    open(wal, "wb").close()
+    Storage.sync()
+    os.remove(wal)
+    open(wal, "wb").close()
+    Storage.sync()
+    assert os.fstat(Storage.sync_fds[wal]).st_nlink == 1  # the new wal
+    assert syncs.count(wal) == 2
+
+
+def test_file_in_memory_does_nothing(syncs, monkeypatch):
+    monkeypatch.setattr(Storage, "filename", None)
+    Storage.STORAGE_DURABILITY = "file"
+    Storage.sync()
+    assert syncs == []
+
+
+def test_deferred_syncs_every_n_inputs(syncs):
+    Storage.STORAGE_DURABILITY = "deferred"
+    Storage.STORAGE_SYNC_INPUTS = 3
+    for _ in range(7):
+        Storage.sync()
+    assert syncs == ["sync", "sync"]
+    assert Storage.pending_syncs == 1
+    Storage.flush()
+    assert syncs == ["sync", "sync", "sync"]
+    Storage.flush()  # nothing pending
+    assert len(syncs) == 3
+
+
+def test_run_flushes_deferred_commits(syncs):
+    Storage.STORAGE_DURABILITY = "deferred"
+    Storage.sync()
+
+    def run():
+        raise KeyboardInterrupt()
+
+    Manager.app = SimpleNamespace(run=run)
+    with pytest.raises(KeyboardInterrupt):
+        Manager.run()
+    assert syncs == ["sync"]
+
+
+def test_invalid_durability():
+    Storage.STORAGE_DURABILITY = "never"
+    with pytest.raises(Exception, match="Invalid storage durability"):
+        Storage.initialize_storage()
+
+
+# --- sqlite profiles ---
+
+@pytest.fixture
+def fresh_db(monkeypatch, tmp_path):
+    """Unbound database (the session one is already mapped) stored in tmp_path."""
+    monkeypatch.setattr(Storage, "db", helpers.Database())
+    monkeypatch.setattr(Storage, "filename", None)
+    Storage.STORAGE_PATH = str(tmp_path)
+    return Storage
+
+
+def pragma(name):
+    with helpers.db_session:
+        return Storage.db.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_profile_pragmas():
+    assert get_storage_pragmas(None) == {}
+    pragmas = get_storage_pragmas("fast", {"Cache_Size": -1024, "locking_mode": "EXCLUSIVE"})
+    assert list(pragmas)[0] == "page_size"  # before journal_mode
+    assert pragmas["cache_size"] == -1024
+    assert pragmas["locking_mode"] == "exclusive"
+    assert pragmas["journal_mode"] == "wal"
+
+
+@pytest.mark.parametrize("profile,pragmas", [
+    ("unknown", None),
+    ("default", {"cache_size; drop table x": 1}),
+    ("default", {"journal_mode": "wal; drop table x"}),
+    ("default", {"synchronous": True}),
+])
+def test_invalid_profile_pragmas(profile, pragmas):
+    with pytest.raises(Exception, match="Invalid"):
+        get_storage_pragmas(profile, pragmas)
+
+
+def test_profile_applied_on_connect(fresh_db):
+    Storage.STORAGE_PROFILE = "balanced"
+    Storage.STORAGE_PRAGMAS = {"cache_size": -4096}
+    Storage.initialize_storage()
+    assert pragma("journal_mode") == "wal"
+    assert pragma("synchronous") == 1
+    assert pragma("temp_store") == 2
+    assert pragma("cache_size") == -4096
+
+
+def test_page_size_of_new_database(fresh_db):
+    Storage.STORAGE_PROFILE = "fast"
+    Storage.initialize_storage()
+    assert pragma("page_size") == 8192
+    assert "page_size" in Storage.pragmas
+
+
+def test_rejected_pragma_fails_at_startup(fresh_db):
+    Storage.STORAGE_PRAGMAS = {"journal_mode": "bogus"}
+    with pytest.raises(Exception, match="Storage pragma journal_mode"):
+        Storage.initialize_storage()
+
+
+# --- indexes ---
+
+class IndexedEvent(Entity):
+    id = helpers.PrimaryKey(int, auto=True)
+    address = helpers.Required(str)
+    kind = helpers.Required(str)
+    timestamp = helpers.Required(int)
+
+
+def index_sql(name):
+    with helpers.db_session:
+        row = Storage.db.execute(f"SELECT sql FROM sqlite_master WHERE type = 'index' AND name = '{name}'").fetchone()
+        return row[0] if row is not None else None
+
+
+def test_create_indexes(storage):
+    Storage.add_index(IndexedEvent, ("address", "-timestamp"), name="idx_event_address")
+    Storage.add_index(IndexedEvent, "lower(address)", name="idx_event_lower")
+    Storage.add_index(IndexedEvent, ("kind", "timestamp"), where="kind = 'deposit'", name="idx_event_deposits")
+    Storage.create_indexes()
+    Storage.create_indexes()  # already there
+    assert index_sql("idx_event_address").endswith('("address", "timestamp" DESC)')
+    assert index_sql("idx_event_lower").endswith("(lower(address))")
+    assert index_sql("idx_event_deposits").endswith("WHERE kind = 'deposit'")
+
+
+def test_index_decorator_default_name(storage):
+    assert index("kind", unique=True)(IndexedEvent) is IndexedEvent
+    spec = Storage.indexes[-1]
+    assert spec.columns == ("kind",)
+    sql = spec.sql(Storage.db.provider)
+    assert sql.startswith('CREATE UNIQUE INDEX IF NOT EXISTS "idx_IndexedEvent_')
+    assert spec.sql(Storage.db.provider) == sql  # stable name
+
+
+def test_changed_index_spec_drops_the_old_index(storage):
+    Storage.add_index(IndexedEvent, ("kind",))
+    old = Storage.indexes[-1]
+    Storage.add_index(IndexedEvent, ("timestamp",), name="idx_event_timestamp")
+    Storage.create_indexes()
+    old_name = old.index_name(Storage.db.provider)
+    assert index_sql(old_name) is not None
+    Storage.indexes = [idx for idx in Storage.indexes if idx is not old]
+    Storage.add_index(IndexedEvent, ("kind", "timestamp"))
+    new = Storage.indexes[-1]
+    Storage.create_indexes()
+    assert index_sql(old_name) is None
+    assert index_sql(new.index_name(Storage.db.provider)) is not None
+    assert index_sql("idx_event_timestamp") is not None  # explicit names are kept
+
+
+def test_invalid_index_column(storage):
+    Storage.add_index(IndexedEvent, ("missing",))
+    with pytest.raises(Exception, match="Invalid index column missing"):
+        Storage.create_indexes()
+
+
+def test_explain_logs_full_scans(storage, monkeypatch, caplog):
+    Storage.add_index(IndexedEvent, ("address",), name="idx_event_address_only")
+    Storage.create_indexes()
+    monkeypatch.setattr(Storage.db, "_exec_sql", Storage.db._exec_sql)
+    Storage.enable_explain()
+    with caplog.at_level("WARNING", logger="cartesapp.storage"), helpers.db_session:
+        IndexedEvent.select(lambda e: e.address == "0x1")[:]
+        assert "Full scan" not in caplog.text
+        IndexedEvent.select(lambda e: e.kind == "withdraw")[:]
+        IndexedEvent.select(lambda e: e.kind == "withdraw")[:]  # logged once
+    assert caplog.text.count("Full scan") == 1
+    assert "IndexedEvent" in caplog.text
+
+
+# --- read-only query sessions ---
+
+@pytest.fixture
+def notes(fresh_db):
+    class Note(Storage.db.Entity):
+        text = helpers.Required(str)
+    Storage.initialize_storage()
+    with helpers.db_session:
+        Note(text="first")
+    yield Note
+    Storage.close_query_connection()
+
+
+def current_connection():
+    return Storage.db._get_cache().connection
+
+
+def test_query_session_uses_read_only_connection(notes):
+    pool = Storage.db.provider.pool
+    write_connection = pool.con
+    seen = []
+
+    @Storage.query_session
+    def read():
+        texts = [n.text for n in notes.select()]
+        seen.append(current_connection())
+        return texts
+
+    assert read() == ["first"]
+    assert seen[0] is not write_connection
+    assert pool.con is write_connection
+    with helpers.db_session:
+        notes(text="second")
+    assert sorted(read()) == ["first", "second"]  # sees later commits
+    assert seen[1] is seen[0]  # reused
+
+
+def test_query_session_reopens_after_disconnect(notes):
+    @Storage.query_session
+    def read():
+        return [n.text for n in notes.select()]
+
+    read()
+    first = Storage.query_connection[3]
+    Storage.db.disconnect()
+    with helpers.db_session:
+        notes(text="second")
+    assert sorted(read()) == ["first", "second"]
+    assert Storage.query_connection[3] is not first
+
+
+def test_query_session_after_pony_drops_the_connection(notes, monkeypatch):
+    pool = Storage.db.provider.pool
+
+    @Storage.query_session
+    def read():
+        return [n.text for n in notes.select()]
+
+    write_connection = pool.con
+    with monkeypatch.context() as m:
+        m.setattr(pool, "release", pool.drop)  # as pony does when the rollback fails
+        assert read() == ["first"]
+    assert Storage.query_connection is None
+    assert pool.con is write_connection
+    assert read() == ["first"]
+    assert Storage.query_connection is not None
+
+
+def test_query_session_cannot_write(notes):
+    @Storage.query_session
+    def write():
+        notes(text="nope")
+        helpers.flush()
+
+    with pytest.raises(Exception, match="readonly"):
+        write()
+    with helpers.db_session:
+        assert notes.select().count() == 1
+
+
+def test_query_session_disabled_or_nested(notes):
+    seen = []
+
+    @Storage.query_session
+    def read():
+        notes.select()[:]
+        seen.append(current_connection())
+
+    Storage.READ_ONLY_QUERIES = False
+    read()
+    Storage.READ_ONLY_QUERIES = True
+    with helpers.db_session:
+        notes.select()[:]
+        write_connection = current_connection()
+        read()
+    assert seen == [Storage.db.provider.pool.con, write_connection]
@@ -0,0 +1,142 @@
+"""Tests for streaming queries: generator handlers yield rows (or batches of rows)
+that are serialized into a json array report, stopping at the end of the part
+(splittable outputs) or of the output size budget."""
+import json
+
+import pytest
+from pydantic import BaseModel, create_model
+
+from cartesi import URLParameters
+from cartesi.models import RollupData
+
+from cartesapp import output
+from cartesapp.input import _make_url_query, _make_json_query, DecodePlan, Query, splittable_query_params
+from cartesapp.manager import Manager
+from cartesapp.utils import str2hex
+
+
+MODULE = "streamed"
+
+
+class Row(BaseModel):
+    index: int
+    name:  str
+
+
+class RowsQuery(BaseModel):
+    n: int
+
+
+RowsQuerySplittable = create_model("RowsQuerySplittable", __base__=RowsQuery, **splittable_query_params)
+
+fetched = []
+
+
+def stream_rows(payload: RowsQuery):
+    for i in range(payload.n):
+        fetched.append(i)
+        yield Row(index=i, name=f"row {i}")
+
+
+def stream_batches(payload: RowsQuery):
+    yield [{"index": i} for i in range(payload.n)]
+    yield []
+    yield {"index": payload.n}
+    return False
+
+
+def expected_rows(n):
+    return [{"index": i, "name": f"row {i}"} for i in range(n)]
+
+
+class FakeRollup:
+    def __init__(self):
+        self.reports = []
+
+    def report(self, payload):
+        self.reports.append(payload)
+
+
+@pytest.fixture(autouse=True)
+def clear_fetched():
+    fetched.clear()
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    monkeypatch.setattr(output, "MAX_SPLITTABLE_OUTPUT_SIZE", 100)
+    monkeypatch.setattr(output, "MAX_AGGREGATED_OUTPUT_SIZE", 301)
+    monkeypatch.setattr(output, "MAX_INSPECT_PARTS", 3)
+
+
+def url_query(func, splittable=False):
+    if splittable:
+        return _make_url_query(func, RowsQuery, True, MODULE, stream=True, extended_model=RowsQuerySplittable,
+                               decode_plan=DecodePlan(RowsQuery, RowsQuerySplittable))
+    return _make_url_query(func, RowsQuery, True, MODULE, stream=True, decode_plan=DecodePlan(RowsQuery))
+
+
+def fetch(query, n, part=None, parts=None):
+    query_params = {"n": [str(n)]}
+    if part is not None: query_params["part"] = [str(part)]
+    if parts is not None: query_params["parts"] = [str(parts)]
+    rollup = FakeRollup()
+    res = query(rollup, URLParameters(path_params={}, query_params=query_params))
+    return res, b"".join(bytes.fromhex(r[2:]) for r in rollup.reports)
+
+
+class TestStreamQuery:
+    def test_rows(self, storage):
+        res, data = fetch(url_query(stream_rows), 20)
+        assert res is True
+        assert json.loads(data) == expected_rows(20)
+
+    def test_batches_and_return_value(self, storage):
+        res, data = fetch(url_query(stream_batches), 3)
+        assert res is False
+        assert json.loads(data) == [{"index": i} for i in range(4)]
+
+    def test_empty(self, storage):
+        assert json.loads(fetch(url_query(stream_rows), 0)[1]) == []
+
+    def test_truncated_to_valid_json(self, storage, small_parts):
+        _, data = fetch(url_query(stream_rows), 100)
+        assert len(data) <= 301
+        rows = json.loads(data)
+        assert rows == expected_rows(len(rows))
+        assert len(fetched) == len(rows) + 1 # stopped at the first row that didn't fit
+
+    @pytest.mark.parametrize("parts", [None, 2])
+    def test_parts(self, storage, small_parts, parts):
+        query = url_query(stream_rows, splittable=True)
+        data = b""
+        part = 0
+        step = parts or 1
+        while True:
+            fetched.clear()
+            _, out = fetch(query, 60, part, parts)
+            if len(out) <= step * 100:
+                data += out
+                break
+            assert out[-1] == 1 and len(out) == step * 100 + 1
+            data += out[:-1]
+            part += step
+            # rows after the part are not fetched
+            assert len(json.dumps(expected_rows(len(fetched) - 1), separators=(",", ":"))) < (part + 1) * 100
+        assert json.loads(data) == expected_rows(60)
+
+    def test_jsonrpc(self, storage):
+        query = _make_json_query(stream_rows, RowsQuery, True, MODULE, stream=True, decode_plan=DecodePlan(RowsQuery))
+        rollup = FakeRollup()
+        payload = {"jsonrpc": "2.0", "method": "x", "params": {"n": 3}, "id": 7}
+        assert query(rollup, RollupData(metadata=None, payload=str2hex(json.dumps(payload))))
+        response = json.loads(bytes.fromhex(rollup.reports[0][2:]))
+        assert response == {"jsonrpc": "2.0", "result": expected_rows(3), "id": 7}
+
+    def test_streaming_queries_are_not_cached(self):
+        def rows(payload: RowsQuery):
+            yield payload.n
+        rows.__module__ = f"{MODULE}.file"
+        Query.add(rows, cache=True)
+        with pytest.raises(Exception, match="can't be cached"):
+            Manager._register_queries(False)
@@ -132,7 +132,7 @@ class TestGetModules:
 
 class TestEnumValues:
     def test_output_format_members(self):
-        assert {f.name for f in OutputFormat} == {"abi", "packed_abi", "json", "header_abi"}
+        assert {f.name for f in OutputFormat} == {"abi", "packed_abi", "json", "header_abi", "columnar", "json_deflate", "columnar_deflate"}
 
     def test_input_format_members(self):
         assert {f.name for f in InputFormat} == {"abi", "url", "json", "jsonrpc"}
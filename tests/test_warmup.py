@@ -0,0 +1,61 @@
+"""Warm-up functions (@warmup): run before the rollup loop in a throwaway
+session and context, with outputs dropped and writes rolled back."""
+import logging
+
+from cartesapp.context import Context, get_metadata
+from cartesapp.manager import Manager
+from cartesapp.output import add_output, send_notice
+from cartesapp.setup import Setup, warmup
+from cartesapp.storage import Entity, helpers
+
+
+MODULE = "warm"
+
+
+class WarmRow(Entity):
+    key = helpers.PrimaryKey(str)
+
+
+def as_app_function(fn):
+    fn.__module__ = f"{MODULE}.file"
+    return fn
+
+
+def test_warmup_is_a_throwaway_input(storage):
+    calls = []
+
+    def warm_handlers():
+        calls.append((Context.module, get_metadata().input_index))
+        WarmRow(key="warm")
+        helpers.flush()
+        send_notice("notice")
+        add_output("report")
+
+    warmup()(as_app_function(warm_handlers))
+    Context.app_contract = "0x" + "ab" * 20
+    Manager._run_warmup_functions()
+
+    assert calls == [(MODULE, 0)]
+    assert Context.rollup is None and Context.output_queue is None
+    assert Context.n_notices == 0 and Context.n_outputs == 0
+    assert Context.app_contract == "0x" + "ab" * 20
+    with helpers.db_session:
+        assert WarmRow.get(key="warm") is None
+
+
+def test_warmup_errors_are_logged(storage, caplog):
+    def failing():
+        raise ValueError("cold")
+
+    warmup()(as_app_function(failing))
+    with caplog.at_level(logging.WARNING, logger="cartesapp.setup"):
+        Manager._run_warmup_functions()
+    assert "Warm-up warm.failing failed: cold" in caplog.text
+    assert Context.module is None
+
+
+def test_reset_clears_warmups():
+    warmup()(as_app_function(lambda: None))
+    assert len(Setup.warmup_functions) == 1
+    Manager.reset()
+    assert Setup.warmup_functions == []